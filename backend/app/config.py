@@ -74,7 +74,67 @@ class Settings(BaseModel):
   database_url: str
   jwt_secret: str = os.getenv('JWT_SECRET', 'supersecret')
   jwt_algorithm: str = 'HS256'
-  access_token_expire_minutes: int = 60 * 24
+  access_token_expire_minutes: int = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', 30))
+  refresh_token_expire_days: int = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', 14))
+  token_revocation_capacity: int = int(os.getenv('TOKEN_REVOCATION_CAPACITY', 100_000))
+  token_revocation_error_rate: float = float(os.getenv('TOKEN_REVOCATION_ERROR_RATE', 0.001))
+  token_revocation_sync_seconds: float = float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', 5))
+  jwt_cache_size: int = int(os.getenv('JWT_CACHE_SIZE', 4096))
+  jwt_cache_ttl_seconds: float = float(os.getenv('JWT_CACHE_TTL_SECONDS', 300))
+  password_hash_workers: int = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+  principal_cache_size: int = int(os.getenv('PRINCIPAL_CACHE_SIZE', 1024))
+  principal_cache_ttl_seconds: float = float(os.getenv('PRINCIPAL_CACHE_TTL_SECONDS', 30))
+  code_store_backend: str = os.getenv('CODE_STORE_BACKEND', 'memory')
+  code_max_attempts: int = int(os.getenv('CODE_MAX_ATTEMPTS', 5))
+  search_index_enabled: bool = os.getenv('SEARCH_INDEX_ENABLED', '1') not in ('0', 'false', 'False')
+  search_index_rebuild_seconds: float = float(os.getenv('SEARCH_INDEX_REBUILD_SECONDS', 300))
+  catalog_version_max_age_seconds: float = float(os.getenv('CATALOG_VERSION_MAX_AGE_SECONDS', 60))
+  cache_control: str = os.getenv('CACHE_CONTROL', '')
+  catalog_response_cache_enabled: bool = os.getenv('CATALOG_RESPONSE_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+  catalog_response_cache_size: int = int(os.getenv('CATALOG_RESPONSE_CACHE_SIZE', 256))
+  rate_limit_enabled: bool = os.getenv('RATE_LIMIT_ENABLED', '1') not in ('0', 'false', 'False')
+  rate_limit_backend: str = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+  rate_limits: str = os.getenv('RATE_LIMITS', '')
+  rate_limit_trust_proxy: bool = os.getenv('RATE_LIMIT_TRUST_PROXY', '0') in ('1', 'true', 'True')
+  idempotency_ttl_seconds: float = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 86400))
+  idempotency_cache_size: int = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 2048))
+  idempotency_wait_seconds: float = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 15))
+  report_utc_offset_hours: float = float(os.getenv('REPORT_UTC_OFFSET_HOURS', 8))
+  config_snapshot_ttl_seconds: float = float(os.getenv('CONFIG_SNAPSHOT_TTL_SECONDS', 30))
+  wechat_api_base: str = os.getenv('WECHAT_API_BASE', 'https://api.weixin.qq.com')
+  wechat_token_refresh_margin_seconds: float = float(os.getenv('WECHAT_TOKEN_REFRESH_MARGIN_SECONDS', 300))
+  wechat_signature_window_seconds: float = float(os.getenv('WECHAT_SIGNATURE_WINDOW_SECONDS', 60))
+  wechat_signature_cache_size: int = int(os.getenv('WECHAT_SIGNATURE_CACHE_SIZE', 1024))
+  wechat_pay_api_base: str = os.getenv('WECHAT_PAY_API_BASE', 'https://api.mch.weixin.qq.com')
+  wechat_pay_notify_url: str = os.getenv('WECHAT_PAY_NOTIFY_URL', '')
+  wechat_pay_timeout_seconds: float = float(os.getenv('WECHAT_PAY_TIMEOUT_SECONDS', 5))
+  wechat_pay_max_connections: int = int(os.getenv('WECHAT_PAY_MAX_CONNECTIONS', 100))
+  wechat_pay_max_keepalive: int = int(os.getenv('WECHAT_PAY_MAX_KEEPALIVE', 20))
+  wechat_pay_max_retries: int = int(os.getenv('WECHAT_PAY_MAX_RETRIES', 2))
+  wechat_pay_retry_backoff_ms: float = float(os.getenv('WECHAT_PAY_RETRY_BACKOFF_MS', 100))
+  analytics_cache_size: int = int(os.getenv('ANALYTICS_CACHE_SIZE', 256))
+  analytics_cache_ttl_seconds: float = float(os.getenv('ANALYTICS_CACHE_TTL_SECONDS', 3600))
+  flash_sale_products: str = os.getenv('FLASH_SALE_PRODUCTS', '')
+  flash_sale_batch_size: int = int(os.getenv('FLASH_SALE_BATCH_SIZE', 200))
+  flash_sale_batch_wait_ms: float = float(os.getenv('FLASH_SALE_BATCH_WAIT_MS', 50))
+  flash_sale_queue_size: int = int(os.getenv('FLASH_SALE_QUEUE_SIZE', 10_000))
+  flash_sale_ticket_ttl_seconds: float = float(os.getenv('FLASH_SALE_TICKET_TTL_SECONDS', 900))
+  fulfilment_batch_size: int = int(os.getenv('FULFILMENT_BATCH_SIZE', 200))
+  fulfilment_batch_wait_ms: float = float(os.getenv('FULFILMENT_BATCH_WAIT_MS', 20))
+  fulfilment_queue_size: int = int(os.getenv('FULFILMENT_QUEUE_SIZE', 50_000))
+  fulfilment_recover_seconds: float = float(os.getenv('FULFILMENT_RECOVER_SECONDS', 60))
+  order_expiry_minutes: float = float(os.getenv('ORDER_EXPIRY_MINUTES', 30))
+  order_expiry_batch_size: int = int(os.getenv('ORDER_EXPIRY_BATCH_SIZE', 200))
+  order_expiry_tick_seconds: float = float(os.getenv('ORDER_EXPIRY_TICK_SECONDS', 5))
+  order_expiry_resync_seconds: float = float(os.getenv('ORDER_EXPIRY_RESYNC_SECONDS', 300))
+  sms_batch_size: int = int(os.getenv('SMS_BATCH_SIZE', 100))
+  sms_batch_wait_ms: float = float(os.getenv('SMS_BATCH_WAIT_MS', 50))
+  sms_queue_size: int = int(os.getenv('SMS_QUEUE_SIZE', 10000))
+  sms_max_attempts: int = int(os.getenv('SMS_MAX_ATTEMPTS', 4))
+  sms_retry_backoff_ms: float = float(os.getenv('SMS_RETRY_BACKOFF_MS', 500))
+  sms_provider_cooldown_seconds: float = float(os.getenv('SMS_PROVIDER_COOLDOWN_SECONDS', 30))
+  sms_timeout_seconds: float = float(os.getenv('SMS_TIMEOUT_SECONDS', 5))
+  sms_max_connections: int = int(os.getenv('SMS_MAX_CONNECTIONS', 20))
   cors_origins: list[str]
   site_ip: str
   site_domain: str
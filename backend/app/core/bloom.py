@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import hashlib
+import math
+
+
+class BloomFilter:
+  """Fixed-size Bloom filter over strings.
+
+  ``in`` never returns a false negative, so a miss can be trusted without
+  consulting the backing store; a hit only means "maybe".
+  """
+
+  def __init__(self, capacity: int, error_rate: float = 0.001):
+    capacity = max(1, int(capacity))
+    self.capacity = capacity
+    self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+    self._bits = bytearray((self.size + 7) // 8)
+    self.count = 0
+
+  def _positions(self, item: str):
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    for i in range(self.hash_count):
+      yield (h1 + i * h2) % self.size
+
+  def add(self, item: str) -> None:
+    for pos in self._positions(item):
+      self._bits[pos >> 3] |= 1 << (pos & 7)
+    self.count += 1
+
+  def __contains__(self, item: str) -> bool:
+    return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
@@ -0,0 +1,67 @@
+"""Small in-process caches shared by the services."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+  """Thread-safe LRU cache whose entries also expire after a TTL.
+
+  ``set`` accepts a per-entry ``ttl`` so callers can align expiry with the
+  cached object (e.g. a token's ``exp`` claim). Hit/miss counters are kept for
+  the admin metrics endpoint.
+  """
+
+  def __init__(self, maxsize: int, ttl: float):
+    self.maxsize = max(1, int(maxsize))
+    self.ttl = float(ttl)
+    self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    now = time.monotonic()
+    with self._lock:
+      entry = self._data.get(key, _MISSING)
+      if entry is _MISSING:
+        self.misses += 1
+        return default
+      expires_at, value = entry
+      if expires_at <= now:
+        del self._data[key]
+        self.misses += 1
+        return default
+      self._data.move_to_end(key)
+      self.hits += 1
+      return value
+
+  def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+    lifetime = self.ttl if ttl is None else min(float(ttl), self.ttl)
+    if lifetime <= 0:
+      return
+    with self._lock:
+      self._data[key] = (time.monotonic() + lifetime, value)
+      self._data.move_to_end(key)
+      while len(self._data) > self.maxsize:
+        self._data.popitem(last=False)
+
+  def pop(self, key: Hashable) -> None:
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._data.clear()
+
+  def __len__(self) -> int:
+    return len(self._data)
+
+  def stats(self) -> Dict[str, int]:
+    return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
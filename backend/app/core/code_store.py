@@ -0,0 +1,216 @@
+"""Storage backends for SMS verification codes.
+
+``memory`` keeps codes in the current process and sweeps them by expiry
+bucket, so cleanup never scans the whole map. ``database`` stores them in the
+``verification_codes`` table so ``/auth/send-code`` and ``/auth/code-login``
+may land on different workers.
+
+Both count failed attempts per phone over an attempt window that opens with
+the first code and lasts its TTL. Re-sending a code within the window keeps
+the count, so asking for a fresh code does not buy more guesses; once
+``max_attempts`` is reached the phone stays locked until the window closes.
+A successful login clears it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Set
+
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.verification_code import VerificationCode
+
+CODE_OK = 'ok'
+CODE_MISSING = 'missing'
+CODE_EXPIRED = 'expired'
+CODE_MISMATCH = 'mismatch'
+CODE_LOCKED = 'locked'
+
+
+class CodeStore(ABC):
+  """Interface shared by the verification code backends."""
+
+  def __init__(self, max_attempts: int):
+    self.max_attempts = max(1, int(max_attempts))
+
+  @abstractmethod
+  def put(self, phone: str, code: str, ttl_seconds: float) -> None:
+    """Store a new code for ``phone``, keeping its failed attempts if the attempt window is still open."""
+
+  @abstractmethod
+  def verify(self, phone: str, code: str) -> str:
+    """Check ``code`` and consume it on success; returns one of the ``CODE_*`` constants."""
+
+
+@dataclass
+class _Entry:
+  code: str
+  expires_at: float
+  # Never later than expires_at, since re-sends keep the window but move the code expiry
+  window_expires_at: float
+  attempts: int = 0
+
+
+class MemoryCodeStore(CodeStore):
+  def __init__(self, max_attempts: int, bucket_seconds: int = 10):
+    super().__init__(max_attempts)
+    self.bucket_seconds = max(1, int(bucket_seconds))
+    self._entries: Dict[str, _Entry] = {}
+    self._buckets: Dict[int, Set[str]] = {}
+    self._swept_until = int(time.time()) // self.bucket_seconds
+    self._lock = threading.Lock()
+
+  def _sweep(self, now: float) -> None:
+    current = int(now) // self.bucket_seconds
+    while self._swept_until < current:
+      for phone in self._buckets.pop(self._swept_until, ()):
+        entry = self._entries.get(phone)
+        # The phone may have been re-issued a later code that lives in another bucket
+        if entry and entry.expires_at <= now:
+          del self._entries[phone]
+      self._swept_until += 1
+
+  def put(self, phone: str, code: str, ttl_seconds: float) -> None:
+    now = time.time()
+    expires_at = now + ttl_seconds
+    with self._lock:
+      self._sweep(now)
+      previous = self._entries.get(phone)
+      if previous is not None and previous.window_expires_at > now:
+        entry = _Entry(code, expires_at, previous.window_expires_at, previous.attempts)
+      else:
+        entry = _Entry(code, expires_at, expires_at)
+      self._entries[phone] = entry
+      self._buckets.setdefault(int(expires_at) // self.bucket_seconds, set()).add(phone)
+
+  def verify(self, phone: str, code: str) -> str:
+    now = time.time()
+    with self._lock:
+      self._sweep(now)
+      entry = self._entries.get(phone)
+      if entry is None:
+        return CODE_MISSING
+      if entry.attempts >= self.max_attempts and entry.window_expires_at > now:
+        return CODE_LOCKED
+      if entry.expires_at <= now:
+        del self._entries[phone]
+        return CODE_EXPIRED
+      if entry.code != code:
+        entry.attempts += 1
+        # The entry stays, locked, so a re-send within the window cannot reset the count
+        return CODE_LOCKED if entry.attempts >= self.max_attempts else CODE_MISMATCH
+      del self._entries[phone]
+      return CODE_OK
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+
+class DatabaseCodeStore(CodeStore):
+  def __init__(self, max_attempts: int, sweep_interval_seconds: float = 60):
+    super().__init__(max_attempts)
+    self.sweep_interval_seconds = sweep_interval_seconds
+    self._last_sweep = 0.0
+    self._sweep_lock = threading.Lock()
+
+  def _maybe_sweep(self, db) -> None:
+    now = time.monotonic()
+    # One thread sweeps; the others carry on without waiting for it
+    if now - self._last_sweep < self.sweep_interval_seconds or not self._sweep_lock.acquire(blocking=False):
+      return
+    try:
+      if now - self._last_sweep < self.sweep_interval_seconds:
+        return
+      self._last_sweep = now
+      db.execute(delete(VerificationCode).where(VerificationCode.expires_at < datetime.utcnow()))
+    finally:
+      self._sweep_lock.release()
+
+  def put(self, phone: str, code: str, ttl_seconds: float) -> None:
+    db = SessionLocal()
+    try:
+      self._maybe_sweep(db)
+      now = datetime.utcnow()
+      expires_at = now + timedelta(seconds=ttl_seconds)
+      previous = (
+        db.query(VerificationCode)
+        .filter(VerificationCode.phone == phone)
+        .with_for_update()
+        .first()
+      )
+      window_expires_at = previous and (previous.window_expires_at or previous.expires_at)
+      if previous is not None and window_expires_at > now:
+        previous.code = code
+        previous.expires_at = expires_at
+        previous.window_expires_at = window_expires_at
+      else:
+        db.merge(VerificationCode(
+          phone=phone,
+          code=code,
+          expires_at=expires_at,
+          window_expires_at=expires_at,
+          attempts=0
+        ))
+      db.commit()
+    except SQLAlchemyError:
+      db.rollback()
+      raise
+    finally:
+      db.close()
+
+  def verify(self, phone: str, code: str) -> str:
+    db = SessionLocal()
+    try:
+      record = (
+        db.query(VerificationCode)
+        .filter(VerificationCode.phone == phone)
+        .with_for_update()
+        .first()
+      )
+      if record is None:
+        return CODE_MISSING
+      now = datetime.utcnow()
+      attempts = record.attempts or 0
+      result = CODE_OK
+      if attempts >= self.max_attempts and (record.window_expires_at or record.expires_at) > now:
+        return CODE_LOCKED
+      if now > record.expires_at:
+        result = CODE_EXPIRED
+        db.delete(record)
+      elif record.code != code:
+        # A locked row is kept so a re-send within the window cannot reset the count
+        record.attempts = attempts + 1
+        result = CODE_LOCKED if record.attempts >= self.max_attempts else CODE_MISMATCH
+      else:
+        db.delete(record)
+      db.commit()
+      return result
+    except SQLAlchemyError:
+      db.rollback()
+      raise
+    finally:
+      db.close()
+
+
+_store: CodeStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_code_store() -> CodeStore:
+  global _store
+  if _store is None:
+    with _store_lock:
+      if _store is None:
+        if settings.code_store_backend == 'database':
+          _store = DatabaseCodeStore(settings.code_max_attempts)
+        else:
+          _store = MemoryCodeStore(settings.code_max_attempts)
+  return _store
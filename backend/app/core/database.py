@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
@@ -37,6 +38,84 @@ def get_db() -> Session:
     db.close()
 
 
+# Columns added after the first release as (table, column, DDL type); create_all only creates missing tables
+ADDED_COLUMNS = [
+  ('orders', 'created_at', 'DATETIME NULL'),
+  ('payments', 'paid_at', 'DATETIME NULL'),
+  ('payments', 'out_trade_no', 'VARCHAR(32) NULL'),
+  ('payments', 'transaction_id', 'VARCHAR(64) NULL'),
+  ('verification_codes', 'window_expires_at', 'DATETIME NULL'),
+]
+
+# Columns made NOT NULL after release as (table, column, value for old NULLs, full MySQL column definition)
+TIGHTENED_COLUMNS = [
+  ('admin_user_profiles', 'spend', '0', 'DECIMAL(10, 2) NOT NULL DEFAULT 0'),
+]
+
+# Unique indexes whose table may already hold duplicates; all but the lowest id of each key are deleted first
+DEDUPLICATED_INDEXES = {'uq_integration_configs_provider'}
+
+# Indexes superseded by ones declared on the models, as (table, index name)
+DROPPED_INDEXES = [
+  ('integration_configs', 'ix_integration_configs_provider'),
+  ('admin_orders', 'ix_admin_orders_created_at'),
+  ('recharge_records', 'ix_recharge_records_paid_at'),
+]
+
+
+def _deduplicate(connection, table, columns) -> None:
+  key = ', '.join(columns)
+  # The derived table lets MySQL read the table it is deleting from
+  connection.execute(text(
+    f'DELETE FROM {table} WHERE id NOT IN (SELECT id FROM (SELECT MIN(id) AS id FROM {table} GROUP BY {key}) AS keep)'
+  ))
+
+
+def _drop_index(connection, table: str, name: str) -> None:
+  if connection.dialect.name == 'mysql':
+    connection.execute(text(f'DROP INDEX {name} ON {table}'))
+  else:
+    connection.execute(text(f'DROP INDEX {name}'))
+
+
+def upgrade_schema(bind: Engine) -> None:
+  """Add columns and declared indexes introduced since the tables were first created, and drop superseded ones."""
+
+  inspector = inspect(bind)
+  tables = set(inspector.get_table_names())
+  with bind.connect() as connection:
+    for table, column, ddl in ADDED_COLUMNS:
+      if table in tables and column not in {col['name'] for col in inspector.get_columns(table)}:
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    for table, column, value, definition in TIGHTENED_COLUMNS:
+      if table not in tables:
+        continue
+      connection.execute(text(f'UPDATE {table} SET {column} = {value} WHERE {column} IS NULL'))
+      nullable = next((col['nullable'] for col in inspector.get_columns(table) if col['name'] == column), False)
+      # SQLite cannot change a column in place; the backfill and the model default keep it free of NULLs there
+      if nullable and connection.dialect.name == 'mysql':
+        connection.execute(text(f'ALTER TABLE {table} MODIFY {column} {definition}'))
+    for table in Base.metadata.sorted_tables:
+      if table.name not in tables:
+        continue
+      # Match on columns and uniqueness as well as names, so indexes added by hand under another name are not
+      # duplicated, while a unique index is still added next to a plain one on the same columns
+      existing = set()
+      for index in inspector.get_indexes(table.name):
+        existing.update((index['name'], (tuple(index['column_names']), bool(index.get('unique')))))
+      for index in table.indexes:
+        columns = tuple(column.name for column in index.columns)
+        if index.name not in existing and (columns, bool(index.unique)) not in existing:
+          if index.name in DEDUPLICATED_INDEXES:
+            _deduplicate(connection, table.name, columns)
+          index.create(connection)
+    for table, name in DROPPED_INDEXES:
+      if table in tables and name in {index['name'] for index in inspector.get_indexes(table)}:
+        _drop_index(connection, table, name)
+    connection.commit()
+
+
 def init_db():
   import app.models  # noqa: F401
   Base.metadata.create_all(bind=engine)
+  upgrade_schema(engine)
@@ -0,0 +1,76 @@
+"""Password hashing offloaded to a process pool.
+
+pbkdf2/bcrypt are CPU bound and hold the GIL, so running them on the anyio
+threadpool starves every other sync endpoint during a login spike. The helpers
+below push the work to a small ``ProcessPoolExecutor`` and expose awaitable
+``hash`` / ``verify`` calls to the request handlers.
+
+``python -m benchmarks.hashing`` starts the app at several
+``PASSWORD_HASH_WORKERS`` values and reports logins/s next to the latency of
+``GET /products/`` during the spike, to size the pool for a host.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from app.config import settings
+
+pwd_context = CryptContext(schemes=['pbkdf2_sha256', 'bcrypt'], deprecated='auto')
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+
+
+def _hash_sync(password: str) -> str:
+  return pwd_context.hash(password)
+
+
+def _verify_sync(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+  """Return ``(valid, new_hash)``; ``new_hash`` is set when the stored hash should be upgraded."""
+
+  if not hashed_password:
+    return False, None
+  try:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+  except Exception:  # noqa: BLE001
+    # Legacy rows may still hold plaintext; accept them once and upgrade immediately
+    if plain_password == hashed_password:
+      return True, pwd_context.hash(plain_password)
+    return False, None
+
+
+def get_executor() -> Executor:
+  global _executor
+  if _executor is None:
+    with _executor_lock:
+      if _executor is None:
+        workers = settings.password_hash_workers
+        if workers > 0:
+          _executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+          # 0 disables the process pool (e.g. constrained containers); keep the work off the event loop anyway
+          _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-hash')
+  return _executor
+
+
+def shutdown() -> None:
+  global _executor
+  with _executor_lock:
+    if _executor is not None:
+      _executor.shutdown(wait=False, cancel_futures=True)
+      _executor = None
+
+
+async def hash(password: str) -> str:  # noqa: A001
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(get_executor(), _hash_sync, password)
+
+
+async def verify(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(get_executor(), _verify_sync, plain_password, hashed_password)
@@ -0,0 +1,155 @@
+"""Version counters, ETags, conditional GET and response caching for the catalog endpoints.
+
+Each cacheable resource (``courses``, ``products``) has a counter that the
+services bump after every committed catalog edit. The strong ETag is derived
+from that counter alone, so a matching ``If-None-Match`` is answered with 304
+before a session query or any serialization happens.
+
+Stock movements from orders, expiries and reclaims do not bump ``products``:
+on a busy shop that would empty the cache on every order. The ``stock`` shown
+in the catalog is therefore advisory and may lag by up to the version max age
+below; order creation always checks live stock under a row lock.
+
+Counters are per process, so the ETag also carries a per-boot token: another
+worker never produces the same tag for different data. A worker cannot see
+writes made by its peers, so every version also expires after
+``CATALOG_VERSION_MAX_AGE_SECONDS``, which bounds how stale a peer can be.
+
+Full responses are cached as the final JSON bytes, keyed by version and URL,
+and are returned through a raw ``Response``. A warm hit therefore skips both
+the ORM query and pydantic validation and serialization. ``bump`` also drops
+the resource's cached bodies.
+"""
+
+from __future__ import annotations
+
+import json
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException, Request, Response, status
+from pydantic import TypeAdapter
+
+from app.config import settings
+from app.core.cache import TTLCache
+
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+
+class ResourceVersions:
+  def __init__(self, max_age_seconds: float):
+    self.max_age_seconds = max_age_seconds
+    self._boot = secrets.token_hex(4)
+    self._versions: Dict[str, tuple[int, float]] = {}
+    self._lock = threading.Lock()
+
+  def bump(self, resource: str) -> None:
+    with self._lock:
+      version, _ = self._versions.get(resource, (0, 0.0))
+      self._versions[resource] = (version + 1, time.monotonic())
+
+  def current(self, resource: str) -> str:
+    now = time.monotonic()
+    entry = self._versions.get(resource)
+    if entry is None or now - entry[1] > self.max_age_seconds:
+      with self._lock:
+        entry = self._versions.get(resource)
+        if entry is None or now - entry[1] > self.max_age_seconds:
+          entry = ((entry[0] if entry else 0) + 1, now)
+          self._versions[resource] = entry
+    return f'{self._boot}.{entry[0]}'
+
+
+versions = ResourceVersions(settings.catalog_version_max_age_seconds)
+_response_caches: Dict[str, TTLCache] = {}
+_response_caches_lock = threading.Lock()
+
+
+def _response_cache(resource: str) -> TTLCache:
+  cache = _response_caches.get(resource)
+  if cache is None:
+    with _response_caches_lock:
+      cache = _response_caches.setdefault(
+        resource,
+        TTLCache(settings.catalog_response_cache_size, settings.catalog_version_max_age_seconds)
+      )
+  return cache
+
+
+def bump(resource: str) -> None:
+  versions.bump(resource)
+  _response_cache(resource).clear()
+
+
+def response_cache_stats() -> Dict[str, Dict[str, int]]:
+  return {resource: cache.stats() for resource, cache in _response_caches.items()}
+
+
+def _load_cache_control() -> Dict[str, str]:
+  try:
+    overrides = json.loads(settings.cache_control) if settings.cache_control else {}
+  except ValueError:
+    overrides = {}
+  return overrides if isinstance(overrides, dict) else {}
+
+
+_cache_control = _load_cache_control()
+
+
+def cache_control_for(route: str) -> str:
+  return str(_cache_control.get(route, DEFAULT_CACHE_CONTROL))
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == '*':
+    return True
+  # If-None-Match uses weak comparison, so W/"x" matches "x"
+  candidates = (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+  return etag in candidates
+
+
+class CatalogResponder:
+  """Per-request handle returned by :func:`catalog_response`."""
+
+  def __init__(self, resource: str, version: str, url_key: str, headers: Dict[str, str], adapter: TypeAdapter):
+    self.resource = resource
+    self.version = version
+    self.url_key = url_key
+    self.headers = headers
+    self.adapter = adapter
+
+  def respond(self, load: Callable[[], Any]) -> Response:
+    cache = _response_cache(self.resource) if settings.catalog_response_cache_enabled else None
+    key = (self.version, self.url_key)
+    body = cache.get(key) if cache is not None else None
+    if body is None:
+      body = self.adapter.dump_json(self.adapter.validate_python(load(), from_attributes=True))
+      # Only cache if no write landed while we were loading, otherwise we would pin pre-write data
+      if cache is not None and versions.current(self.resource) == self.version:
+        cache.set(key, body)
+    return Response(content=body, media_type='application/json', headers=self.headers)
+
+
+def catalog_response(resource: str, route: str, schema: Any):
+  """Build a dependency that answers 304 on a fresh ETag, or yields a :class:`CatalogResponder`.
+
+  The version is read before any data is loaded, so a concurrent write can
+  only make the ETag older than the body, never newer.
+  """
+
+  adapter = TypeAdapter(schema)
+
+  async def dependency(request: Request) -> CatalogResponder:
+    version = versions.current(resource)
+    etag = f'"{resource}-{version}"'
+    headers = {'ETag': etag, 'Cache-Control': cache_control_for(route)}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+      raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    url_key = f'{request.url.path}?{request.url.query}'
+    return CatalogResponder(resource, version, url_key, headers, adapter)
+
+  return dependency
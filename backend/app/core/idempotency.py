@@ -0,0 +1,269 @@
+"""``Idempotency-Key`` support for the endpoints that create orders and payments.
+
+The first request carrying a key claims a row in ``idempotency_keys`` before
+the handler runs, then stores the final status code and JSON body on it.
+Repeats of the key get those bytes back (with ``Idempotent-Replayed: true``)
+without running the handler again, so a retried checkout cannot create a
+second order, take stock twice or sign a second payment. Keys are scoped per
+user and endpoint; reusing one with a different body is rejected with 422.
+
+Finished responses are also kept in an in-process LRU so hot replays skip the
+table. A duplicate that arrives while the first request is still running waits
+for it, on an event within the worker or by polling the row across workers,
+and gets 409 with ``Retry-After`` if the first has not finished within
+``IDEMPOTENCY_WAIT_SECONDS``. Server errors release the claim so the client
+can retry; 4xx responses are stored like successes. The claim is settled in a
+``finally`` block, and a response whose row cannot be written is still kept
+in the LRU and written again once, so a handler that ran is not left behind
+a pending claim for a later duplicate to run again.
+
+Rows live for ``IDEMPOTENCY_TTL_SECONDS``. ``expires_at`` is indexed and
+expired rows are deleted in bulk while claiming.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, NamedTuple
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import TTLCache
+from app.core.database import SessionLocal
+from app.models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+REPLAY_HEADER = 'Idempotent-Replayed'
+POLL_INTERVAL_SECONDS = 0.1
+SWEEP_INTERVAL_SECONDS = 300
+# A claim left pending this long belongs to a request that died; the next duplicate takes it over
+STALE_CLAIM_SECONDS = 120
+
+
+class StoredResponse(NamedTuple):
+  request_hash: str
+  status_code: int
+  body: bytes
+
+
+def _in_progress() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail='A request with this Idempotency-Key is still being processed',
+    headers={'Retry-After': '1'}
+  )
+
+
+def _key_reused() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail='Idempotency-Key was already used with a different request body'
+  )
+
+
+class IdempotencyStore:
+  def __init__(self, ttl_seconds: float, cache_size: int, wait_seconds: float):
+    self.ttl_seconds = ttl_seconds
+    self.wait_seconds = wait_seconds
+    self._cache = TTLCache(cache_size, ttl_seconds)
+    self._inflight: Dict[tuple, threading.Event] = {}
+    self._lock = threading.Lock()
+    self._last_sweep = 0.0
+
+  def run(
+      self,
+      scope: str,
+      user_id: int,
+      key: str | None,
+      payload: BaseModel,
+      schema: Any,
+      handler: Callable[[], Any]
+  ) -> Any:
+    """Run ``handler`` at most once per ``(user_id, scope, key)`` and return its stored response.
+
+    Without a key the handler simply runs. ``schema`` is the route's response
+    model, used to serialize ORM results before they are stored.
+    """
+
+    if not key:
+      return handler()
+    ident = (user_id, scope, key)
+    request_hash = hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+    deadline = time.monotonic() + self.wait_seconds
+    while True:
+      stored = self._cache.get(ident)
+      if stored is not None:
+        return self._replay(stored, request_hash)
+      with self._lock:
+        event = self._inflight.get(ident)
+        owner = event is None
+        if owner:
+          event = self._inflight[ident] = threading.Event()
+      if not owner:
+        # Same worker: wait for the first request, then replay it (or take over if it failed)
+        if not event.wait(max(0.0, deadline - time.monotonic())):
+          raise _in_progress()
+        continue
+      try:
+        return self._run_owner(ident, request_hash, TypeAdapter(schema), handler, deadline)
+      finally:
+        with self._lock:
+          self._inflight.pop(ident, None)
+        event.set()
+
+  def _run_owner(self, ident: tuple, request_hash: str, adapter: TypeAdapter, handler: Callable[[], Any], deadline: float) -> Any:
+    stored = self._claim(ident, request_hash, deadline)
+    if stored is not None:
+      self._cache.set(ident, stored)
+      return self._replay(stored, request_hash)
+    stored: StoredResponse | None = None
+    try:
+      try:
+        result = handler()
+      except HTTPException as exc:
+        if exc.status_code < 500:
+          stored = StoredResponse(request_hash, exc.status_code, json.dumps({'detail': exc.detail}).encode())
+        raise
+      if isinstance(result, Response):
+        stored = StoredResponse(request_hash, result.status_code, bytes(result.body))
+      else:
+        stored = StoredResponse(request_hash, status.HTTP_200_OK, adapter.dump_json(adapter.validate_python(result, from_attributes=True)))
+    finally:
+      # Whatever happened, the claim must not stay pending: complete it with the response or release it
+      if stored is not None:
+        self._finish(ident, stored)
+      else:
+        self._release(ident)
+    return Response(content=stored.body, status_code=stored.status_code, media_type='application/json')
+
+  def _replay(self, stored: StoredResponse, request_hash: str) -> Response:
+    if stored.request_hash != request_hash:
+      raise _key_reused()
+    return Response(
+      content=stored.body,
+      status_code=stored.status_code,
+      media_type='application/json',
+      headers={REPLAY_HEADER: 'true'}
+    )
+
+  def _maybe_sweep(self, db: Session) -> None:
+    now = time.monotonic()
+    if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+      return
+    self._last_sweep = now
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow()))
+    db.commit()
+
+  def _claim(self, ident: tuple, request_hash: str, deadline: float) -> StoredResponse | None:
+    """Insert the pending row, or return the finished response another request stored."""
+
+    user_id, scope, key = ident
+    db = SessionLocal()
+    try:
+      self._maybe_sweep(db)
+      while True:
+        now = datetime.utcnow()
+        row = db.get(IdempotencyKey, (user_id, scope, key))
+        if row is not None and row.expires_at < now:
+          db.delete(row)
+          db.commit()
+          row = None
+        if row is None:
+          db.add(IdempotencyKey(
+            user_id=user_id,
+            scope=scope,
+            key=key,
+            request_hash=request_hash,
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.ttl_seconds)
+          ))
+          try:
+            db.commit()
+            return None
+          except IntegrityError:
+            db.rollback()
+            continue
+        if row.request_hash != request_hash:
+          raise _key_reused()
+        if row.status_code is not None:
+          return StoredResponse(row.request_hash, row.status_code, (row.response or '').encode())
+        if row.created_at < now - timedelta(seconds=STALE_CLAIM_SECONDS):
+          taken = db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .where(IdempotencyKey.created_at == row.created_at, IdempotencyKey.status_code.is_(None))
+            .values(created_at=now)
+          ).rowcount
+          db.commit()
+          if taken:
+            return None
+          continue
+        if time.monotonic() >= deadline:
+          raise _in_progress()
+        # End the transaction so the next read sees the other worker's commit
+        db.rollback()
+        time.sleep(POLL_INTERVAL_SECONDS)
+    finally:
+      db.close()
+
+  def _finish(self, ident: tuple, stored: StoredResponse) -> None:
+    """Store the response on the claim; never raises, since the handler's work is already done."""
+
+    # Cached first, so duplicates on this worker replay it even if the row cannot be written
+    self._cache.set(ident, stored)
+    user_id, scope, key = ident
+    for attempt in range(2):
+      db = SessionLocal()
+      try:
+        db.execute(
+          update(IdempotencyKey)
+          .where(IdempotencyKey.user_id == user_id, IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+          .values(status_code=stored.status_code, response=stored.body.decode())
+        )
+        db.commit()
+        return
+      except SQLAlchemyError:
+        db.rollback()
+        if attempt:
+          logger.exception('Could not store the response for idempotency key %s/%s', scope, key)
+        else:
+          time.sleep(POLL_INTERVAL_SECONDS)
+      finally:
+        db.close()
+
+  def _release(self, ident: tuple) -> None:
+    user_id, scope, key = ident
+    db = SessionLocal()
+    try:
+      db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+      )
+      db.commit()
+    except SQLAlchemyError:
+      # The claim goes stale and is taken over after STALE_CLAIM_SECONDS; do not hide the handler's error
+      db.rollback()
+      logger.exception('Could not release idempotency key %s/%s', scope, key)
+    finally:
+      db.close()
+
+  def stats(self) -> dict:
+    return {**self._cache.stats(), 'in_flight': len(self._inflight)}
+
+
+store = IdempotencyStore(settings.idempotency_ttl_seconds, settings.idempotency_cache_size, settings.idempotency_wait_seconds)
+
+
+def run(scope: str, user_id: int, key: str | None, payload: BaseModel, schema: Any, handler: Callable[[], Any]) -> Any:
+  return store.run(scope, user_id, key, payload, schema, handler)
@@ -0,0 +1,107 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor is the URL-safe base64 of a small JSON object holding the keyset
+position (e.g. ``{"id": 42}``). Clients treat it as an opaque string and pass
+back ``next_cursor`` unchanged. :func:`keyset_page` covers the common case of
+a sortable column plus a unique tiebreaker.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+  raw = json.dumps(position, separators=(',', ':'), default=str).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str | None) -> Dict[str, Any]:
+  if not cursor:
+    return {}
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+  except (binascii.Error, ValueError) as exc:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor') from exc
+  if not isinstance(position, dict):
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+  return position
+
+
+def cursor_value(position: Dict[str, Any], key: str, cast=int) -> Any:
+  """Read one keyset field from a decoded cursor, rejecting tampered values with 400."""
+
+  if position.get(key) is None:
+    return None
+  try:
+    return cast(position[key])
+  except (TypeError, ValueError) as exc:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor') from exc
+
+
+def _sort_cast(column: Any):
+  python_type = column.type.python_type
+  if python_type is datetime:
+    return datetime.fromisoformat
+  if python_type is date:
+    return date.fromisoformat
+  return python_type
+
+
+def keyset_page(
+    query: Query,
+    *,
+    sort: str,
+    sort_column: Any,
+    key_column: Any,
+    descending: bool = True,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None
+) -> Dict[str, Any]:
+  """One page of ``query`` ordered by ``(sort_column, key_column)`` using a seek predicate instead of OFFSET.
+
+  The cursor records the sort field and direction it was issued for, so
+  reusing it with a different ordering is rejected instead of skipping rows.
+  ``sort_column`` must be non-null for the seek predicate to be exact.
+  """
+
+  position = decode_cursor(cursor)
+  if position:
+    if position.get('s') != sort or position.get('d') != ('desc' if descending else 'asc'):
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Cursor does not match the requested sort')
+    value = cursor_value(position, 'v', _sort_cast(sort_column))
+    last_key = cursor_value(position, 'k', key_column.type.python_type)
+    if value is None or last_key is None:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+    if descending:
+      query = query.filter(or_(sort_column < value, and_(sort_column == value, key_column < last_key)))
+    else:
+      query = query.filter(or_(sort_column > value, and_(sort_column == value, key_column > last_key)))
+  if descending:
+    query = query.order_by(sort_column.desc(), key_column.desc())
+  else:
+    query = query.order_by(sort_column.asc(), key_column.asc())
+  rows = query.limit(limit + 1).all()
+  items = rows[:limit]
+  next_cursor = None
+  if len(rows) > limit:
+    last = items[-1]
+    next_cursor = encode_cursor({
+      's': sort,
+      'd': 'desc' if descending else 'asc',
+      'v': getattr(last, sort_column.key),
+      'k': getattr(last, key_column.key)
+    })
+  return {'items': items, 'next_cursor': next_cursor}
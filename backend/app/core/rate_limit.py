@@ -0,0 +1,249 @@
+"""Token-bucket throttling for the auth endpoints and the public WeChat JS-SDK config.
+
+Rules are declared per route and per key dimension (``ip``, ``phone``,
+``username``) as ``"<burst>/<seconds>"``: a bucket holds ``burst`` tokens and
+refills completely over ``seconds``. ``RATE_LIMITS`` (JSON) overrides the
+defaults, e.g. ``{"auth.login": {"ip": "60/60"}}``.
+
+The ``memory`` backend keeps buckets in this process. The ``sqlite`` backend
+stores them in a small SQLite file under ``app/state`` so every uvicorn worker
+on the host shares the same budget without touching MySQL.
+
+``python -m benchmarks.rate_limit`` measures the cost of a check per backend,
+including the eviction path once the memory backend is full.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DB_PATH = Path(__file__).resolve().parent.parent / 'state' / 'rate_limit.sqlite3'
+
+DEFAULT_RULES: Dict[str, Dict[str, str]] = {
+  'auth.send_code': {'ip': '20/3600', 'phone': '5/600'},
+  'auth.login': {'ip': '30/60', 'username': '10/300'},
+  'auth.code_login': {'ip': '30/60', 'phone': '10/300'},
+  'auth.admin_login': {'ip': '10/60', 'username': '5/300'},
+  'auth.refresh': {'ip': '60/60'},
+  'payments.wechat_config': {'ip': '120/60'},
+}
+
+
+@dataclass(frozen=True)
+class Rule:
+  capacity: float
+  refill_per_second: float
+
+  @classmethod
+  def parse(cls, spec: str) -> 'Rule':
+    """Parse ``"<burst>/<seconds>"``; raises ``ValueError`` unless burst is at least 1 and seconds is positive."""
+
+    burst, _, seconds = str(spec).partition('/')
+    capacity = float(burst)
+    period = float(seconds or 1)
+    if not capacity >= 1 or not period > 0:
+      raise ValueError(f'Invalid rate limit {spec!r}: burst must be at least 1 and seconds positive')
+    return cls(capacity=capacity, refill_per_second=capacity / period)
+
+  @property
+  def idle_seconds(self) -> float:
+    """How long an empty bucket takes to fill up again, after which it carries no state."""
+
+    return self.capacity / self.refill_per_second
+
+
+class MemoryBackend:
+  """Per-process buckets without a lock, in least-recently-used order.
+
+  Each bucket is a ``[tokens, updated, rule]`` list updated in place; two
+  threads racing on the same key can at worst both spend the last token,
+  which is an acceptable overshoot for throttling and keeps the hot path to a
+  dict lookup. Once ``max_keys`` buckets exist, a new key first drops the
+  oldest buckets that have refilled under their own rule, then the least
+  recently used ones, so a flood of new keys never resets the others at once.
+  """
+
+  blocking = False
+
+  def __init__(self, max_keys: int = 100_000):
+    self.max_keys = max_keys
+    self._buckets: OrderedDict[str, list] = OrderedDict()
+
+  def consume(self, key: str, rule: Rule, now: float | None = None) -> float:
+    now = time.monotonic() if now is None else now
+    bucket = self._buckets.get(key)
+    if bucket is None:
+      if len(self._buckets) >= self.max_keys:
+        self._evict(now)
+      self._buckets[key] = [rule.capacity - 1, now, rule]
+      return 0.0
+    self._buckets.move_to_end(key)
+    tokens = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.refill_per_second)
+    bucket[1] = now
+    bucket[2] = rule
+    if tokens >= 1:
+      bucket[0] = tokens - 1
+      return 0.0
+    bucket[0] = tokens
+    return (1 - tokens) / rule.refill_per_second
+
+  def _evict(self, now: float) -> None:
+    try:
+      while self._buckets:
+        key, bucket = next(iter(self._buckets.items()))
+        if now - bucket[1] < bucket[2].idle_seconds and len(self._buckets) < self.max_keys:
+          break
+        self._buckets.pop(key, None)
+    except (RuntimeError, StopIteration):
+      # Another thread changed the dict mid-walk; the next new key evicts again
+      pass
+
+
+class SQLiteBackend:
+  """Buckets shared by all workers on the host through one SQLite file.
+
+  At most every ``sweep_seconds`` a check also deletes the rows idle for
+  longer than the slowest configured rule takes to refill, since those
+  buckets are full again and a missing row reads the same.
+  """
+
+  blocking = True
+
+  def __init__(self, path: Path = RATE_LIMIT_DB_PATH, sweep_seconds: float = 60):
+    self.path = path
+    self.sweep_seconds = sweep_seconds
+    self._next_sweep = 0.0
+    self._local = threading.local()
+
+  def _connection(self) -> sqlite3.Connection:
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+      conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)')
+      self._local.conn = conn
+    return conn
+
+  def consume(self, key: str, rule: Rule, now: float | None = None) -> float:
+    # Wall clock, since monotonic clocks are not comparable across processes
+    now = time.time() if now is None else now
+    conn = self._connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+      tokens = rule.capacity if row is None else min(rule.capacity, row[0] + max(0.0, now - row[1]) * rule.refill_per_second)
+      retry_after = 0.0
+      if tokens >= 1:
+        tokens -= 1
+      else:
+        retry_after = (1 - tokens) / rule.refill_per_second
+      conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+      conn.execute('COMMIT')
+    except Exception:
+      conn.execute('ROLLBACK')
+      raise
+    if now >= self._next_sweep:
+      self._sweep(conn, now)
+    return retry_after
+
+  def _sweep(self, conn: sqlite3.Connection, now: float) -> None:
+    self._next_sweep = now + self.sweep_seconds
+    idle = max((rule.idle_seconds for dims in rules.values() for rule in dims.values()), default=0.0)
+    try:
+      conn.execute('DELETE FROM buckets WHERE updated < ?', (now - idle,))
+    except sqlite3.Error:
+      # Busy with another worker's writes; the next sweep catches up
+      logger.warning('Could not sweep idle rate-limit buckets', exc_info=True)
+
+
+def _load_rules() -> Dict[str, Dict[str, Rule]]:
+  loaded = {route: {dim: Rule.parse(spec) for dim, spec in dims.items()} for route, dims in DEFAULT_RULES.items()}
+  try:
+    overrides = json.loads(settings.rate_limits) if settings.rate_limits else {}
+  except ValueError:
+    overrides = {}
+  if isinstance(overrides, dict):
+    for route, dims in overrides.items():
+      if not isinstance(dims, dict):
+        continue
+      route_rules = loaded.setdefault(route, {})
+      for dim, spec in dims.items():
+        if not spec:
+          route_rules.pop(dim, None)
+          continue
+        try:
+          route_rules[dim] = Rule.parse(spec)
+        except ValueError:
+          logger.warning('Ignoring RATE_LIMITS %s.%s = %r; keeping the default', route, dim, spec)
+  return loaded
+
+
+rules = _load_rules()
+backend = SQLiteBackend() if settings.rate_limit_backend == 'sqlite' else MemoryBackend()
+
+
+def client_ip(request: Request) -> str:
+  if settings.rate_limit_trust_proxy:
+    forwarded = request.headers.get('x-forwarded-for')
+    if forwarded:
+      return forwarded.split(',')[0].strip()
+  return request.client.host if request.client else 'unknown'
+
+
+def rate_limit(route: str, *fields: str):
+  """Build a route dependency that throttles by client IP plus the given JSON body fields.
+
+  Route-level dependencies run before the handler's own, so a throttled
+  request is rejected before any session query or password hashing.
+  """
+
+  async def dependency(request: Request) -> None:
+    route_rules = rules.get(route)
+    if not route_rules or not settings.rate_limit_enabled:
+      return
+    keys = [('ip', client_ip(request))]
+    if fields:
+      try:
+        body = await request.json()
+      except ValueError:
+        body = {}
+      if isinstance(body, dict):
+        keys.extend((field, str(body[field])) for field in fields if body.get(field))
+
+    retry_after = 0.0
+    for dimension, value in keys:
+      rule = route_rules.get(dimension)
+      if rule is None:
+        continue
+      key = f'{route}:{dimension}:{value}'
+      if backend.blocking:
+        wait = await run_in_threadpool(backend.consume, key, rule)
+      else:
+        wait = backend.consume(key, rule)
+      retry_after = max(retry_after, wait)
+    if retry_after > 0:
+      raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail='请求过于频繁，请稍后再试',
+        headers={'Retry-After': str(math.ceil(retry_after))}
+      )
+
+  return dependency
@@ -0,0 +1,63 @@
+"""Multi-row insert-or-update keyed on a unique constraint.
+
+One ``INSERT ... ON DUPLICATE KEY UPDATE`` per chunk on MySQL and
+``INSERT ... ON CONFLICT DO UPDATE`` on SQLite, instead of a SELECT and an
+INSERT or UPDATE per row. ``keys`` must be covered by a unique index (it is
+the conflict target on SQLite); other dialects fall back to one lookup per
+row.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping, Sequence
+
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+# Well under SQLite's bound-parameter limit for the widest seeded tables
+CHUNK_SIZE = 500
+
+
+def bulk_upsert(
+    db: Session,
+    model,
+    rows: Iterable[Mapping[str, Any]],
+    *,
+    keys: Sequence[str],
+    update: Sequence[str]
+) -> int:
+  """Insert ``rows``; rows whose ``keys`` already exist get their ``update`` columns overwritten.
+
+  With an empty ``update`` existing rows are left alone. Every row must carry
+  the same columns. Does not commit; returns the number of rows written.
+  """
+
+  rows = [dict(row) for row in rows]
+  if not rows:
+    return 0
+  table = model.__table__
+  dialect = db.get_bind().dialect.name
+  for start in range(0, len(rows), CHUNK_SIZE):
+    chunk = rows[start:start + CHUNK_SIZE]
+    if dialect == 'mysql':
+      stmt = mysql_insert(table).values(chunk)
+      # A self-assignment keeps existing rows untouched without INSERT IGNORE swallowing other errors
+      assignments = {name: stmt.inserted[name] for name in update} or {keys[0]: table.c[keys[0]]}
+      db.execute(stmt.on_duplicate_key_update(assignments))
+    elif dialect == 'sqlite':
+      stmt = sqlite_insert(table).values(chunk)
+      if update:
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_={name: stmt.excluded[name] for name in update})
+      else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(keys))
+      db.execute(stmt)
+    else:
+      for row in chunk:
+        match = and_(*(table.c[name] == row[name] for name in keys))
+        if db.execute(select(table.c[keys[0]]).where(match)).first() is None:
+          db.execute(table.insert().values(row))
+        elif update:
+          db.execute(table.update().where(match).values({name: row[name] for name in update}))
+  return len(rows)
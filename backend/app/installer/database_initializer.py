@@ -8,7 +8,7 @@ from sqlalchemy import inspect, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from app.core.database import Base
+from app.core.database import Base, upgrade_schema
 from app.installer import seeder
 
 
@@ -16,6 +16,7 @@ def create_schema(engine: Engine) -> sessionmaker:
   """Create all tables and return a configured ``sessionmaker``."""
 
   Base.metadata.create_all(bind=engine)
+  upgrade_schema(engine)
   inspector = inspect(engine)
   columns = [col['name'] for col in inspector.get_columns('users')]
   if 'phone' not in columns:
@@ -7,6 +7,7 @@ from typing import Any, Dict, Iterable, List
 
 from sqlalchemy.orm import Session
 
+from app.core.upsert import bulk_upsert
 from app.models.admin import AdminOrder, AdminOrderItem, AdminUserProfile, Course, CourseLesson
 from app.models.integration import IntegrationConfig
 from app.models.membership import AdminDashboardStat, MembershipSetting, RechargeRecord
@@ -14,6 +15,7 @@ from app.models.product import Product
 from app.models.system_setting import SystemSetting
 from app.models.user import User
 from app.services.auth_service import get_password_hash
+from app.services.system_config_service import invalidate_snapshot
 
 SEED_ROOT = Path(__file__).resolve().parent.parent / 'install' / 'seed_data'
 
@@ -69,7 +71,7 @@ def seed_admin_users(db: Session, *, overwrite_existing: bool = True) -> None:
       'phone': item['phone'],
       'level': item['level'],
       'register_at': datetime.fromisoformat(item['registerAt']),
-      'spend': item.get('spend', 0),
+      'spend': item.get('spend') or 0,
       'tests': item.get('tests', 0),
       'benefits': item.get('benefits', ''),
       'recharges': item.get('recharges', []),
@@ -148,20 +150,23 @@ def seed_courses(db: Session, *, overwrite_existing: bool = True) -> None:
 
 def seed_settings(db: Session, overrides: Dict[str, str], *, overwrite_existing: bool = True) -> None:
   settings: Iterable[Dict[str, str]] = _read_json('system_settings.json')
+  rows = []
   for setting in settings:
     merged_value = overrides.get(setting['key']) if overrides.get(setting['key']) is not None else setting['value']
-    exists = db.query(SystemSetting).filter(SystemSetting.category == setting['category'], SystemSetting.key == setting['key']).first()
-    if exists:
-      if overwrite_existing:
-        exists.value = str(merged_value)
-        db.add(exists)
-      continue
-    db.add(SystemSetting(category=setting['category'], key=setting['key'], value=str(merged_value), description=setting.get('description', '')))
+    rows.append({
+      'category': setting['category'],
+      'key': setting['key'],
+      'value': str(merged_value),
+      'description': setting.get('description', '')
+    })
+  bulk_upsert(db, SystemSetting, rows, keys=('category', 'key'), update=('value',) if overwrite_existing else ())
   db.commit()
+  invalidate_snapshot()
 
 
 def seed_integrations(db: Session, wechat_config: Dict[str, Any], sms_config: Dict[str, Any], *, overwrite_existing: bool = True) -> None:
   integrations: List[Dict[str, Any]] = _read_json('integrations.json')
+  rows = []
   for entry in integrations:
     provider = entry.get('provider')
     config = entry.get('config', {})
@@ -183,66 +188,54 @@ def seed_integrations(db: Session, wechat_config: Dict[str, Any], sms_config: Di
       })
       is_active = bool(sms_config.get('provider'))
 
-    existing = db.query(IntegrationConfig).filter(IntegrationConfig.provider == provider).first()
-    if existing:
-      if overwrite_existing:
-        existing.config = config
-        existing.is_active = is_active
-        existing.label = label
-        db.add(existing)
-      continue
-    db.add(IntegrationConfig(provider=provider, config=config, is_active=is_active, label=label))
+    rows.append({'provider': provider, 'config': config, 'is_active': is_active, 'label': label})
+  bulk_upsert(
+    db, IntegrationConfig, rows,
+    keys=('provider',), update=('config', 'is_active', 'label') if overwrite_existing else ()
+  )
   db.commit()
+  invalidate_snapshot()
 
 
 def seed_membership_settings(db: Session, *, overwrite_existing: bool = True) -> None:
-  settings: List[Dict[str, Any]] = _read_json('membership_settings.json')
-  for setting in settings:
-    existing = db.query(MembershipSetting).filter(MembershipSetting.level == setting['level']).first()
-    if existing:
-      if overwrite_existing:
-        existing.price = setting['price']
-        existing.duration_days = setting.get('duration_days', 0)
-        existing.description = setting.get('description', '')
-        db.add(existing)
-      continue
-    db.add(MembershipSetting(**setting))
+  rows = [
+    {
+      'level': setting['level'],
+      'price': setting['price'],
+      'duration_days': setting.get('duration_days', 0),
+      'description': setting.get('description', '')
+    }
+    for setting in _read_json('membership_settings.json')
+  ]
+  bulk_upsert(
+    db, MembershipSetting, rows,
+    keys=('level',), update=('price', 'duration_days', 'description') if overwrite_existing else ()
+  )
   db.commit()
 
 
 def seed_recharge_records(db: Session, *, overwrite_existing: bool = True) -> None:
   records: List[Dict[str, Any]] = _read_json('admin_payments.json')
-  for record in records:
-    order_no = record['orderNo']
-    existing = db.query(RechargeRecord).filter(RechargeRecord.order_no == order_no).first()
-    paid_at = datetime.fromisoformat(record['time'])
-    payload = {
+  rows = [
+    {
       'user_display': record['user'],
       'level': record['level'],
       'amount': record['amount'],
       'channel': record.get('channel', ''),
-      'order_no': order_no,
-      'paid_at': paid_at
+      'order_no': record['orderNo'],
+      'paid_at': datetime.fromisoformat(record['time'])
     }
-    if existing:
-      if overwrite_existing:
-        for key, value in payload.items():
-          setattr(existing, key, value)
-        db.add(existing)
-      continue
-    db.add(RechargeRecord(**payload))
+    for record in records
+  ]
+  bulk_upsert(
+    db, RechargeRecord, rows,
+    keys=('order_no',), update=('user_display', 'level', 'amount', 'channel', 'paid_at') if overwrite_existing else ()
+  )
   db.commit()
 
 
 def seed_dashboard_stats(db: Session, *, overwrite_existing: bool = True) -> None:
   stats: List[Dict[str, Any]] = _read_json('admin_dashboard_stats.json')
-  for entry in stats:
-    existing = db.query(AdminDashboardStat).filter(AdminDashboardStat.label == entry['label']).first()
-    if existing:
-      if overwrite_existing:
-        existing.value = entry.get('value', '')
-        existing.note = entry.get('note', '')
-        db.add(existing)
-      continue
-    db.add(AdminDashboardStat(label=entry['label'], value=entry.get('value', ''), note=entry.get('note', '')))
+  rows = [{'label': entry['label'], 'value': entry.get('value', ''), 'note': entry.get('note', '')} for entry in stats]
+  bulk_upsert(db, AdminDashboardStat, rows, keys=('label',), update=('value', 'note') if overwrite_existing else ())
   db.commit()
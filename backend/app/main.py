@@ -2,8 +2,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.routes import admin, auth, courses, install, orders, payments, products
+from app.core import hashing
 from app.core.database import init_db
 from app.core.exceptions import add_exception_handlers
+from app.services.flash_sale_service import flash_sale
+from app.services.fulfilment_service import fulfilment
+from app.services.order_expiry_service import order_expiry
+from app.services.wechat_jssdk_service import jssdk
+from app.services.wechat_pay_service import wechat_pay
+from app.services.sms_service import sms
 
 
 def create_app() -> FastAPI:
@@ -30,6 +37,16 @@ def create_app() -> FastAPI:
   app.include_router(install.router)
   app.include_router(admin.router, prefix='/admin', tags=['admin'])
   add_exception_handlers(app)
+  app.add_event_handler('shutdown', hashing.shutdown)
+  app.add_event_handler('shutdown', flash_sale.shutdown)
+  app.add_event_handler('startup', fulfilment.start)
+  app.add_event_handler('shutdown', fulfilment.shutdown)
+  app.add_event_handler('shutdown', jssdk.close)
+  app.add_event_handler('startup', wechat_pay.bind_loop)
+  app.add_event_handler('shutdown', wechat_pay.aclose)
+  app.add_event_handler('shutdown', sms.shutdown)
+  app.add_event_handler('startup', order_expiry.start)
+  app.add_event_handler('shutdown', order_expiry.shutdown)
   return app
 
 
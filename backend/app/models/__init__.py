@@ -6,6 +6,10 @@ from app.models.system_setting import SystemSetting
 from app.models.integration import IntegrationConfig
 from app.models.membership import AdminDashboardStat, MembershipSetting, RechargeRecord
 from app.models.admin import AdminOrder, AdminOrderItem, AdminUserProfile, Course, CourseLesson
+from app.models.verification_code import VerificationCode
+from app.models.revoked_token import RevokedToken
+from app.models.idempotency_key import IdempotencyKey
+from app.models.sales_rollup import SalesRollup
 
 __all__ = [
   'User',
@@ -22,5 +26,9 @@ __all__ = [
   'AdminOrderItem',
   'AdminUserProfile',
   'Course',
-  'CourseLesson'
+  'CourseLesson',
+  'VerificationCode',
+  'RevokedToken',
+  'IdempotencyKey',
+  'SalesRollup'
 ]
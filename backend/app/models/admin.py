@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, Numeric, String, Text
 from sqlalchemy.dialects.mysql import JSON
 from sqlalchemy.orm import relationship
 
@@ -7,13 +7,22 @@ from app.core.database import Base
 
 class AdminUserProfile(Base):
   __tablename__ = 'admin_user_profiles'
+  # Keyset paging for /admin/users: each index ends in the sort column, InnoDB appends the primary key
+  __table_args__ = (
+    Index('ix_admin_user_profiles_register_at', 'register_at'),
+    Index('ix_admin_user_profiles_level_register_at', 'level', 'register_at'),
+    Index('ix_admin_user_profiles_spend', 'spend'),
+    Index('ix_admin_user_profiles_level', 'level'),
+    Index('ix_admin_user_profiles_nickname', 'nickname'),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   nickname = Column(String(100), nullable=False)
   phone = Column(String(50), unique=True, nullable=False)
   level = Column(String(50), nullable=False)
   register_at = Column(DateTime, nullable=False)
-  spend = Column(Numeric(10, 2), default=0)
+  # NOT NULL so the spend sort pages through its index without NULLs to special-case
+  spend = Column(Numeric(10, 2), nullable=False, default=0, server_default='0')
   tests = Column(Integer, default=0)
   benefits = Column(Text, default='')
   recharges = Column(JSON, default=[])
@@ -22,6 +31,15 @@ class AdminUserProfile(Base):
 
 class AdminOrder(Base):
   __tablename__ = 'admin_orders'
+  __table_args__ = (
+    Index('ix_admin_orders_status_created_at', 'status', 'created_at'),
+    Index('ix_admin_orders_channel_created_at', 'channel', 'created_at'),
+    Index('ix_admin_orders_amount', 'amount'),
+    Index('ix_admin_orders_user', 'user'),
+    # Covers /admin/analytics/timeseries order counts without touching the rows, and serves plain created_at
+    # ranges and sorts through its leading column
+    Index('ix_admin_orders_created_at_channel', 'created_at', 'channel'),
+  )
 
   id = Column(String(64), primary_key=True, index=True)
   user = Column(String(100), nullable=False)
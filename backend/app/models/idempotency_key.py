@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+  __tablename__ = 'idempotency_keys'
+
+  user_id = Column(Integer, primary_key=True, autoincrement=False)
+  scope = Column(String(40), primary_key=True)
+  key = Column(String(128), primary_key=True)
+  request_hash = Column(String(64), nullable=False)
+  status_code = Column(Integer, nullable=True)
+  response = Column(Text, nullable=True)
+  created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+  expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,13 +1,17 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Index, Integer, String
 from sqlalchemy.dialects.mysql import JSON
 from app.core.database import Base
 
 
 class IntegrationConfig(Base):
   __tablename__ = 'integration_configs'
+  # Conflict target of the bulk upsert in save_config and the seeder
+  __table_args__ = (
+    Index('uq_integration_configs_provider', 'provider', unique=True),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
-  provider = Column(String(50), nullable=False, index=True)
+  provider = Column(String(50), nullable=False)
   label = Column(String(100), default='')
   is_active = Column(Boolean, default=True)
   config = Column(JSON, default={})
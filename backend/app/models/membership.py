@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, Integer, Numeric, String
+from sqlalchemy import Column, DateTime, Index, Integer, Numeric, String
 from app.core.database import Base
 
 
@@ -14,6 +14,15 @@ class MembershipSetting(Base):
 
 class RechargeRecord(Base):
   __tablename__ = 'recharge_records'
+  __table_args__ = (
+    Index('ix_recharge_records_channel_paid_at', 'channel', 'paid_at'),
+    Index('ix_recharge_records_level_paid_at', 'level', 'paid_at'),
+    Index('ix_recharge_records_amount', 'amount'),
+    Index('ix_recharge_records_user_display', 'user_display'),
+    # Covers /admin/analytics/timeseries: range on paid_at, everything it groups and sums is in the index; its
+    # leading column also serves plain paid_at ranges and sorts
+    Index('ix_recharge_records_paid_at_cover', 'paid_at', 'channel', 'level', 'user_display', 'amount'),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   user_display = Column(String(50), nullable=False)
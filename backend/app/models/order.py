@@ -1,15 +1,22 @@
-from sqlalchemy import Column, Integer, ForeignKey, Numeric, String
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, ForeignKey, Numeric, String
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 
 class Order(Base):
   __tablename__ = 'orders'
+  # Order expiry reads pending orders by creation time
+  __table_args__ = (
+    Index('ix_orders_status_created_at', 'status', 'created_at'),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
   total_amount = Column(Numeric(10, 2), default=0)
   status = Column(String(20), default='pending')
+  created_at = Column(DateTime, default=datetime.utcnow)
 
   items = relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
 
@@ -24,3 +31,4 @@ class OrderItem(Base):
   price = Column(Numeric(10, 2), default=0)
 
   order = relationship('Order', back_populates='items')
+  product = relationship('Product')
@@ -1,12 +1,27 @@
-from sqlalchemy import Column, Integer, ForeignKey, String
+import secrets
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, ForeignKey, String
 from app.core.database import Base
 
 
+def new_out_trade_no() -> str:
+  # WeChat caps out_trade_no at 32 characters: 14-digit UTC timestamp plus 16 random hex digits
+  return datetime.utcnow().strftime('%Y%m%d%H%M%S') + secrets.token_hex(8)
+
+
 class Payment(Base):
   __tablename__ = 'payments'
+  # Notify callbacks look payments up by the merchant trade number; NULLs (older rows) do not collide
+  __table_args__ = (
+    Index('ix_payments_out_trade_no', 'out_trade_no', unique=True),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
   provider = Column(String(50), default='wechat')
   status = Column(String(20), default='pending')
+  out_trade_no = Column(String(32), nullable=True, default=new_out_trade_no)
+  transaction_id = Column(String(64), nullable=True)
   raw_notify = Column(String(2000), default='')
+  paid_at = Column(DateTime, nullable=True)
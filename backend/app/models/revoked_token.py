@@ -0,0 +1,13 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String
+
+from app.core.database import Base
+
+
+class RevokedToken(Base):
+  __tablename__ = 'revoked_tokens'
+
+  jti = Column(String(64), primary_key=True)
+  expires_at = Column(DateTime, nullable=False, index=True)
+  revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
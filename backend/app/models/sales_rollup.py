@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Date, Integer, Numeric, String
+
+from app.core.database import Base
+
+
+class SalesRollup(Base):
+  """Running order and payment totals per report day, channel and membership level."""
+
+  __tablename__ = 'sales_rollups'
+
+  day = Column(Date, primary_key=True)
+  channel = Column(String(20), primary_key=True)
+  level = Column(String(50), primary_key=True)
+  order_count = Column(Integer, nullable=False, default=0)
+  order_amount = Column(Numeric(12, 2), nullable=False, default=0)
+  paid_count = Column(Integer, nullable=False, default=0)
+  paid_amount = Column(Numeric(12, 2), nullable=False, default=0)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.core.database import Base
+
+
+class VerificationCode(Base):
+  __tablename__ = 'verification_codes'
+
+  phone = Column(String(20), primary_key=True)
+  code = Column(String(12), nullable=False)
+  expires_at = Column(DateTime, nullable=False, index=True)
+  attempts = Column(Integer, default=0, nullable=False)
+  # Failed attempts count until then, across re-sent codes; NULL on older rows means expires_at
+  window_expires_at = Column(DateTime, nullable=True)
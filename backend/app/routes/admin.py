@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from app.core import http_cache, idempotency, tokens
 from app.core.database import get_db
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.schemas.admin import (
   AdminOrderOut,
-  AdminPaymentRecord,
-  AdminUserProfileOut,
+  AdminOrderPage,
+  AdminPaymentPage,
+  AdminUserPage,
+  AnalyticsSeries,
   DashboardStat,
   DatabaseTestRequest,
   DatabaseTestResult,
+  SalesDay,
   SystemConfig,
   SystemConfigUpdate
 )
@@ -16,8 +25,18 @@ from app.schemas.course import CourseCreate, CourseOut
 from app.schemas.product import ProductCreate, ProductOut
 from app.services import auth_service, course_service, product_service
 import app.services.admin_data_service as admin_data_service
+import app.services.analytics_service as analytics_service
 import app.services.database_service as database_service
+import app.services.export_service as export_service
+import app.services.flash_sale_service as flash_sale_service
+import app.services.fulfilment_service as fulfilment_service
+import app.services.order_expiry_service as order_expiry_service
+import app.services.revocation_service as revocation_service
+import app.services.sales_rollup_service as sales_rollup_service
 import app.services.system_config_service as system_config_service
+import app.services.wechat_jssdk_service as wechat_jssdk_service
+import app.services.wechat_pay_service as wechat_pay_service
+import app.services.sms_service as sms_service
 
 router = APIRouter()
 
@@ -28,28 +47,98 @@ def admin_root():
     'message': 'Admin API root',
     'endpoints': [
       '/admin/dashboard',
+      '/admin/dashboard/sales',
+      '/admin/analytics/timeseries',
       '/admin/users',
       '/admin/products',
       '/admin/orders',
+      '/admin/export/{resource}',
       '/admin/database/test',
-      '/admin/config'
+      '/admin/config',
+      '/admin/metrics'
     ]
   }
 
 
+@router.get('/metrics', dependencies=[Depends(auth_service.get_current_admin)])
+def admin_metrics():
+  return {
+    'principal_cache': auth_service.principal_cache_stats(),
+    'jwt_cache': tokens.cache_stats(),
+    'token_revocations': revocation_service.revocations.stats(),
+    'catalog_responses': http_cache.response_cache_stats(),
+    'flash_sale': flash_sale_service.flash_sale.stats(),
+    'idempotency': idempotency.store.stats(),
+    'fulfilment': fulfilment_service.fulfilment.stats(),
+    'order_expiry': order_expiry_service.order_expiry.stats(),
+    'sales_rollups': sales_rollup_service.stats(),
+    'config_snapshot': system_config_service.snapshot_stats(),
+    'wechat_jssdk': wechat_jssdk_service.jssdk.stats(),
+    'wechat_pay': wechat_pay_service.wechat_pay.stats(),
+    'sms': sms_service.sms.stats(),
+    'analytics': analytics_service.cache_stats()
+  }
+
+
 @router.get('/dashboard', response_model=list[DashboardStat], dependencies=[Depends(auth_service.get_current_admin)])
 def dashboard(db: Session = Depends(get_db)):
   return admin_data_service.list_dashboard_stats(db)
 
 
-@router.get('/users', response_model=list[AdminUserProfileOut], dependencies=[Depends(auth_service.get_current_admin)])
-def list_users(db: Session = Depends(get_db)):
-  return admin_data_service.list_admin_users(db)
-
-
-@router.get('/payments', response_model=list[AdminPaymentRecord], dependencies=[Depends(auth_service.get_current_admin)])
-def list_payments(db: Session = Depends(get_db)):
-  return admin_data_service.list_recharge_records(db)
+@router.get('/dashboard/sales', response_model=list[SalesDay], dependencies=[Depends(auth_service.get_current_admin)])
+def dashboard_sales(days: int = Query(30, ge=1, le=366), db: Session = Depends(get_db)):
+  return sales_rollup_service.daily(db, days)
+
+
+@router.post('/dashboard/rebuild', dependencies=[Depends(auth_service.get_current_admin)])
+def rebuild_dashboard(db: Session = Depends(get_db)):
+  return {'rows': sales_rollup_service.rebuild(db)}
+
+
+@router.get('/analytics/timeseries', response_model=AnalyticsSeries, dependencies=[Depends(auth_service.get_current_admin)])
+def analytics_timeseries(
+    granularity: Literal['hour', 'day', 'week'] = 'day',
+    split: Literal['channel', 'level'] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: Session = Depends(get_db)
+):
+  return analytics_service.timeseries(db, granularity=granularity, split=split, start=start, end=end)
+
+
+@router.get('/users', response_model=AdminUserPage, dependencies=[Depends(auth_service.get_current_admin)])
+def list_users(
+    level: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    q: str | None = Query(None, max_length=50),
+    sort: Literal['register_at', 'spend', 'level'] = 'register_at',
+    order: Literal['desc', 'asc'] = 'desc',
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db)
+):
+  return admin_data_service.list_admin_users(
+    db, level=level, start=start, end=end, q=q, sort=sort, descending=order == 'desc', limit=limit, cursor=cursor
+  )
+
+
+@router.get('/payments', response_model=AdminPaymentPage, dependencies=[Depends(auth_service.get_current_admin)])
+def list_payments(
+    channel: str | None = None,
+    level: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    q: str | None = Query(None, max_length=64),
+    sort: Literal['paid_at', 'amount'] = 'paid_at',
+    order: Literal['desc', 'asc'] = 'desc',
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db)
+):
+  return admin_data_service.list_recharge_records(
+    db, channel=channel, level=level, start=start, end=end, q=q, sort=sort, descending=order == 'desc', limit=limit, cursor=cursor
+  )
 
 
 @router.get('/products', response_model=list[ProductOut], dependencies=[Depends(auth_service.get_current_admin)])
@@ -73,9 +162,39 @@ def admin_delete_product(product_id: int, db: Session = Depends(get_db)):
   return {'status': 'deleted'}
 
 
-@router.get('/orders', response_model=list[AdminOrderOut], dependencies=[Depends(auth_service.get_current_admin)])
-def admin_orders(db: Session = Depends(get_db)):
-  return admin_data_service.list_admin_orders(db)
+@router.get('/orders', response_model=AdminOrderPage, dependencies=[Depends(auth_service.get_current_admin)])
+def admin_orders(
+    status: str | None = None,
+    channel: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    q: str | None = Query(None, max_length=100),
+    sort: Literal['created_at', 'amount'] = 'created_at',
+    order: Literal['desc', 'asc'] = 'desc',
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db)
+):
+  return admin_data_service.list_admin_orders(
+    db, status=status, channel=channel, start=start, end=end, q=q, sort=sort, descending=order == 'desc', limit=limit, cursor=cursor
+  )
+
+
+@router.get('/export/{resource}', dependencies=[Depends(auth_service.get_current_admin)])
+def export_resource(
+    resource: Literal['orders', 'payments', 'users'],
+    format: Literal['csv', 'ndjson'] = 'csv',
+    gzip: bool = False,
+    start: datetime | None = None,
+    end: datetime | None = None
+):
+  media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+  filename = export_service.export_filename(resource, format, gzip)
+  return StreamingResponse(
+    export_service.stream_export(resource, fmt=format, compress=gzip, start=start, end=end),
+    media_type='application/gzip' if gzip else media_type,
+    headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+  )
 
 
 @router.get('/orders/{order_id}', response_model=AdminOrderOut, dependencies=[Depends(auth_service.get_current_admin)])
@@ -111,7 +230,9 @@ def admin_test_database(payload: DatabaseTestRequest):
 
 @router.post('/database/seed', dependencies=[Depends(auth_service.get_current_admin)])
 def admin_seed_database(db: Session = Depends(get_db)):
-  return database_service.initialize_seed_data(db, overwrite_existing=False)
+  result = database_service.initialize_seed_data(db, overwrite_existing=False)
+  analytics_service.clear_cache()
+  return result
 
 
 @router.get('/config', response_model=SystemConfig, dependencies=[Depends(auth_service.get_current_admin)])
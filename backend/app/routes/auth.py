@@ -1,48 +1,57 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.schemas.auth import LoginResponse, Token, LoginRequest, SendCodeRequest, PhoneLoginRequest
+from app.schemas.auth import LoginResponse, LogoutRequest, RefreshRequest, Token, LoginRequest, SendCodeRequest, PhoneLoginRequest
 from app.schemas.user import UserOut, UserCreate
 from app.services import auth_service
 from app.core.database import get_db
+from app.core.rate_limit import rate_limit
 
 router = APIRouter()
 
 
-@router.post('/login', response_model=Token)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-  user = auth_service.authenticate_user(db, payload.username, payload.password)
-  token = auth_service.create_access_token(auth_service.build_token_payload(user))
-  return {'access_token': token, 'token_type': 'bearer'}
+@router.post('/login', response_model=Token, dependencies=[Depends(rate_limit('auth.login', 'username'))])
+async def login(payload: LoginRequest, db: Session = Depends(get_db)):
+  user = await auth_service.authenticate_user(db, payload.username, payload.password)
+  return auth_service.issue_tokens(user)
 
 
-@router.post('/send-code')
-def send_code(payload: SendCodeRequest):
-  code = auth_service.send_verification_code(payload.phone)
-  return {'message': '验证码已发送', 'code': code}
+@router.post('/send-code', dependencies=[Depends(rate_limit('auth.send_code', 'phone'))])
+def send_code(payload: SendCodeRequest, db: Session = Depends(get_db)):
+  code = auth_service.send_verification_code(db, payload.phone)
+  # Only without a real SMS gateway (local development) is the code shown to the caller
+  return {'message': '验证码已发送', 'code': code} if code else {'message': '验证码已发送'}
 
 
-@router.post('/code-login', response_model=LoginResponse)
-def code_login(payload: PhoneLoginRequest, db: Session = Depends(get_db)):
-  user, newly_registered = auth_service.login_with_phone_code(db, payload.phone, payload.code)
-  token = auth_service.create_access_token(auth_service.build_token_payload(user))
+@router.post('/code-login', response_model=LoginResponse, dependencies=[Depends(rate_limit('auth.code_login', 'phone'))])
+async def code_login(payload: PhoneLoginRequest, db: Session = Depends(get_db)):
+  user, newly_registered = await auth_service.login_with_phone_code(db, payload.phone, payload.code)
   return {
-    'access_token': token,
-    'token_type': 'bearer',
+    **auth_service.issue_tokens(user),
     'user': user,
     'newly_registered': newly_registered
   }
 
 
-@router.post('/admin/login', response_model=Token)
-def admin_login(payload: LoginRequest, db: Session = Depends(get_db)):
-  user, is_default_admin = auth_service.admin_login(db, payload.username, payload.password)
-  token = auth_service.create_access_token(auth_service.build_token_payload(user))
-  return {'access_token': token, 'token_type': 'bearer', 'is_default_admin': is_default_admin}
+@router.post('/admin/login', response_model=Token, dependencies=[Depends(rate_limit('auth.admin_login', 'username'))])
+async def admin_login(payload: LoginRequest, db: Session = Depends(get_db)):
+  user, is_default_admin = await auth_service.admin_login(db, payload.username, payload.password)
+  return {**auth_service.issue_tokens(user), 'is_default_admin': is_default_admin}
+
+
+@router.post('/refresh', response_model=Token, dependencies=[Depends(rate_limit('auth.refresh'))])
+def refresh(payload: RefreshRequest, db: Session = Depends(get_db)):
+  return auth_service.refresh_tokens(db, payload.refresh_token)
+
+
+@router.post('/logout')
+def logout(payload: LogoutRequest | None = None, token: str = Depends(auth_service.oauth2_scheme), db: Session = Depends(get_db)):
+  auth_service.logout(db, token, payload.refresh_token if payload else None)
+  return {'status': 'logged_out'}
 
 
 @router.post('/register', response_model=UserOut)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-  user = auth_service.register_user(db, payload)
+async def register(payload: UserCreate, db: Session = Depends(get_db)):
+  user = await auth_service.register_user(db, payload)
   return user
 
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.http_cache import CatalogResponder, catalog_response
 from app.schemas.course import CourseCreate, CourseOut
 from app.services import course_service
 
@@ -9,12 +10,19 @@ router = APIRouter()
 
 
 @router.get('/', response_model=list[CourseOut])
-def list_courses(db: Session = Depends(get_db)):
-  return course_service.list_courses(db)
+def list_courses(
+    catalog: CatalogResponder = Depends(catalog_response('courses', 'courses.list', list[CourseOut])),
+    db: Session = Depends(get_db)
+):
+  return catalog.respond(lambda: course_service.list_courses(db))
 
 
 @router.get('/{course_id}', response_model=CourseOut)
-def get_course(course_id: int, db: Session = Depends(get_db)):
-  return course_service.get_course(db, course_id)
+def get_course(
+    course_id: int,
+    catalog: CatalogResponder = Depends(catalog_response('courses', 'courses.detail', CourseOut)),
+    db: Session = Depends(get_db)
+):
+  return catalog.respond(lambda: course_service.get_course(db, course_id))
 
 
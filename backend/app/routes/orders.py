@@ -1,20 +1,59 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from app.core import idempotency
 from app.core.database import get_db
-from app.schemas.order import OrderOut, OrderCreate
-from app.services import order_service, auth_service
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.core.rate_limit import client_ip
+from app.schemas.order import OrderOut, OrderCreate, OrderPage, OrderTicket
+from app.services import order_service, auth_service, payment_service
+from app.services.flash_sale_service import flash_sale
 
 router = APIRouter()
 
 
-@router.get('/', response_model=list[OrderOut])
-def list_my_orders(db: Session = Depends(get_db), current_user=Depends(auth_service.get_current_user)):
-  return order_service.list_orders(db, current_user.id)
+@router.get('/', response_model=OrderPage)
+def list_my_orders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(auth_service.get_current_user)
+):
+  return order_service.page_orders(db, current_user.id, limit=limit, cursor=cursor)
 
 
-@router.post('/', response_model=OrderOut)
-def create_order(payload: OrderCreate, db: Session = Depends(get_db), current_user=Depends(auth_service.get_current_user)):
-  return order_service.create_order(db, current_user.id, payload)
+@router.post('/', response_model=OrderOut, responses={202: {'model': OrderTicket}})
+def create_order(
+    payload: OrderCreate,
+    idempotency_key: str | None = Header(None, max_length=128),
+    db: Session = Depends(get_db),
+    current_user=Depends(auth_service.get_current_user)
+):
+  def place_order():
+    if flash_sale.handles(payload.items):
+      ticket = flash_sale.submit(db, current_user.id, payload)
+      return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=ticket.to_dict())
+    return order_service.create_order(db, current_user.id, payload)
+
+  return idempotency.run('orders.create', current_user.id, idempotency_key, payload, OrderOut, place_order)
+
+
+@router.get('/intake/{ticket}', response_model=OrderTicket)
+async def intake_status(
+    ticket: str,
+    request: Request,
+    wait: float = Query(0, ge=0, le=30),
+    db: Session = Depends(get_db),
+    current_user=Depends(auth_service.get_current_user)
+):
+  """Status of a queued flash-sale order; ``wait`` long-polls until it is written or fails."""
+
+  entry = await flash_sale.wait(ticket, current_user.id, wait)
+  result = entry.to_dict()
+  if entry.provider:
+    result['payment'] = await run_in_threadpool(payment_service.ticket_payment, db, entry, client_ip(request))
+  return result
 
 
 @router.get('/{order_id}', response_model=OrderOut)
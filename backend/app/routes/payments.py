@@ -1,24 +1,46 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
+from app.core import idempotency
 from app.core.database import get_db
+from app.core.rate_limit import client_ip, rate_limit
+from app.schemas.order import OrderTicket
 from app.schemas.payment import PaymentRequest, PaymentResponse
+from app.services.flash_sale_service import Ticket
 from app.services import payment_service, auth_service
 
 router = APIRouter()
 
 
-@router.post('/wechat', response_model=PaymentResponse)
-def wechat_pay(payload: PaymentRequest, db: Session = Depends(get_db), current_user=Depends(auth_service.get_current_user)):
-  return payment_service.create_wechat_payment(db, current_user.id, payload)
+@router.post('/wechat', response_model=PaymentResponse, responses={202: {'model': OrderTicket}})
+def wechat_pay(
+    payload: PaymentRequest,
+    request: Request,
+    idempotency_key: str | None = Header(None, max_length=128),
+    db: Session = Depends(get_db),
+    current_user=Depends(auth_service.get_current_user)
+):
+  def start_payment():
+    result = payment_service.create_wechat_payment(db, current_user.id, payload, client_ip=client_ip(request))
+    if isinstance(result, Ticket):
+      return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=result.to_dict())
+    return result
+
+  return idempotency.run('payments.wechat', current_user.id, idempotency_key, payload, PaymentResponse, start_payment)
 
 
 @router.post('/wechat/notify')
 async def wechat_notify(request: Request, db: Session = Depends(get_db)):
-  raw = await request.body()
-  payment_service.handle_notify(db, raw.decode())
-  return {'status': 'success'}
+  raw = (await request.body()).decode()
+  # The lookup and conditional update are blocking DB calls; fulfilment happens on its own thread
+  await run_in_threadpool(payment_service.handle_notify, db, raw)
+  ack = payment_service.notify_ack(raw)
+  if isinstance(ack, str):
+    return Response(content=ack, media_type='application/xml')
+  return ack
 
 
-@router.get('/wechat/config')
+@router.get('/wechat/config', dependencies=[Depends(rate_limit('payments.wechat_config'))])
 def wechat_config(url: str, db: Session = Depends(get_db)):
   return payment_service.load_wechat_js_config(db, url=url)
@@ -1,20 +1,32 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.schemas.product import ProductOut, ProductCreate
+from app.core.http_cache import CatalogResponder, catalog_response
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.schemas.product import ProductOut, ProductCreate, ProductPage
 from app.services import product_service, auth_service
 
 router = APIRouter()
 
 
-@router.get('/', response_model=list[ProductOut])
-def list_products(q: str | None = None, db: Session = Depends(get_db)):
-  return product_service.list_products(db, q)
+@router.get('/', response_model=ProductPage)
+def list_products(
+    q: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    catalog: CatalogResponder = Depends(catalog_response('products', 'products.list', ProductPage)),
+    db: Session = Depends(get_db)
+):
+  return catalog.respond(lambda: product_service.page_products(db, q, limit=limit, cursor=cursor))
 
 
 @router.get('/{product_id}', response_model=ProductOut)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-  return product_service.get_product(db, product_id)
+def get_product(
+    product_id: int,
+    catalog: CatalogResponder = Depends(catalog_response('products', 'products.detail', ProductOut)),
+    db: Session = Depends(get_db)
+):
+  return catalog.respond(lambda: product_service.get_product(db, product_id))
 
 
 @router.post('/', response_model=ProductOut)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
@@ -38,6 +38,7 @@ class SystemConfig(BaseModel):
   wechat_app_id: str | None = None
   wechat_mch_id: str | None = None
   wechat_api_key: str | None = None
+  wechat_app_secret: str | None = None
   sms_provider: str | None = None
   sms_api_key: str | None = None
   sms_sign_name: str | None = None
@@ -60,6 +61,34 @@ class DashboardStat(BaseModel):
   model_config = ConfigDict(from_attributes=True)
 
 
+class SalesDay(BaseModel):
+  day: date
+  order_count: int
+  order_amount: float
+  paid_count: int
+  paid_amount: float
+  channels: dict[str, float]
+  levels: dict[str, float]
+
+
+class AnalyticsPoint(BaseModel):
+  bucket: datetime
+  group: str
+  revenue: float
+  order_count: int | None
+  paid_count: int
+  paying_users: int
+  avg_order_value: float
+
+
+class AnalyticsSeries(BaseModel):
+  granularity: str
+  split: str | None
+  start: datetime
+  end: datetime
+  points: list[AnalyticsPoint]
+
+
 class AdminUserProfileOut(BaseModel):
   id: int
   nickname: str
@@ -107,3 +136,18 @@ class AdminOrderOut(BaseModel):
   items: list[AdminOrderItemOut] = []
 
   model_config = ConfigDict(from_attributes=True)
+
+
+class AdminUserPage(BaseModel):
+  items: list[AdminUserProfileOut]
+  next_cursor: str | None = None
+
+
+class AdminPaymentPage(BaseModel):
+  items: list[AdminPaymentRecord]
+  next_cursor: str | None = None
+
+
+class AdminOrderPage(BaseModel):
+  items: list[AdminOrderOut]
+  next_cursor: str | None = None
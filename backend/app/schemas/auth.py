@@ -3,6 +3,7 @@ from pydantic import BaseModel
 
 class Token(BaseModel):
   access_token: str
+  refresh_token: str | None = None
   token_type: str = 'bearer'
   is_default_admin: bool | None = None
 
@@ -21,6 +22,14 @@ class PhoneLoginRequest(BaseModel):
   code: str
 
 
+class RefreshRequest(BaseModel):
+  refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+  refresh_token: str | None = None
+
+
 class LoginResponse(Token):
   user: 'UserOut'
   newly_registered: bool = False
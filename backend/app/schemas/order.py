@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, List
 from pydantic import BaseModel
 from app.schemas.product import ProductOut
 
@@ -28,3 +28,16 @@ class OrderOut(BaseModel):
 
   class Config:
     orm_mode = True
+
+
+class OrderPage(BaseModel):
+  items: List[OrderOut]
+  next_cursor: str | None = None
+
+
+class OrderTicket(BaseModel):
+  ticket: str
+  status: str
+  order_id: int | None = None
+  detail: Any = None
+  payment: dict | None = None
@@ -3,11 +3,14 @@ from pydantic import BaseModel
 
 class PaymentRequest(BaseModel):
   items: list[dict[str, int]]
+  # JSAPI payments need the buyer's openid; without one a NATIVE (QR code) payment is created
+  openid: str | None = None
 
 
 class PaymentResponse(BaseModel):
   orderId: int
   prepayParams: dict
+  codeUrl: str | None = None
 
 
 class PaymentNotify(BaseModel):
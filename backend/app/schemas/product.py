@@ -18,3 +18,8 @@ class ProductCreate(ProductBase):
 
 class ProductOut(ProductBase):
   id: int
+
+
+class ProductPage(BaseModel):
+  items: list[ProductOut]
+  next_cursor: str | None = None
@@ -3,11 +3,14 @@ import json
 from pathlib import Path
 
 from fastapi import HTTPException
+from sqlalchemy import or_
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, selectinload
 
+from app.core.pagination import DEFAULT_PAGE_SIZE, keyset_page
 from app.models.admin import AdminOrder, AdminUserProfile
 from app.models.membership import AdminDashboardStat, RechargeRecord
+from app.services import sales_rollup_service
 
 SEED_DIR = Path(__file__).resolve().parent.parent / 'install' / 'seed_data'
 
@@ -20,7 +23,7 @@ def _load_seed(filename: str) -> list[dict]:
     return json.load(file)
 
 
-def list_dashboard_stats(db: Session):
+def _static_dashboard_stats(db: Session):
   try:
     stats = db.query(AdminDashboardStat).order_by(AdminDashboardStat.id.asc()).all()
     if stats:
@@ -32,14 +35,42 @@ def list_dashboard_stats(db: Session):
   return [{'label': item.get('label', ''), 'value': item.get('value', ''), 'note': item.get('note', '')} for item in seed_items]
 
 
-def list_admin_users(db: Session):
+def list_dashboard_stats(db: Session):
+  """Live sales cards from the rollups, followed by the configured cards they do not replace."""
+
   try:
-    users = db.query(AdminUserProfile).order_by(AdminUserProfile.register_at.desc()).all()
-    if users:
-      return users
+    sales = sales_rollup_service.dashboard_stats(db)
   except SQLAlchemyError:
-    users = []
+    db.rollback()
+    sales = []
+  labels = {stat['label'] for stat in sales}
+  static = [
+    stat for stat in _static_dashboard_stats(db)
+    if (stat['label'] if isinstance(stat, dict) else stat.label) not in labels
+  ]
+  return [*sales, *static]
+
+
+# Every sort column is NOT NULL and has an index ending in it (InnoDB appends id), so keyset pages stay index range scans
+USER_SORTS = {'register_at': AdminUserProfile.register_at, 'spend': AdminUserProfile.spend, 'level': AdminUserProfile.level}
+PAYMENT_SORTS = {'paid_at': RechargeRecord.paid_at, 'amount': RechargeRecord.amount}
+ORDER_SORTS = {'created_at': AdminOrder.created_at, 'amount': AdminOrder.amount}
+
+
+def _prefix(value: str) -> str:
+  escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+  return f'{escaped}%'
+
+
+def _within(query, column, start: datetime | None, end: datetime | None):
+  if start is not None:
+    query = query.filter(column >= start)
+  if end is not None:
+    query = query.filter(column < end)
+  return query
+
 
+def _seed_users() -> list[dict]:
   seed_items = _load_seed('admin_users.json')
   profiles: list[dict] = []
   for item in seed_items:
@@ -53,7 +84,7 @@ def list_admin_users(db: Session):
       'phone': item.get('phone', ''),
       'level': item.get('level', ''),
       'register_at': register_at,
-      'spend': item.get('spend', 0),
+      'spend': item.get('spend') or 0,
       'tests': item.get('tests', 0),
       'benefits': item.get('benefits', ''),
       'recharges': item.get('recharges', []),
@@ -62,22 +93,56 @@ def list_admin_users(db: Session):
   return profiles
 
 
-def list_recharge_records(db: Session):
+def list_admin_users(
+    db: Session,
+    *,
+    level: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    q: str | None = None,
+    sort: str = 'register_at',
+    descending: bool = True,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None
+) -> dict:
+  """Filtered, keyset-paginated member profiles; ``q`` is a phone or nickname prefix."""
+
+  filtered = bool(level or start or end or q or cursor)
   try:
-    records = db.query(RechargeRecord).order_by(RechargeRecord.paid_at.desc()).all()
-    if records:
-      return records
+    query = db.query(AdminUserProfile)
+    if level:
+      query = query.filter(AdminUserProfile.level == level)
+    query = _within(query, AdminUserProfile.register_at, start, end)
+    if q:
+      pattern = _prefix(q.strip())
+      query = query.filter(or_(AdminUserProfile.phone.like(pattern, escape='\\'), AdminUserProfile.nickname.like(pattern, escape='\\')))
+    page = keyset_page(
+      query,
+      sort=sort,
+      sort_column=USER_SORTS[sort],
+      key_column=AdminUserProfile.id,
+      descending=descending,
+      limit=limit,
+      cursor=cursor
+    )
+    if page['items'] or filtered:
+      return page
   except SQLAlchemyError:
-    records = []
+    db.rollback()
+  # Not installed yet: show the bundled sample profiles
+  return {'items': _seed_users(), 'next_cursor': None}
+
 
+def _seed_payments() -> list[dict]:
   seed_items = _load_seed('admin_payments.json')
   payments: list[dict] = []
-  for item in seed_items:
+  for index, item in enumerate(seed_items, start=1):
     try:
       paid_at = datetime.fromisoformat(item.get('time', ''))
     except ValueError:
       continue
     payments.append({
+      'id': index,
       'user_display': item.get('user', ''),
       'level': item.get('level', ''),
       'amount': item.get('amount', 0),
@@ -88,11 +153,85 @@ def list_recharge_records(db: Session):
   return payments
 
 
-def list_admin_orders(db: Session):
+def list_recharge_records(
+    db: Session,
+    *,
+    channel: str | None = None,
+    level: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    q: str | None = None,
+    sort: str = 'paid_at',
+    descending: bool = True,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None
+) -> dict:
+  """Filtered, keyset-paginated recharge records; ``q`` is a user or order-number prefix."""
+
+  filtered = bool(channel or level or start or end or q or cursor)
   try:
-    return db.query(AdminOrder).options(selectinload(AdminOrder.items)).order_by(AdminOrder.created_at.desc()).all()
+    query = db.query(RechargeRecord)
+    if channel:
+      query = query.filter(RechargeRecord.channel == channel)
+    if level:
+      query = query.filter(RechargeRecord.level == level)
+    query = _within(query, RechargeRecord.paid_at, start, end)
+    if q:
+      pattern = _prefix(q.strip())
+      query = query.filter(or_(RechargeRecord.user_display.like(pattern, escape='\\'), RechargeRecord.order_no.like(pattern, escape='\\')))
+    page = keyset_page(
+      query,
+      sort=sort,
+      sort_column=PAYMENT_SORTS[sort],
+      key_column=RechargeRecord.id,
+      descending=descending,
+      limit=limit,
+      cursor=cursor
+    )
+    if page['items'] or filtered:
+      return page
   except SQLAlchemyError:
-    return []
+    db.rollback()
+  return {'items': _seed_payments(), 'next_cursor': None}
+
+
+def list_admin_orders(
+    db: Session,
+    *,
+    status: str | None = None,
+    channel: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    q: str | None = None,
+    sort: str = 'created_at',
+    descending: bool = True,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None
+) -> dict:
+  """Filtered, keyset-paginated admin orders; ``q`` is an order-number or user prefix."""
+
+  try:
+    query = db.query(AdminOrder).options(selectinload(AdminOrder.items))
+    if status:
+      query = query.filter(AdminOrder.status == status)
+    if channel:
+      query = query.filter(AdminOrder.channel == channel)
+    query = _within(query, AdminOrder.created_at, start, end)
+    if q:
+      pattern = _prefix(q.strip())
+      query = query.filter(or_(AdminOrder.id.like(pattern, escape='\\'), AdminOrder.user.like(pattern, escape='\\')))
+    return keyset_page(
+      query,
+      sort=sort,
+      sort_column=ORDER_SORTS[sort],
+      key_column=AdminOrder.id,
+      descending=descending,
+      limit=limit,
+      cursor=cursor
+    )
+  except SQLAlchemyError:
+    db.rollback()
+    return {'items': [], 'next_cursor': None}
 
 
 def get_admin_order(db: Session, order_id: str):
@@ -1,39 +1,44 @@
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Optional
 import secrets
 
-from jose import jwt
-from passlib.context import CryptContext
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 
 from app.config import settings
+from app.core import hashing
+from app.core.cache import TTLCache
+from app.core import code_store, tokens
+from app.core.hashing import pwd_context
 from app.core.install_state import load_install_state
 from app.models.user import User
 from app.schemas.user import UserCreate
 from app.core.database import get_db
+from app.services import revocation_service
+from app.services.sms_service import sms
 
-pwd_context = CryptContext(schemes=['pbkdf2_sha256', 'bcrypt'], deprecated='auto')
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/auth/login')
 DEFAULT_MEMBERSHIP = 'free'
 CODE_EXPIRES_MINUTES = 5
-_code_store: Dict[str, Tuple[str, datetime]] = {}
+# Column values of recently authenticated users, keyed by token subject (password hash deliberately excluded)
+_principal_cache = TTLCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+_PRINCIPAL_FIELDS = ('id', 'username', 'phone', 'role', 'membership_level', 'membership_expires_at', 'created_at')
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-  if not hashed_password:
-    return False
+def invalidate_principal(username: str | None = None) -> None:
+  """Drop a cached principal after its role or membership changed; ``None`` clears everything."""
+
+  if username is None:
+    _principal_cache.clear()
+  else:
+    _principal_cache.pop(username)
 
-  try:
-    return pwd_context.verify(plain_password, hashed_password)
-  except ValueError:
-    # Handle invalid or legacy hashes gracefully instead of bubbling up
-    return plain_password == hashed_password
-  except Exception:
-    # Avoid leaking unexpected errors to callers; fall back to plaintext check
-    return plain_password == hashed_password
+
+def principal_cache_stats() -> dict:
+  return _principal_cache.stats()
 
 
 def get_password_hash(password: str) -> str:
@@ -43,8 +48,76 @@ def get_password_hash(password: str) -> str:
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
   to_encode = data.copy()
   expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
-  to_encode.update({"exp": expire})
-  return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+  to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16), "type": "access"})
+  return tokens.encode(to_encode)
+
+
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+  to_encode = data.copy()
+  expire = datetime.utcnow() + (expires_delta or timedelta(days=settings.refresh_token_expire_days))
+  to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16), "type": "refresh"})
+  return tokens.encode(to_encode)
+
+
+def issue_tokens(user: User) -> dict:
+  payload = build_token_payload(user)
+  return {
+    'access_token': create_access_token(payload),
+    'refresh_token': create_refresh_token(payload),
+    'token_type': 'bearer'
+  }
+
+
+def _claims_expiry(claims: dict) -> datetime:
+  return datetime.utcfromtimestamp(int(claims.get('exp', 0)))
+
+
+def _ensure_not_revoked(db: Session, claims: dict) -> None:
+  jti = claims.get('jti')
+  if not jti:
+    return
+  try:
+    revoked = revocation_service.is_revoked(db, jti)
+  except SQLAlchemyError as exc:  # noqa: PERF203
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Database unavailable') from exc
+  if revoked:
+    raise HTTPException(status_code=401, detail='Token has been revoked')
+
+
+def refresh_tokens(db: Session, refresh_token: str) -> dict:
+  """Exchange a refresh token for a new token pair; the presented refresh token is revoked (rotation).
+
+  The revocation is a plain insert on the ``jti`` key, so when the same token
+  is refreshed concurrently only the request whose insert wins gets new tokens.
+  """
+
+  try:
+    claims = tokens.decode(refresh_token)
+  except Exception as exc:  # noqa: BLE001
+    raise HTTPException(status_code=401, detail='Invalid refresh token') from exc
+  if claims.get('type') != 'refresh' or not claims.get('sub'):
+    raise HTTPException(status_code=401, detail='Invalid refresh token')
+  _ensure_not_revoked(db, claims)
+
+  user = _get_user_by_username(db, claims['sub'])
+  if not user:
+    raise HTTPException(status_code=401, detail='User not found')
+  if not revocation_service.revoke_once(db, claims['jti'], _claims_expiry(claims)):
+    raise HTTPException(status_code=401, detail='Token has been revoked')
+  tokens.forget(refresh_token)
+  return issue_tokens(user)
+
+
+def logout(db: Session, access_token: str, refresh_token: str | None = None) -> None:
+  for token in filter(None, (access_token, refresh_token)):
+    try:
+      claims = tokens.decode(token)
+    except Exception:  # noqa: BLE001
+      # Expired or malformed tokens are already unusable
+      continue
+    if claims.get('jti'):
+      revocation_service.revoke(db, claims['jti'], _claims_expiry(claims))
+    tokens.forget(token)
 
 
 def _load_default_admin() -> tuple[str | None, str | None]:
@@ -57,36 +130,57 @@ def _load_default_admin() -> tuple[str | None, str | None]:
   return None, None
 
 
-def _build_fallback_admin(username: str, password: str) -> User:
+def _get_user_by_username(db: Session, username: str) -> User | None:
+  return db.query(User).filter(User.username == username).first()
+
+
+def _save_password_hash(db: Session, user: User, new_hash: str) -> None:
+  try:
+    user.password_hash = new_hash
+    db.commit()
+  except SQLAlchemyError:
+    # The old hash still verifies; retry the upgrade on the next login
+    db.rollback()
+
+
+async def _upgrade_password_hash(db: Session, user: User, new_hash: str | None) -> None:
+  if new_hash:
+    await run_in_threadpool(_save_password_hash, db, user, new_hash)
+
+
+async def _build_fallback_admin(username: str, password: str) -> User:
   return User(
     username=username,
     phone=None,
-    password_hash=get_password_hash(password),
+    password_hash=await hashing.hash(password),
     role='admin',
     membership_level=DEFAULT_MEMBERSHIP,
     membership_expires_at=None
   )
 
 
-def admin_login(db: Session, username: str, password: str) -> tuple[User, bool]:
+async def admin_login(db: Session, username: str, password: str) -> tuple[User, bool]:
   """Authenticate admin using database credentials, with a file-based fallback."""
 
   db_error: SQLAlchemyError | None = None
   user: User | None = None
   try:
-    user = db.query(User).filter(User.username == username).first()
+    user = await run_in_threadpool(_get_user_by_username, db, username)
   except SQLAlchemyError as exc:  # noqa: PERF203
     db_error = exc
 
-  if user and verify_password(password, user.password_hash):
-    if user.role != 'admin':
-      raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not enough permissions')
-    return user, False
+  if user:
+    valid, new_hash = await hashing.verify(password, user.password_hash)
+    if valid:
+      if user.role != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not enough permissions')
+      await _upgrade_password_hash(db, user, new_hash)
+      return user, False
 
   if db_error:
     default_username, default_password = _load_default_admin()
     if default_username and default_password and username == default_username and password == default_password:
-      return _build_fallback_admin(default_username, default_password), True
+      return await _build_fallback_admin(default_username, default_password), True
     raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='数据库连接失败，请稍后重试') from db_error
 
   raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Incorrect username or password')
@@ -96,52 +190,75 @@ def build_token_payload(user: User) -> dict:
   return {'sub': user.username, 'role': user.role}
 
 
-def authenticate_user(db: Session, username: str, password: str) -> User:
-  user = db.query(User).filter(User.username == username).first()
-  if not user or not verify_password(password, user.password_hash):
+async def authenticate_user(db: Session, username: str, password: str) -> User:
+  user = await run_in_threadpool(_get_user_by_username, db, username)
+  if not user:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Incorrect username or password')
+  valid, new_hash = await hashing.verify(password, user.password_hash)
+  if not valid:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Incorrect username or password')
+  await _upgrade_password_hash(db, user, new_hash)
   return user
 
 
-def send_verification_code(phone: str) -> str:
+def send_verification_code(db: Session, phone: str) -> str | None:
+  """Store a new code and queue its SMS; the code is returned only without an SMS integration or with ``fake`` alone."""
+
   if not phone.isdigit() or len(phone) < 4 or len(phone) > 20:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='手机号格式不正确')
   code = f"{secrets.randbelow(1000000):06d}"
-  _code_store[phone] = (code, datetime.utcnow() + timedelta(minutes=CODE_EXPIRES_MINUTES))
+  code_store.get_code_store().put(phone, code, CODE_EXPIRES_MINUTES * 60)
+  text = f'您的验证码为{code}，{CODE_EXPIRES_MINUTES}分钟内有效，请勿泄露。'
+  if sms.submit(db, phone, text):
+    return None
   return code
 
 
-def _ensure_code_valid(phone: str, code: str) -> None:
-  stored = _code_store.get(phone)
-  if not stored:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='请先获取验证码')
-  stored_code, expires_at = stored
-  if datetime.utcnow() > expires_at:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='验证码已过期，请重新获取')
-  if code != stored_code:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='验证码错误')
+_CODE_ERRORS = {
+  code_store.CODE_MISSING: '请先获取验证码',
+  code_store.CODE_EXPIRED: '验证码已过期，请重新获取',
+  code_store.CODE_MISMATCH: '验证码错误',
+  code_store.CODE_LOCKED: '验证码错误次数过多，请重新获取',
+}
+
+
+def _consume_code(phone: str, code: str) -> None:
+  result = code_store.get_code_store().verify(phone, code)
+  if result != code_store.CODE_OK:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=_CODE_ERRORS.get(result, '验证码错误'))
+
+
+def _get_user_by_phone(db: Session, phone: str) -> User | None:
+  return db.query(User).filter(User.phone == phone).first()
 
 
-def login_with_phone_code(db: Session, phone: str, code: str) -> tuple[User, bool]:
-  _ensure_code_valid(phone, code)
-  _code_store.pop(phone, None)
+def _insert_user(db: Session, user: User) -> User:
+  db.add(user)
+  db.commit()
+  db.refresh(user)
+  return user
+
+
+async def login_with_phone_code(db: Session, phone: str, code: str) -> tuple[User, bool]:
+  try:
+    await run_in_threadpool(_consume_code, phone, code)
+  except SQLAlchemyError as exc:  # noqa: PERF203
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='数据库连接失败，请稍后重试') from exc
   db_error: SQLAlchemyError | None = None
   user: User | None = None
   newly_registered = False
   try:
-    user = db.query(User).filter(User.phone == phone).first()
+    user = await run_in_threadpool(_get_user_by_phone, db, phone)
     if not user:
-      user = User(
+      user = await run_in_threadpool(_insert_user, db, User(
         username=phone,
         phone=phone,
-        password_hash=get_password_hash(code),
+        password_hash=await hashing.hash(code),
         role='user',
         membership_level=DEFAULT_MEMBERSHIP,
         membership_expires_at=None
-      )
-      db.add(user)
-      db.commit()
-      db.refresh(user)
+      ))
+      invalidate_principal(user.username)
       newly_registered = True
   except SQLAlchemyError as exc:  # noqa: PERF203
     db_error = exc
@@ -155,8 +272,8 @@ def login_with_phone_code(db: Session, phone: str, code: str) -> tuple[User, boo
   return user, newly_registered
 
 
-def register_user(db: Session, user_in: UserCreate) -> User:
-  if db.query(User).filter(User.username == user_in.username).first():
+async def register_user(db: Session, user_in: UserCreate) -> User:
+  if await run_in_threadpool(_get_user_by_username, db, user_in.username):
     raise HTTPException(status_code=400, detail='Username already exists')
   phone = user_in.phone or user_in.username
   expires_at = None
@@ -170,25 +287,31 @@ def register_user(db: Session, user_in: UserCreate) -> User:
   user = User(
     username=user_in.username,
     phone=phone,
-    password_hash=get_password_hash(user_in.password),
+    password_hash=await hashing.hash(user_in.password),
     role=user_in.role,
     membership_level=user_in.membership_level,
     membership_expires_at=expires_at
   )
-  db.add(user)
-  db.commit()
-  db.refresh(user)
+  user = await run_in_threadpool(_insert_user, db, user)
+  invalidate_principal(user.username)
   return user
 
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
   try:
-    payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    payload = tokens.decode(token)
     username: str | None = payload.get('sub')
-    if username is None:
+    if username is None or payload.get('type') == 'refresh':
       raise HTTPException(status_code=401, detail='Invalid token')
   except Exception as exc:  # noqa: BLE001
     raise HTTPException(status_code=401, detail='Invalid token') from exc
+  _ensure_not_revoked(db, payload)
+
+  cached = _principal_cache.get(username)
+  if cached is not None:
+    # Detached copy: callers only read attributes, and it must never be flushed through a session
+    return User(**cached)
+
   db_error: Exception | None = None
   user: User | None = None
   try:
@@ -197,6 +320,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     db_error = exc
 
   if user:
+    _principal_cache.set(username, {field: getattr(user, field) for field in _PRINCIPAL_FIELDS})
     return user
   if db_error:
     raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Database unavailable') from db_error
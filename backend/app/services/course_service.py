@@ -1,6 +1,7 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session, selectinload
 
+from app.core import http_cache
 from app.models.admin import Course, CourseLesson
 from app.schemas.course import CourseCreate
 
@@ -39,6 +40,7 @@ def create_course(db: Session, payload: CourseCreate) -> Course:
   )
   db.add(course)
   db.commit()
+  http_cache.bump('courses')
   db.refresh(course)
   return course
 
@@ -59,6 +61,7 @@ def update_course(db: Session, course_id: int, payload: CourseCreate) -> Course:
     for lesson in payload.lessons
   ]
   db.commit()
+  http_cache.bump('courses')
   db.refresh(course)
   return course
 
@@ -67,3 +70,4 @@ def delete_course(db: Session, course_id: int) -> None:
   course = get_course(db, course_id)
   db.delete(course)
   db.commit()
+  http_cache.bump('courses')
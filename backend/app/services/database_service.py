@@ -4,6 +4,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.core import http_cache
 from app.core.database import engine
 from app.installer.database_initializer import create_schema, seed_all
 from app.schemas.admin import DatabaseTestRequest, DatabaseTestResult
@@ -54,6 +55,8 @@ def initialize_seed_data(db: Session, *, overwrite_existing: bool = False) -> di
       integrations={'wechat': {}, 'sms': {}},
       overwrite_existing=overwrite_existing,
     )
+    http_cache.bump('courses')
+    http_cache.bump('products')
     return {'status': 'ok', 'message': '数据库结构已检查完毕，预置数据同步完成。'}
   except SQLAlchemyError as exc:  # noqa: PERF203
     seed_db.rollback()
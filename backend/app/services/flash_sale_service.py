@@ -0,0 +1,285 @@
+"""Queued order intake for flash-sale products.
+
+Products listed in ``FLASH_SALE_PRODUCTS`` (comma separated ids) skip the
+row-lock path of ``create_order`` while a promotion runs. A request containing
+one of them is checked against an in-memory stock counter, the counter is
+decremented, and the request is queued; the caller gets a ticket back at once
+(HTTP 202) and polls ``GET /orders/intake/{ticket}``.
+
+One consumer thread per worker drains the queue in batches of up to
+``FLASH_SALE_BATCH_SIZE``. Each batch takes a single sorted ``SELECT ... FOR
+UPDATE`` over all of its products, allocates stock to tickets in arrival
+order, and commits the orders, payments and the stock ``UPDATE`` together, so
+hundreds of buyers cost one lock round instead of one each.
+
+The database stays authoritative. Counters are seeded from ``products.stock``
+and re-synced after every batch (stock minus what is still queued), so a
+counter that ran ahead of a peer worker's sales fails the surplus tickets at
+write time instead of overselling. Tickets live in the worker that issued
+them, so status polls must reach the same worker (sticky sessions or one
+intake worker).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import secrets
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.cache import TTLCache
+from app.core.database import SessionLocal
+from app.models.payment import Payment
+from app.models.product import Product
+from app.schemas.order import OrderCreate, OrderItemBase
+from app.services import sales_rollup_service
+from app.services.order_expiry_service import order_expiry
+from app.services.order_service import build_order, decrement_stock, find_shortages, lock_products, order_quantities
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_CREATED = 'created'
+STATUS_FAILED = 'failed'
+POLL_INTERVAL_SECONDS = 0.1
+
+
+def _parse_product_ids(value: str) -> frozenset[int]:
+  return frozenset(int(part) for part in value.split(',') if part.strip().isdigit())
+
+
+class Ticket:
+  __slots__ = ('token', 'user_id', 'items', 'quantities', 'reserved', 'provider', 'status', 'order_id', 'payment_id', 'detail')
+
+  def __init__(self, user_id: int, items: List[OrderItemBase], quantities: Dict[int, int], reserved: Dict[int, int], provider: str | None):
+    self.token = secrets.token_urlsafe(16)
+    self.user_id = user_id
+    self.items = items
+    self.quantities = quantities
+    self.reserved = reserved
+    self.provider = provider
+    self.status = STATUS_QUEUED
+    self.order_id: int | None = None
+    self.payment_id: int | None = None
+    self.detail: Any = None
+
+  def fail(self, detail: Any) -> None:
+    self.detail = detail
+    self.status = STATUS_FAILED
+
+  def to_dict(self) -> dict:
+    return {'ticket': self.token, 'status': self.status, 'order_id': self.order_id, 'detail': self.detail}
+
+
+class FlashSale:
+  def __init__(self, product_ids: Iterable[int], *, batch_size: int, batch_wait_seconds: float, queue_size: int, ticket_ttl_seconds: float):
+    self.product_ids = frozenset(product_ids)
+    self.batch_size = max(1, batch_size)
+    self.batch_wait_seconds = batch_wait_seconds
+    self._queue: queue.Queue[Ticket] = queue.Queue(maxsize=queue_size)
+    # Sized well above the queue so finished tickets stay pollable for their TTL
+    self._tickets = TTLCache(max(queue_size * 10, 1000), ticket_ttl_seconds)
+    self._counters: Dict[int, int] = {}
+    self._pending: Dict[int, int] = defaultdict(int)
+    self._lock = threading.Lock()
+    self._worker: threading.Thread | None = None
+    self._stopping = threading.Event()
+    self.batches = 0
+    self.created = 0
+    self.failed = 0
+
+  def handles(self, items: Iterable[OrderItemBase]) -> bool:
+    return bool(self.product_ids) and any(item.product_id in self.product_ids for item in items)
+
+  def _seed_counters(self, db: Session, product_ids: Iterable[int]) -> None:
+    missing = [product_id for product_id in product_ids if product_id not in self._counters]
+    if not missing:
+      return
+    rows = db.query(Product.id, Product.stock).filter(Product.id.in_(missing)).all()
+    with self._lock:
+      for product_id, stock in rows:
+        self._counters.setdefault(product_id, (stock or 0) - self._pending[product_id])
+
+  def _release_locked(self, reserved: Dict[int, int]) -> None:
+    for product_id, quantity in reserved.items():
+      self._pending[product_id] -= quantity
+      if product_id in self._counters:
+        self._counters[product_id] += quantity
+
+  def submit(self, db: Session, user_id: int, order_in: OrderCreate, provider: str | None = None) -> Ticket:
+    quantities = order_quantities(order_in.items)
+    reserved = {product_id: quantity for product_id, quantity in quantities.items() if product_id in self.product_ids}
+    self._seed_counters(db, reserved)
+    with self._lock:
+      shortages = find_shortages(self._counters, reserved)
+      if shortages:
+        raise HTTPException(status_code=400, detail={'message': 'Insufficient stock', 'items': shortages})
+      for product_id, quantity in reserved.items():
+        self._counters[product_id] -= quantity
+        self._pending[product_id] += quantity
+
+    ticket = Ticket(user_id, list(order_in.items), quantities, reserved, provider)
+    self._ensure_worker()
+    try:
+      self._queue.put_nowait(ticket)
+    except queue.Full:
+      with self._lock:
+        self._release_locked(reserved)
+      raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail='抢购人数过多，请稍后再试',
+        headers={'Retry-After': '1'}
+      )
+    self._tickets.set(ticket.token, ticket)
+    return ticket
+
+  def get(self, token: str, user_id: int) -> Ticket:
+    ticket = self._tickets.get(token)
+    if ticket is None or ticket.user_id != user_id:
+      raise HTTPException(status_code=404, detail='Ticket not found')
+    return ticket
+
+  async def wait(self, token: str, user_id: int, timeout: float) -> Ticket:
+    ticket = self.get(token, user_id)
+    deadline = time.monotonic() + timeout
+    while ticket.status == STATUS_QUEUED and time.monotonic() < deadline:
+      await asyncio.sleep(POLL_INTERVAL_SECONDS)
+    return ticket
+
+  def _ensure_worker(self) -> None:
+    if self._worker is not None and self._worker.is_alive():
+      return
+    with self._lock:
+      if self._worker is None or not self._worker.is_alive():
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name='flash-sale-intake', daemon=True)
+        self._worker.start()
+
+  def _next_batch(self) -> List[Ticket]:
+    try:
+      batch = [self._queue.get(timeout=0.5)]
+    except queue.Empty:
+      return []
+    deadline = time.monotonic() + self.batch_wait_seconds
+    while len(batch) < self.batch_size:
+      remaining = deadline - time.monotonic()
+      try:
+        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    return batch
+
+  def _run(self) -> None:
+    while not (self._stopping.is_set() and self._queue.empty()):
+      batch = self._next_batch()
+      if batch:
+        self._write_batch(batch)
+
+  def _write_batch(self, batch: List[Ticket]) -> None:
+    db = SessionLocal()
+    stock: Dict[int, int] | None = None
+    written = 0
+    try:
+      products = lock_products(db, {product_id for ticket in batch for product_id in ticket.quantities})
+      stock = {product_id: product.stock for product_id, product in products.items()}
+      taken: Dict[int, int] = defaultdict(int)
+      accepted = []
+      for ticket in batch:
+        shortages = find_shortages(stock, ticket.quantities)
+        if shortages:
+          ticket.fail({'message': 'Insufficient stock', 'items': shortages})
+          continue
+        for product_id, quantity in ticket.quantities.items():
+          stock[product_id] -= quantity
+          taken[product_id] += quantity
+        order = build_order(ticket.user_id, ticket.items, products)
+        db.add(order)
+        accepted.append((ticket, order))
+      decrement_stock(db, products, taken)
+      db.flush()
+      payments = []
+      for ticket, order in accepted:
+        payment = Payment(order_id=order.id, provider=ticket.provider, status='pending') if ticket.provider else None
+        if payment is not None:
+          db.add(payment)
+        payments.append(payment)
+      db.commit()
+      for (ticket, order), payment in zip(accepted, payments):
+        ticket.order_id = order.id
+        ticket.payment_id = payment.id if payment is not None else None
+        ticket.status = STATUS_CREATED
+      written = len(accepted)
+      by_channel: Dict[str, list] = defaultdict(list)
+      for ticket, order in accepted:
+        by_channel[ticket.provider or sales_rollup_service.CHANNEL_DIRECT].append(order)
+      for channel, orders in by_channel.items():
+        sales_rollup_service.record_orders(db, orders, channel)
+      for _, order in accepted:
+        order_expiry.track(order.id, order.created_at)
+    except Exception:  # noqa: BLE001
+      # The consumer must outlive a failed batch; its tickets are failed so clients stop waiting
+      logger.exception('Flash-sale batch of %d tickets failed', len(batch))
+      db.rollback()
+      stock = None
+      for ticket in batch:
+        if ticket.status == STATUS_QUEUED:
+          ticket.fail('下单失败，请重试')
+    finally:
+      db.close()
+
+    with self._lock:
+      for ticket in batch:
+        for product_id, quantity in ticket.reserved.items():
+          self._pending[product_id] -= quantity
+      for product_id in {product_id for ticket in batch for product_id in ticket.reserved}:
+        if stock is not None and product_id in stock:
+          self._counters[product_id] = stock[product_id] - self._pending[product_id]
+        else:
+          # Unknown state after a failed write; reseed from the table on next use
+          self._counters.pop(product_id, None)
+      self.batches += 1
+      self.created += written
+      self.failed += len(batch) - written
+
+  def reseed(self, product_ids: Iterable[int]) -> None:
+    """Forget the counters of products whose stock changed outside this service; they reseed on next use."""
+
+    with self._lock:
+      for product_id in product_ids:
+        self._counters.pop(product_id, None)
+
+  def shutdown(self, timeout: float = 10.0) -> None:
+    """Stop accepting work and let the consumer drain what is already queued."""
+
+    self._stopping.set()
+    if self._worker is not None:
+      self._worker.join(timeout)
+
+  def stats(self) -> dict:
+    with self._lock:
+      counters = dict(self._counters)
+    return {
+      'products': sorted(self.product_ids),
+      'queued': self._queue.qsize(),
+      'stock': counters,
+      'batches': self.batches,
+      'created': self.created,
+      'failed': self.failed
+    }
+
+
+flash_sale = FlashSale(
+  _parse_product_ids(settings.flash_sale_products),
+  batch_size=settings.flash_sale_batch_size,
+  batch_wait_seconds=settings.flash_sale_batch_wait_ms / 1000,
+  queue_size=settings.flash_sale_queue_size,
+  ticket_ttl_seconds=settings.flash_sale_ticket_ttl_seconds
+)
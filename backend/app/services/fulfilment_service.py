@@ -0,0 +1,302 @@
+"""Order fulfilment after a payment notify, off the request path.
+
+``payment_service.handle_notify`` only flips the payment row to ``paid`` with
+a conditional ``UPDATE`` and queues its id here, so WeChat is acknowledged as
+soon as that commit lands. One consumer thread per worker drains the queue in
+batches and, per batch and in one transaction:
+
+* marks each order ``paid`` with ``UPDATE ... WHERE status != 'paid'``, so a
+  payment handled twice (duplicate notify, recovery, a peer worker) is
+  fulfilled once;
+* upgrades the buyer's membership when a purchased product's name contains a
+  ``membership_settings.level`` (``duration_days = 0`` means lifetime);
+
+then adds the payment to the sales rollups and drops the buyer's cached
+principal so the new level is visible at once.
+
+An order paid after the expiry sweeper released its stock takes that stock
+back under ``SELECT ... FOR UPDATE``; when it is gone the order becomes
+``refund_required`` instead of ``paid`` and nothing is granted.
+
+The queue lives in memory. Anything lost with it (a crash after the ack, a
+full queue) is found again by :meth:`Fulfilment.recover`, which runs when the
+consumer starts and every ``FULFILMENT_RECOVER_SECONDS``, and picks up payments
+paid within the last day whose order is still not ``paid``.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.membership import MembershipSetting
+from app.models.order import Order, OrderItem
+from app.models.payment import Payment
+from app.models.product import Product
+from app.models.user import User
+from app.services import auth_service, sales_rollup_service
+from app.services.flash_sale_service import flash_sale
+from app.services.order_expiry_service import STATUS_EXPIRED
+from app.services.order_service import decrement_stock, find_shortages, lock_products
+
+logger = logging.getLogger(__name__)
+
+RECOVER_LIMIT = 1000
+# Only recent payments are recovered: older "paid" rows predate fulfilment and were never reliable
+RECOVER_WINDOW = timedelta(days=1)
+# Paid after expiry with the stock already sold again: the payment has to be refunded by hand
+STATUS_REFUND_REQUIRED = 'refund_required'
+
+
+def _match_level(names: Iterable[str], levels: Dict[str, int]) -> str | None:
+  """Best membership level named by the products: lifetime first, then the longest duration."""
+
+  matched = [level for level in levels for name in names if level in (name or '')]
+  if not matched:
+    return None
+  return max(matched, key=lambda level: (levels[level] == 0, levels[level]))
+
+
+def _extend(current: datetime | None, duration_days: int, now: datetime) -> datetime | None:
+  if duration_days <= 0:
+    return None
+  return max(current or now, now) + timedelta(days=duration_days)
+
+
+class Fulfilment:
+  def __init__(self, *, batch_size: int, batch_wait_seconds: float, queue_size: int, recover_seconds: float):
+    self.batch_size = max(1, batch_size)
+    self.batch_wait_seconds = batch_wait_seconds
+    self.recover_seconds = recover_seconds
+    self._queue: queue.Queue[int] = queue.Queue(maxsize=queue_size)
+    self._lock = threading.Lock()
+    self._worker: threading.Thread | None = None
+    self._stopping = threading.Event()
+    self._next_recover = 0.0
+    self.batches = 0
+    self.fulfilled = 0
+    self.duplicates = 0
+    self.dropped = 0
+    self.errors = 0
+    self.late_payments = 0
+    self.refunds_required = 0
+
+  def enqueue(self, payment_id: int) -> None:
+    self.start()
+    try:
+      self._queue.put_nowait(payment_id)
+    except queue.Full:
+      # The payment is already paid in the table; recovery will pick it up
+      self.dropped += 1
+
+  def start(self) -> None:
+    if self._worker is not None and self._worker.is_alive():
+      return
+    with self._lock:
+      if self._worker is None or not self._worker.is_alive():
+        self._stopping.clear()
+        self._next_recover = 0.0
+        self._worker = threading.Thread(target=self._run, name='payment-fulfilment', daemon=True)
+        self._worker.start()
+
+  def _next_batch(self) -> List[int]:
+    try:
+      batch = [self._queue.get(timeout=0.5)]
+    except queue.Empty:
+      return []
+    deadline = time.monotonic() + self.batch_wait_seconds
+    while len(batch) < self.batch_size:
+      remaining = deadline - time.monotonic()
+      try:
+        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    return batch
+
+  def _run(self) -> None:
+    while not (self._stopping.is_set() and self._queue.empty()):
+      if not self._stopping.is_set() and time.monotonic() >= self._next_recover:
+        self._next_recover = time.monotonic() + self.recover_seconds
+        self.recover()
+      batch = self._next_batch()
+      if batch:
+        self.process(batch)
+
+  def recover(self) -> int:
+    """Queue paid payments whose order was never fulfilled; returns how many were found."""
+
+    db = SessionLocal()
+    try:
+      ids = [
+        payment_id for (payment_id,) in db.query(Payment.id)
+        .join(Order, Order.id == Payment.order_id)
+        .filter(
+          Payment.status == 'paid',
+          Payment.paid_at >= datetime.utcnow() - RECOVER_WINDOW,
+          Order.status.notin_(('paid', STATUS_REFUND_REQUIRED))
+        )
+        .order_by(Payment.id.asc())
+        .limit(RECOVER_LIMIT)
+      ]
+    except Exception:  # noqa: BLE001
+      logger.exception('Payment fulfilment recovery failed')
+      return 0
+    finally:
+      db.close()
+    for payment_id in ids:
+      try:
+        self._queue.put_nowait(payment_id)
+      except queue.Full:
+        break
+    return len(ids)
+
+  def process(self, payment_ids: List[int]) -> None:
+    db = SessionLocal()
+    try:
+      self._fulfil(db, sorted(set(payment_ids)))
+    except Exception:  # noqa: BLE001
+      # Keep the consumer alive; the payments stay paid and recovery retries their orders
+      logger.exception('Fulfilment of %d payments failed', len(payment_ids))
+      db.rollback()
+      self.errors += 1
+    finally:
+      db.close()
+      self.batches += 1
+
+  def _fulfil(self, db: Session, payment_ids: List[int]) -> None:
+    rows = (
+      db.query(Payment, Order)
+      .join(Order, Order.id == Payment.order_id)
+      .filter(Payment.id.in_(payment_ids), Payment.status == 'paid')
+      .order_by(Order.id.asc())
+      .all()
+    )
+    fulfilled = []
+    refunds = []
+    restocked: Dict[int, int] = {}
+    for payment, order in rows:
+      previous = order.status
+      if previous in ('paid', STATUS_REFUND_REQUIRED):
+        continue
+      # Row-locks the order, so a peer worker fulfilling the same payment waits and then sees rowcount 0
+      changed = db.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status == previous)
+        .values(status='paid')
+        .execution_options(synchronize_session=False)
+      ).rowcount
+      if not changed:
+        continue
+      if previous == STATUS_EXPIRED:
+        taken = self._reclaim_stock(db, order.id)
+        if taken is None:
+          db.execute(
+            update(Order).where(Order.id == order.id).values(status=STATUS_REFUND_REQUIRED)
+            .execution_options(synchronize_session=False)
+          )
+          logger.warning('Order %s was paid after it expired and its stock is gone; payment %s needs a refund', order.id, payment.id)
+          refunds.append(order.id)
+          continue
+        logger.warning('Order %s was paid after it expired; its stock was taken back', order.id)
+        self.late_payments += 1
+        for product_id, quantity in taken.items():
+          restocked[product_id] = restocked.get(product_id, 0) + quantity
+      fulfilled.append((payment, order))
+    self.duplicates += len(payment_ids) - len(fulfilled) - len(refunds)
+    if not fulfilled and not refunds:
+      db.rollback()
+      return
+
+    upgraded = self._upgrade_memberships(db, [order for _, order in fulfilled]) if fulfilled else []
+    db.commit()
+    self.refunds_required += len(refunds)
+    if restocked:
+      self._after_reclaim(restocked)
+    if not fulfilled:
+      return
+    sales_rollup_service.record_payments(db, fulfilled)
+    for username in upgraded:
+      auth_service.invalidate_principal(username)
+    self.fulfilled += len(fulfilled)
+
+  def _reclaim_stock(self, db: Session, order_id: int) -> Dict[int, int] | None:
+    """Take an expired order's released quantities off stock again; None (and nothing taken) when short."""
+
+    quantities = {
+      product_id: int(quantity)
+      for product_id, quantity in db.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+      .filter(OrderItem.order_id == order_id)
+      .group_by(OrderItem.product_id)
+      if quantity
+    }
+    products = lock_products(db, quantities)
+    if find_shortages({product_id: product.stock for product_id, product in products.items()}, quantities):
+      return None
+    decrement_stock(db, products, quantities)
+    return quantities
+
+  def _after_reclaim(self, taken: Dict[int, int]) -> None:
+    flash_sale.reseed(taken)
+
+  def _upgrade_memberships(self, db: Session, orders: List[Order]) -> List[str]:
+    levels = {level: duration or 0 for level, duration in db.query(MembershipSetting.level, MembershipSetting.duration_days)}
+    if not levels:
+      return []
+    names: Dict[int, List[str]] = defaultdict(list)
+    for order_id, name in (
+      db.query(OrderItem.order_id, Product.name)
+      .join(Product, Product.id == OrderItem.product_id)
+      .filter(OrderItem.order_id.in_([order.id for order in orders]))
+    ):
+      names[order_id].append(name)
+    wanted = {order.user_id: level for order in orders if (level := _match_level(names[order.id], levels))}
+    if not wanted:
+      return []
+    now = datetime.utcnow()
+    upgraded = []
+    for user in db.query(User).filter(User.id.in_(wanted)).with_for_update():
+      level = wanted[user.id]
+      if levels.get(user.membership_level) == 0 and level != user.membership_level:
+        # Never trade a lifetime membership for a timed one
+        continue
+      user.membership_level = level
+      user.membership_expires_at = _extend(user.membership_expires_at, levels[level], now)
+      upgraded.append(user.username)
+    return upgraded
+
+  def shutdown(self, timeout: float = 10.0) -> None:
+    """Stop the consumer after it has drained what is already queued."""
+
+    self._stopping.set()
+    if self._worker is not None:
+      self._worker.join(timeout)
+
+  def stats(self) -> dict:
+    return {
+      'queued': self._queue.qsize(),
+      'batches': self.batches,
+      'fulfilled': self.fulfilled,
+      'duplicates': self.duplicates,
+      'dropped': self.dropped,
+      'errors': self.errors,
+      'late_payments': self.late_payments,
+      'refunds_required': self.refunds_required
+    }
+
+
+fulfilment = Fulfilment(
+  batch_size=settings.fulfilment_batch_size,
+  batch_wait_seconds=settings.fulfilment_batch_wait_ms / 1000,
+  queue_size=settings.fulfilment_queue_size,
+  recover_seconds=settings.fulfilment_recover_seconds
+)
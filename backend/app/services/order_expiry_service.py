@@ -0,0 +1,302 @@
+"""Expire unpaid orders and give their stock back.
+
+``create_order`` takes stock when the order is placed, so an order whose
+payment never arrives would hold it forever. Every pending order gets a
+deadline ``ORDER_EXPIRY_MINUTES`` after ``created_at``; deadlines live in a
+min-heap per worker, so a tick only looks at orders that are actually due
+instead of rescanning ``orders``.
+
+The heap is fed three ways: ``create_order`` and the flash-sale consumer
+:meth:`OrderExpiry.track` every order they commit, and a resync every
+``ORDER_EXPIRY_RESYNC_SECONDS`` reads pending orders created since the last
+one through ``ix_orders_status_created_at`` (the first resync after start-up
+loads every pending order), which also picks up orders placed on peer
+workers.
+
+Before an order is expired its open WeChat prepay is closed, so the buyer
+cannot pay for stock that has already gone back. Only orders whose close
+succeeded, or which WeChat reports as ``ORDERNOTEXIST``/``ORDERCLOSED``, move
+on; the others are retried ``CLOSE_RETRY`` later. Without a merchant account
+the placeholder prepay ids cannot be paid and nothing needs closing.
+:meth:`OrderExpiry.cancel` runs the same steps at once for an order whose
+prepay could not be created.
+
+Due orders are expired in batches of ``ORDER_EXPIRY_BATCH_SIZE``, one
+transaction each. Every order flips with ``UPDATE ... WHERE status =
+'pending'`` and is skipped if a paid payment already exists. Only the orders
+that actually flipped are counted, so two workers can never release the same
+stock twice. Their quantities go back to ``products.stock`` in a single
+``UPDATE ... CASE``.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, case, exists, func, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.order import Order, OrderItem
+from app.models.payment import Payment
+from app.models.product import Product
+from app.services.wechat_pay_service import configured_merchant, wechat_pay
+
+logger = logging.getLogger(__name__)
+
+STATUS_EXPIRED = 'expired'
+RESYNC_PAGE = 5000
+# Each resync re-reads this far behind the last one, for peer orders that committed after a later timestamp
+RESYNC_OVERLAP = timedelta(minutes=1)
+# How long an order whose prepay could not be closed waits before the next attempt
+CLOSE_RETRY = timedelta(minutes=1)
+
+
+class OrderExpiry:
+  def __init__(self, *, timeout_minutes: float, batch_size: int, tick_seconds: float, resync_seconds: float):
+    self.timeout = timedelta(minutes=timeout_minutes)
+    self.enabled = timeout_minutes > 0
+    self.batch_size = max(1, batch_size)
+    self.tick_seconds = tick_seconds
+    self.resync_seconds = resync_seconds
+    self._heap: List[Tuple[datetime, int]] = []
+    self._tracked: set[int] = set()
+    self._watermark: datetime | None = None
+    self._lock = threading.Lock()
+    self._worker: threading.Thread | None = None
+    self._stopping = threading.Event()
+    self._next_resync = 0.0
+    self.expired_orders = 0
+    self.released_units = 0
+    self.close_deferred = 0
+    self.batches = 0
+    self.errors = 0
+
+  def track(self, order_id: int, created_at: datetime | None) -> None:
+    """Schedule a just-committed pending order for expiry."""
+
+    if not self.enabled or created_at is None:
+      return
+    self._schedule(order_id, created_at + self.timeout)
+
+  def _schedule(self, order_id: int, deadline: datetime) -> None:
+    with self._lock:
+      if order_id not in self._tracked:
+        self._tracked.add(order_id)
+        heapq.heappush(self._heap, (deadline, order_id))
+
+  def start(self) -> None:
+    if not self.enabled or (self._worker is not None and self._worker.is_alive()):
+      return
+    with self._lock:
+      if self._worker is None or not self._worker.is_alive():
+        self._stopping.clear()
+        self._next_resync = 0.0
+        self._worker = threading.Thread(target=self._run, name='order-expiry', daemon=True)
+        self._worker.start()
+
+  def _run(self) -> None:
+    while not self._stopping.is_set():
+      try:
+        if time.monotonic() >= self._next_resync:
+          self._next_resync = time.monotonic() + self.resync_seconds
+          self.resync()
+        while self.expire_due():
+          pass
+      except Exception:  # noqa: BLE001
+        logger.exception('Order expiry tick failed')
+        self.errors += 1
+      self._stopping.wait(self.tick_seconds)
+
+  def resync(self) -> int:
+    """Track pending orders created since the last resync; returns how many were added."""
+
+    added = 0
+    position: Tuple[datetime, int] | None = None
+    if self._watermark is not None:
+      position = (self._watermark - RESYNC_OVERLAP, 0)
+    db = SessionLocal()
+    try:
+      while True:
+        query = db.query(Order.id, Order.created_at).filter(Order.status == 'pending', Order.created_at.isnot(None))
+        if position is not None:
+          created_at, order_id = position
+          query = query.filter(or_(
+            Order.created_at > created_at,
+            and_(Order.created_at == created_at, Order.id > order_id)
+          ))
+        rows = query.order_by(Order.created_at.asc(), Order.id.asc()).limit(RESYNC_PAGE).all()
+        with self._lock:
+          fresh = [(order_id, created_at) for order_id, created_at in rows if order_id not in self._tracked]
+        for order_id, created_at in fresh:
+          self.track(order_id, created_at)
+        added += len(fresh)
+        if rows:
+          position = (rows[-1].created_at, rows[-1].id)
+          self._watermark = max(self._watermark or rows[-1].created_at, rows[-1].created_at)
+        if len(rows) < RESYNC_PAGE:
+          return added
+    finally:
+      db.close()
+
+  def _pop_due(self, now: datetime) -> List[int]:
+    due = []
+    with self._lock:
+      while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+        _, order_id = heapq.heappop(self._heap)
+        self._tracked.discard(order_id)
+        due.append(order_id)
+    return due
+
+  def expire_due(self) -> int:
+    """Expire one batch of due orders; returns the number of due orders looked at."""
+
+    due = self._pop_due(datetime.utcnow())
+    if not due:
+      return 0
+    db = SessionLocal()
+    try:
+      closed = self._close_prepays(db, due)
+      expired, released = self._expire(db, sorted(closed))
+    except Exception:
+      db.rollback()
+      # Put them back so the next tick retries
+      for order_id in due:
+        self._schedule(order_id, datetime.utcnow())
+      raise
+    finally:
+      db.close()
+    deferred = set(due).difference(closed)
+    for order_id in deferred:
+      self._schedule(order_id, datetime.utcnow() + CLOSE_RETRY)
+    self._record(expired, released, deferred=len(deferred))
+    return len(due)
+
+  def cancel(self, order_ids: List[int]) -> List[int]:
+    """Close and expire ``order_ids`` now, returning their stock; returns the ids that were expired.
+
+    Orders whose prepay could not be closed stay pending and are left to the
+    regular expiry, which keeps retrying the close.
+    """
+
+    db = SessionLocal()
+    try:
+      expired, released = self._expire(db, sorted(self._close_prepays(db, order_ids)))
+    except Exception:
+      db.rollback()
+      raise
+    finally:
+      db.close()
+    self._record(expired, released, deferred=len(order_ids) - len(expired))
+    return expired
+
+  def _record(self, expired: List[int], released: Dict[int, int], *, deferred: int) -> None:
+    with self._lock:
+      self.batches += 1
+      self.expired_orders += len(expired)
+      self.released_units += sum(released.values())
+      self.close_deferred += deferred
+    if released:
+      self._after_release(released)
+
+  def _close_prepays(self, db: Session, order_ids: List[int]) -> List[int]:
+    """Close the open WeChat prepays of ``order_ids``; returns the orders that can no longer be paid."""
+
+    merchant = configured_merchant(db)
+    if merchant is None:
+      return list(order_ids)
+    rows = (
+      db.query(Payment.order_id, Payment.out_trade_no)
+      .join(Order, Order.id == Payment.order_id)
+      .filter(
+        Payment.order_id.in_(order_ids),
+        Payment.provider == 'wechat',
+        Payment.status == 'pending',
+        Payment.out_trade_no.isnot(None),
+        Order.status == 'pending'
+      )
+      .all()
+    )
+    # Do not hold the read transaction open across the WeChat calls
+    db.rollback()
+    if not rows:
+      return list(order_ids)
+    try:
+      closed = wechat_pay.run(wechat_pay.close_orders, merchant, [out_trade_no for _, out_trade_no in rows])
+    except Exception:  # noqa: BLE001
+      logger.exception('Closing %d WeChat prepays failed', len(rows))
+      closed = {}
+    still_open = {order_id for order_id, out_trade_no in rows if not closed.get(out_trade_no)}
+    return [order_id for order_id in order_ids if order_id not in still_open]
+
+  def _expire(self, db: Session, order_ids: List[int]) -> Tuple[List[int], Dict[int, int]]:
+    if not order_ids:
+      return [], {}
+    paid = exists().where(Payment.order_id == Order.id, Payment.status == 'paid')
+    expired = []
+    for order_id in order_ids:
+      changed = db.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == 'pending', ~paid)
+        .values(status=STATUS_EXPIRED)
+        .execution_options(synchronize_session=False)
+      ).rowcount
+      if changed:
+        expired.append(order_id)
+    if not expired:
+      db.rollback()
+      return [], {}
+    released = {
+      product_id: int(quantity)
+      for product_id, quantity in db.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+      .filter(OrderItem.order_id.in_(expired))
+      .group_by(OrderItem.product_id)
+      if quantity
+    }
+    if released:
+      db.execute(
+        update(Product)
+        .where(Product.id.in_(sorted(released)))
+        .values(stock=Product.stock + case(released, value=Product.id))
+        .execution_options(synchronize_session=False)
+      )
+    db.commit()
+    return expired, released
+
+  def _after_release(self, released: Dict[int, int]) -> None:
+    # Imported here: the flash-sale service imports this module to track its orders
+    from app.services.flash_sale_service import flash_sale
+    flash_sale.reseed(released)
+
+  def shutdown(self, timeout: float = 10.0) -> None:
+    self._stopping.set()
+    if self._worker is not None:
+      self._worker.join(timeout)
+
+  def stats(self) -> dict:
+    with self._lock:
+      next_deadline = self._heap[0][0] if self._heap else None
+      return {
+        'enabled': self.enabled,
+        'tracked': len(self._heap),
+        'next_deadline': next_deadline.isoformat() if next_deadline else None,
+        'expired_orders': self.expired_orders,
+        'released_units': self.released_units,
+        'close_deferred': self.close_deferred,
+        'batches': self.batches,
+        'errors': self.errors
+      }
+
+
+order_expiry = OrderExpiry(
+  timeout_minutes=settings.order_expiry_minutes,
+  batch_size=settings.order_expiry_batch_size,
+  tick_seconds=settings.order_expiry_tick_seconds,
+  resync_seconds=settings.order_expiry_resync_seconds
+)
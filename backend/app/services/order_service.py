@@ -1,32 +1,142 @@
+from collections import defaultdict
+from datetime import datetime
 from decimal import Decimal
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable
+from sqlalchemy import case, update
+from sqlalchemy.orm import Query, Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException
+from app.core.pagination import DEFAULT_PAGE_SIZE, cursor_value, decode_cursor, encode_cursor
 from app.models.order import Order, OrderItem
 from app.models.product import Product
-from app.schemas.order import OrderCreate
+from app.services import sales_rollup_service
+from app.services.order_expiry_service import order_expiry
+from app.schemas.order import OrderCreate, OrderItemBase
 
 
-def create_order(db: Session, user_id: int, order_in: OrderCreate) -> Order:
+def lock_products(db: Session, product_ids: Iterable[int]) -> Dict[int, Product]:
+  """Lock the given products with a single ``SELECT ... FOR UPDATE`` in ascending id order.
+
+  Every writer takes its locks in the same order, so two carts with the same
+  SKUs queue behind each other instead of deadlocking.
+  """
+
+  return {
+    product.id: product
+    for product in db.query(Product)
+    .filter(Product.id.in_(sorted(set(product_ids))))
+    .order_by(Product.id.asc())
+    .with_for_update()
+    .all()
+  }
+
+
+def decrement_stock(db: Session, products: Dict[int, Product], quantities: Dict[int, int]) -> None:
+  """Take ``quantities`` off locked ``products`` with one ``UPDATE``.
+
+  The ``UPDATE`` only matches rows that still hold enough stock. Under a real
+  row lock they all do; where ``FOR UPDATE`` is a no-op (SQLite) a concurrent
+  writer may have got there first, and then the transaction is rolled back
+  and a 400 lists the lines that are now short instead of overselling.
+  """
+
+  quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+  if not quantities:
+    return
+  needed = case(quantities, value=Product.id)
+  changed = db.execute(
+    update(Product)
+    .where(Product.id.in_(list(quantities)), Product.stock >= needed)
+    .values(stock=Product.stock - needed)
+    .execution_options(synchronize_session=False)
+  ).rowcount
+  if changed != len(quantities):
+    db.rollback()
+    available = dict(db.query(Product.id, Product.stock).filter(Product.id.in_(list(quantities))))
+    raise HTTPException(
+      status_code=400,
+      detail={'message': 'Insufficient stock', 'items': find_shortages(available, quantities)}
+    )
+  for product_id, quantity in quantities.items():
+    # Mirror the UPDATE on the loaded rows without marking them dirty
+    set_committed_value(products[product_id], 'stock', products[product_id].stock - quantity)
+
+
+def order_quantities(items: Iterable[OrderItemBase]) -> Dict[int, int]:
+  """Sum the requested quantity per product, rejecting empty carts and non-positive lines."""
+
+  quantities: Dict[int, int] = defaultdict(int)
+  for item in items:
+    if item.quantity <= 0:
+      raise HTTPException(status_code=400, detail='Quantity must be positive')
+    quantities[item.product_id] += item.quantity
+  if not quantities:
+    raise HTTPException(status_code=400, detail='Order has no items')
+  return dict(quantities)
+
+
+def find_shortages(available: Dict[int, int], quantities: Dict[int, int]) -> list:
+  """List every line of ``quantities`` that ``available`` (stock per product id) cannot cover."""
+
+  shortages = []
+  for product_id in sorted(quantities):
+    stock = available.get(product_id)
+    if stock is None or stock < quantities[product_id]:
+      shortages.append({
+        'product_id': product_id,
+        'requested': quantities[product_id],
+        'available': stock or 0,
+        'reason': 'not_found' if stock is None else 'insufficient_stock'
+      })
+  return shortages
+
+
+def reserve_stock(db: Session, items: Iterable[OrderItemBase]) -> Dict[int, Product]:
+  """Lock, validate and decrement stock for every requested product in one pass.
+
+  When anything is short the transaction is rolled back and a 400 lists every
+  offending line, not just the first.
+  """
+
+  quantities = order_quantities(items)
+  products = lock_products(db, quantities)
+  shortages = find_shortages({product_id: product.stock for product_id, product in products.items()}, quantities)
+  if shortages:
+    db.rollback()
+    raise HTTPException(status_code=400, detail={'message': 'Insufficient stock', 'items': shortages})
+  decrement_stock(db, products, quantities)
+  return products
+
+
+def build_order(user_id: int, items: Iterable[OrderItemBase], products: Dict[int, Product]) -> Order:
   total = Decimal('0')
-  order = Order(user_id=user_id, status='pending')
-  db.add(order)
-  db.flush()
-  for item in order_in.items:
-    product = db.query(Product).filter(Product.id == item.product_id).with_for_update().first()
-    if not product or product.stock < item.quantity:
-      raise HTTPException(status_code=400, detail='Insufficient stock')
-    product.stock -= item.quantity
-    line_total = Decimal(product.price) * item.quantity
-    total += line_total
-    db.add(OrderItem(order_id=order.id, product_id=product.id, quantity=item.quantity, price=product.price))
+  order = Order(user_id=user_id, status='pending', created_at=datetime.utcnow())
+  for item in items:
+    product = products[item.product_id]
+    total += Decimal(product.price) * item.quantity
+    order.items.append(OrderItem(product_id=product.id, quantity=item.quantity, price=product.price))
   order.total_amount = total
+  return order
+
+
+def create_order(db: Session, user_id: int, order_in: OrderCreate, channel: str = sales_rollup_service.CHANNEL_DIRECT) -> Order:
+  products = reserve_stock(db, order_in.items)
+  order = build_order(user_id, order_in.items, products)
+  db.add(order)
   db.commit()
+  sales_rollup_service.record_orders(db, [order], channel)
+  order_expiry.track(order.id, order.created_at)
   db.refresh(order)
   return order
 
 
+def _with_items(query: Query) -> Query:
+  # Two extra queries in total (items, then their products), however many orders are loaded
+  return query.options(selectinload(Order.items).selectinload(OrderItem.product))
+
+
 def get_order(db: Session, order_id: int, user_id: int | None = None) -> Order:
-  query = db.query(Order).filter(Order.id == order_id)
+  query = _with_items(db.query(Order)).filter(Order.id == order_id)
   if user_id:
     query = query.filter(Order.user_id == user_id)
   order = query.first()
@@ -36,7 +146,22 @@ def get_order(db: Session, order_id: int, user_id: int | None = None) -> Order:
 
 
 def list_orders(db: Session, user_id: int | None = None):
-  query = db.query(Order)
+  query = _with_items(db.query(Order))
   if user_id:
     query = query.filter(Order.user_id == user_id)
   return query.all()
+
+
+def page_orders(db: Session, user_id: int, *, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+  """Newest-first page of a user's orders, keyset-paginated on ``id``."""
+
+  query = _with_items(db.query(Order)).filter(Order.user_id == user_id)
+  before_id = cursor_value(decode_cursor(cursor), 'id')
+  if before_id is not None:
+    query = query.filter(Order.id < before_id)
+  rows = query.order_by(Order.id.desc()).limit(limit + 1).all()
+  items = rows[:limit]
+  return {
+    'items': items,
+    'next_cursor': encode_cursor({'id': items[-1].id}) if len(rows) > limit else None
+  }
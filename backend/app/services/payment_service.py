@@ -1,24 +1,38 @@
 import hashlib
+import hmac
+import json
 import secrets
 import time
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime
+from decimal import Decimal
+from typing import Mapping
 
 from fastapi import HTTPException, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
-from app.models.integration import IntegrationConfig
+from app.config import settings
+from app.core.cache import TTLCache
+from app.models.order import Order
 from app.models.payment import Payment
+from app.services import system_config_service
+from app.services.flash_sale_service import Ticket, flash_sale
+from app.services.fulfilment_service import fulfilment
+from app.services.order_expiry_service import order_expiry
 from app.services.order_service import create_order
+from app.services.wechat_jssdk_service import jssdk
+from app.services.wechat_pay_service import SIGN_TYPE, Merchant, sign, wechat_pay
 from app.schemas.order import OrderCreate
 from app.schemas.payment import PaymentRequest
 
+# WeChat prepay ids live two hours; flash-sale polls reuse them rather than calling unified order again
+_prepays = TTLCache(4096, 6600)
 
-def _load_wechat_integration(db: Session) -> dict:
-  record = (
-    db.query(IntegrationConfig)
-    .filter(IntegrationConfig.provider == 'wechat_pay')
-    .first()
-  )
-  if not record or not record.is_active or not isinstance(record.config, dict):
+
+def _load_wechat_integration(db: Session) -> Mapping[str, str]:
+  record = system_config_service.integration(db, 'wechat_pay')
+  if not record or not record.is_active:
     raise HTTPException(
       status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
       detail='微信支付未配置或未激活，请在后台完善集成信息后重试'
@@ -53,37 +67,206 @@ def build_js_config(*, url: str, app_id: str, api_key: str) -> dict:
   }
 
 
-def create_wechat_payment(db: Session, user_id: int, payload: PaymentRequest):
+def _load_wechat_keys(db: Session) -> Merchant:
   config = _load_wechat_integration(db)
-  app_id = str(config.get('appId') or '')
-  api_key = str(config.get('apiKey') or '')
-  if not app_id or not api_key:
+  merchant = Merchant(str(config.get('appId') or ''), str(config.get('mchId') or ''), str(config.get('apiKey') or ''))
+  if not merchant.app_id or not merchant.api_key:
     raise HTTPException(status_code=503, detail='微信支付配置缺失，无法创建订单')
+  if merchant.mch_id and not settings.wechat_pay_notify_url:
+    raise HTTPException(status_code=503, detail='未配置微信支付回调地址（WECHAT_PAY_NOTIFY_URL），无法创建订单')
+  return merchant
+
+
+def _jsapi_params(merchant: Merchant, prepay_id: str) -> dict:
+  params = {
+    'appId': merchant.app_id,
+    'timeStamp': str(int(time.time())),
+    'nonceStr': secrets.token_hex(8),
+    'package': f'prepay_id={prepay_id}',
+    'signType': SIGN_TYPE
+  }
+  params['paySign'] = sign(params, merchant.api_key, SIGN_TYPE)
+  return params
+
 
-  order = create_order(db, user_id, OrderCreate(items=payload.items))
+def _prepay_response(
+    db: Session,
+    merchant: Merchant,
+    order_id: int,
+    payment_id: int,
+    *,
+    client_ip: str,
+    openid: str | None = None
+) -> dict:
+  if not merchant.mch_id:
+    # No merchant account configured: keep the local placeholder prepay id
+    package = f"prepay_id={payment_id}"
+    prepay_params = generate_wechat_signature(app_id=merchant.app_id, api_key=merchant.api_key, package=package)
+    return {'orderId': order_id, 'prepayParams': prepay_params}
+
+  key = (payment_id, openid)
+  prepay = _prepays.get(key)
+  if prepay is None:
+    out_trade_no, total_amount = (
+      db.query(Payment.out_trade_no, Order.total_amount)
+      .join(Order, Order.id == Payment.order_id)
+      .filter(Payment.id == payment_id)
+      .one()
+    )
+    prepay = wechat_pay.run(
+      wechat_pay.unified_order,
+      merchant,
+      out_trade_no=out_trade_no,
+      total_fee=int(Decimal(total_amount or 0) * 100),
+      body=f'订单 {order_id}',
+      notify_url=settings.wechat_pay_notify_url,
+      client_ip=client_ip,
+      openid=openid
+    )
+    _prepays.set(key, prepay)
+  result = {'orderId': order_id, 'prepayParams': _jsapi_params(merchant, prepay['prepay_id'])}
+  if prepay.get('code_url'):
+    result['codeUrl'] = prepay['code_url']
+  return result
+
+
+def create_wechat_payment(db: Session, user_id: int, payload: PaymentRequest, client_ip: str = '127.0.0.1') -> dict | Ticket:
+  """Create the order and its pending payment, or queue both when the cart holds flash-sale products.
+
+  With a merchant id configured the prepay order is created through WeChat's
+  unified-order API; otherwise a local placeholder prepay id is signed. When
+  WeChat refuses or cannot be reached the order is cancelled straight away so
+  its stock does not wait for the expiry.
+  """
+
+  merchant = _load_wechat_keys(db)
+  order_in = OrderCreate(items=payload.items)
+  if flash_sale.handles(order_in.items):
+    return flash_sale.submit(db, user_id, order_in, provider='wechat')
+
+  order = create_order(db, user_id, order_in, channel='wechat')
   payment = Payment(order_id=order.id, provider='wechat', status='pending')
   db.add(payment)
   db.commit()
   db.refresh(payment)
-  package = f"prepay_id={payment.id}"
-  prepay_params = generate_wechat_signature(app_id=app_id, api_key=api_key, package=package)
-  return {'orderId': order.id, 'prepayParams': prepay_params}
+  try:
+    return _prepay_response(db, merchant, order.id, payment.id, client_ip=client_ip, openid=payload.openid)
+  except HTTPException:
+    order_expiry.cancel([order.id])
+    raise
+
+
+def ticket_payment(db: Session, ticket: Ticket, client_ip: str = '127.0.0.1') -> dict | None:
+  """Prepay parameters for a flash-sale ticket once its order and payment are written."""
+
+  if ticket.payment_id is None or ticket.order_id is None:
+    return None
+  merchant = _load_wechat_keys(db)
+  return _prepay_response(db, merchant, ticket.order_id, ticket.payment_id, client_ip=client_ip)
 
 
 def load_wechat_js_config(db: Session, *, url: str) -> dict:
+  """JS-SDK config from the cached jsapi ticket, or the legacy key-based signature without an AppSecret."""
+
   config = _load_wechat_integration(db)
   app_id = str(config.get('appId') or '')
+  app_secret = str(config.get('appSecret') or '')
+  if app_id and app_secret:
+    return jssdk.config(app_id=app_id, app_secret=app_secret, url=url)
   api_key = str(config.get('apiKey') or '')
   if not app_id or not api_key:
     raise HTTPException(status_code=503, detail='微信支付配置缺失，无法生成前端参数')
   return build_js_config(url=url, app_id=app_id, api_key=api_key)
 
 
-def handle_notify(db: Session, raw: str):
-  payment = db.query(Payment).first()
-  if not payment:
+def parse_notify(raw: str) -> dict:
+  """Flatten a WeChat Pay v2 XML notify (or the equivalent JSON object) into a dict of strings."""
+
+  body = raw.strip()
+  try:
+    if body.startswith('<'):
+      return {child.tag: (child.text or '') for child in ElementTree.fromstring(body)}
+    data = json.loads(body)
+  except (ElementTree.ParseError, ValueError):
+    raise HTTPException(status_code=400, detail='Malformed notify body')
+  if not isinstance(data, dict):
+    raise HTTPException(status_code=400, detail='Malformed notify body')
+  return {key: '' if value is None else str(value) for key, value in data.items()}
+
+
+def notify_sign(fields: dict, api_key: str) -> str:
+  """Signature a notify must carry: the v2 scheme with the ``sign_type`` it names (MD5 by default)."""
+
+  return sign(fields, api_key)
+
+
+def _notify_api_key(db: Session) -> str:
+  record = system_config_service.integration(db, 'wechat_pay')
+  if not record or not record.is_active:
+    return ''
+  return str(record.config.get('apiKey') or '')
+
+
+def notify_ack(raw: str):
+  """Acknowledgement in the shape of the notify: XML for WeChat, JSON for JSON callers."""
+
+  if raw.lstrip().startswith('<'):
+    return '<xml><return_code><![CDATA[SUCCESS]]></return_code><return_msg><![CDATA[OK]]></return_msg></xml>'
+  return {'status': 'success'}
+
+
+def handle_notify(db: Session, raw: str) -> bool:
+  """Mark the notified payment paid and queue its fulfilment; returns False for a duplicate notify.
+
+  The payment is found by ``out_trade_no`` through its unique index and
+  flipped with ``UPDATE ... WHERE status != 'paid'``, so concurrent or
+  repeated notifies for one payment queue its fulfilment exactly once.
+  Notifies are refused while no active merchant key can verify them.
+  """
+
+  fields = parse_notify(raw)
+  api_key = _notify_api_key(db)
+  if not api_key:
+    raise HTTPException(status_code=403, detail='WeChat Pay is not configured')
+  if not hmac.compare_digest(fields.get('sign', ''), notify_sign(fields, api_key)):
+    raise HTTPException(status_code=400, detail='Invalid notify signature')
+  out_trade_no = fields.get('out_trade_no')
+  if not out_trade_no:
+    raise HTTPException(status_code=400, detail='out_trade_no is required')
+  if not fields.get('return_code') or not fields.get('result_code'):
+    raise HTTPException(status_code=400, detail='return_code and result_code are required')
+
+  row = (
+    db.query(Payment.id, Payment.status, Order.total_amount)
+    .join(Order, Order.id == Payment.order_id)
+    .filter(Payment.out_trade_no == out_trade_no)
+    .first()
+  )
+  if row is None:
     raise HTTPException(status_code=404, detail='Payment not found')
-  payment.raw_notify = raw
-  payment.status = 'paid'
+  payment_id, payment_status, total_amount = row
+  if payment_status == 'paid':
+    return False
+  if fields['return_code'] != 'SUCCESS' or fields['result_code'] != 'SUCCESS':
+    # A failed payment is not final for WeChat; the buyer may still pay, so only acknowledge it
+    return False
+  total_fee = fields.get('total_fee')
+  if total_fee and (not total_fee.isdigit() or int(total_fee) != int(Decimal(total_amount or 0) * 100)):
+    raise HTTPException(status_code=400, detail='Notify amount does not match the order')
+
+  changed = db.execute(
+    update(Payment)
+    .where(Payment.id == payment_id, Payment.status != 'paid')
+    .values(
+      status='paid',
+      paid_at=datetime.utcnow(),
+      transaction_id=fields.get('transaction_id') or None,
+      raw_notify=raw[:2000]
+    )
+    .execution_options(synchronize_session=False)
+  ).rowcount
   db.commit()
-  return payment
+  if not changed:
+    return False
+  fulfilment.enqueue(payment_id)
+  return True
@@ -0,0 +1,224 @@
+"""In-memory inverted index for storefront product search.
+
+Names and descriptions are tokenized into English word and prefix terms and
+CJK unigrams/bigrams, so "雅思写" and "spea" both match without a table
+scan. Every query token must match. Results are ranked by field-weighted term
+frequency times IDF, with name hits counting more than description hits.
+
+The index is built lazily from ``products`` on the first search, kept current
+by the product CRUD functions, and rebuilt after ``SEARCH_INDEX_REBUILD_SECONDS``
+to pick up writes made by other workers. Rebuilds are single-flight and run
+outside the index lock: one request builds a fresh index while the others keep
+searching the old one, and the new one is swapped in with a single assignment.
+Only the very first build makes concurrent searches wait.
+
+``python -m benchmarks.product_search`` times a build and searches over
+100k synthetic products, with and without a rebuild running alongside.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.product import Product
+
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+MAX_PREFIX_LENGTH = 12
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+
+
+def _index_terms(text: str) -> Iterable[str]:
+  text = (text or '').lower()
+  for word in _WORD_RE.findall(text):
+    yield f'w:{word}'
+    for size in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+      yield f'p:{word[:size]}'
+  for run in _CJK_RE.findall(text):
+    for char in run:
+      yield f'u:{char}'
+    for i in range(len(run) - 1):
+      yield f'b:{run[i:i + 2]}'
+
+
+def _query_tokens(query: str) -> List[List[str]]:
+  """Split a query into tokens; each token is the list of terms that may satisfy it, best first."""
+
+  query = query.lower()
+  tokens: List[List[str]] = []
+  for word in _WORD_RE.findall(query):
+    tokens.append([f'w:{word}', f'p:{word[:MAX_PREFIX_LENGTH]}'])
+  for run in _CJK_RE.findall(query):
+    if len(run) == 1:
+      tokens.append([f'u:{run}'])
+    else:
+      tokens.extend([f'b:{run[i:i + 2]}'] for i in range(len(run) - 1))
+  return tokens
+
+
+def is_searchable(query: str) -> bool:
+  return bool(_query_tokens(query))
+
+
+class _Terms(NamedTuple):
+  postings: Dict[str, Dict[int, float]]
+  doc_terms: Dict[int, List[str]]
+
+  def remove(self, product_id: int) -> None:
+    for term in self.doc_terms.pop(product_id, ()):
+      posting = self.postings.get(term)
+      if posting is not None:
+        posting.pop(product_id, None)
+        if not posting:
+          del self.postings[term]
+
+  def add(self, product_id: int, name: str, description: str | None) -> None:
+    weights: Dict[str, float] = defaultdict(float)
+    for term in _index_terms(name):
+      weights[term] += NAME_WEIGHT
+    for term in _index_terms(description or ''):
+      weights[term] += DESCRIPTION_WEIGHT
+    for term, weight in weights.items():
+      self.postings[term][product_id] = weight
+    self.doc_terms[product_id] = list(weights)
+
+
+def _empty_terms() -> _Terms:
+  return _Terms(defaultdict(dict), {})
+
+
+# A product write seen while a rebuild was in flight: (id, name, description), or (id, None, None) for a delete
+Change = Tuple[int, str | None, str | None]
+
+
+class ProductIndex:
+  def __init__(self):
+    self._terms = _empty_terms()
+    self._lock = threading.Lock()
+    # Writes to replay onto the index being built; None while no rebuild is running
+    self._changes: List[Change] | None = None
+    self._rebuild_lock = threading.Lock()
+    self.built_at: float | None = None
+
+  def __len__(self) -> int:
+    return len(self._terms.doc_terms)
+
+  def upsert(self, product_id: int, name: str, description: str | None) -> None:
+    with self._lock:
+      self._terms.remove(product_id)
+      self._terms.add(product_id, name, description)
+      if self._changes is not None:
+        self._changes.append((product_id, name, description))
+
+  def remove(self, product_id: int) -> None:
+    with self._lock:
+      self._terms.remove(product_id)
+      if self._changes is not None:
+        self._changes.append((product_id, None, None))
+
+  def rebuild(self, rows: Iterable[tuple[int, str, str | None]]) -> None:
+    """Build a fresh index from ``rows`` without holding the lock, then swap it in.
+
+    ``rows`` may be a lazy query: writes reported while it is read and indexed
+    are replayed onto the fresh index before the swap, so none are lost.
+    """
+
+    with self._lock:
+      self._changes = []
+    try:
+      fresh = _empty_terms()
+      for product_id, name, description in rows:
+        fresh.add(product_id, name, description)
+    except BaseException:
+      with self._lock:
+        self._changes = None
+      raise
+    with self._lock:
+      for product_id, name, description in self._changes:
+        fresh.remove(product_id)
+        if name is not None:
+          fresh.add(product_id, name, description)
+      self._changes = None
+      self._terms = fresh
+      self.built_at = time.monotonic()
+
+  def try_rebuild(self, rows: Iterable[tuple[int, str, str | None]], *, wait: bool) -> bool:
+    """Single-flight :meth:`rebuild`; returns False, without waiting unless ``wait``, when another is running.
+
+    A caller that waited does not rebuild again if the build it waited for
+    finished after it asked.
+    """
+
+    requested_at = time.monotonic()
+    if not self._rebuild_lock.acquire(blocking=wait):
+      return False
+    try:
+      if self.built_at is None or self.built_at < requested_at:
+        self.rebuild(rows)
+    finally:
+      self._rebuild_lock.release()
+    return True
+
+  def search(self, query: str) -> List[int]:
+    tokens = _query_tokens(query)
+    if not tokens:
+      return []
+    with self._lock:
+      postings = self._terms.postings
+      total = max(1, len(self._terms.doc_terms))
+      scores: Dict[int, float] | None = None
+      for alternatives in tokens:
+        token_scores: Dict[int, float] = {}
+        for term in alternatives:
+          posting = postings.get(term)
+          if not posting:
+            continue
+          idf = math.log(1 + total / len(posting))
+          for product_id, weight in posting.items():
+            # Exact word hits are listed first and win over prefix hits of the same token
+            token_scores.setdefault(product_id, weight * idf)
+        if scores is None:
+          scores = token_scores
+        else:
+          scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+        if not scores:
+          return []
+    return sorted(scores, key=lambda pid: (-scores[pid], pid))
+
+
+index = ProductIndex()
+
+
+def _is_stale() -> bool:
+  if index.built_at is None:
+    return True
+  return time.monotonic() - index.built_at > settings.search_index_rebuild_seconds
+
+
+def ensure_index(db: Session) -> ProductIndex:
+  if _is_stale():
+    # The query is lazy, so callers that find a rebuild already running never read the table; until the first
+    # build there is nothing to serve, so only then do they wait for it
+    rows = db.query(Product.id, Product.name, Product.description)
+    index.try_rebuild(rows, wait=index.built_at is None)
+  return index
+
+
+def on_product_saved(product: Product) -> None:
+  if index.built_at is not None:
+    index.upsert(product.id, product.name, product.description)
+
+
+def on_product_deleted(product_id: int) -> None:
+  if index.built_at is not None:
+    index.remove(product_id)
@@ -1,14 +1,77 @@
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from app.config import settings
+from app.core import http_cache
+from app.core.pagination import DEFAULT_PAGE_SIZE, cursor_value, decode_cursor, encode_cursor
 from app.models.product import Product
 from app.schemas.product import ProductCreate
+from app.services import product_search
 
 
-def list_products(db: Session, q: str | None = None):
+def _ranked_product_ids(db: Session, q: str) -> list[int] | None:
+  """Ranked ids from the inverted index; ``None`` means fall back to ILIKE."""
+
+  if not settings.search_index_enabled or not product_search.is_searchable(q):
+    return None
+  try:
+    return product_search.ensure_index(db).search(q)
+  except SQLAlchemyError:
+    return None
+
+
+def _load_in_order(db: Session, product_ids: list[int]) -> list[Product]:
+  if not product_ids:
+    return []
+  products = {product.id: product for product in db.query(Product).filter(Product.id.in_(product_ids)).all()}
+  return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+def _filtered_query(db: Session, q: str | None):
   query = db.query(Product)
   if q:
-    query = query.filter(Product.name.ilike(f"%{q}%"))
-  return query.all()
+    pattern = f"%{q}%"
+    query = query.filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+  return query
+
+
+def list_products(db: Session, q: str | None = None):
+  if q:
+    ranked_ids = _ranked_product_ids(db, q)
+    if ranked_ids is not None:
+      return _load_in_order(db, ranked_ids)
+  return _filtered_query(db, q).all()
+
+
+def page_products(db: Session, q: str | None = None, *, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+  """One page of the catalog, keyset-paginated on ``id``.
+
+  Ranked search results have no stable keyset, so their cursor carries the
+  position in the ranked list instead.
+  """
+
+  position = decode_cursor(cursor)
+  if q:
+    ranked_ids = _ranked_product_ids(db, q)
+    if ranked_ids is not None:
+      offset = max(0, cursor_value(position, 'rank') or 0)
+      end = offset + limit
+      return {
+        'items': _load_in_order(db, ranked_ids[offset:end]),
+        'next_cursor': encode_cursor({'rank': end}) if end < len(ranked_ids) else None
+      }
+
+  query = _filtered_query(db, q)
+  after_id = cursor_value(position, 'id')
+  if after_id is not None:
+    query = query.filter(Product.id > after_id)
+  rows = query.order_by(Product.id.asc()).limit(limit + 1).all()
+  items = rows[:limit]
+  return {
+    'items': items,
+    'next_cursor': encode_cursor({'id': items[-1].id}) if len(rows) > limit else None
+  }
 
 
 def get_product(db: Session, product_id: int) -> Product:
@@ -23,6 +86,8 @@ def create_product(db: Session, product_in: ProductCreate) -> Product:
   db.add(product)
   db.commit()
   db.refresh(product)
+  product_search.on_product_saved(product)
+  http_cache.bump('products')
   return product
 
 
@@ -32,6 +97,8 @@ def update_product(db: Session, product_id: int, product_in: ProductCreate) -> P
     setattr(product, key, value)
   db.commit()
   db.refresh(product)
+  product_search.on_product_saved(product)
+  http_cache.bump('products')
   return product
 
 
@@ -39,3 +106,5 @@ def delete_product(db: Session, product_id: int):
   product = get_product(db, product_id)
   db.delete(product)
   db.commit()
+  product_search.on_product_deleted(product_id)
+  http_cache.bump('products')
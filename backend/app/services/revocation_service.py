@@ -0,0 +1,142 @@
+"""Token revocation list fronted by an in-memory Bloom filter.
+
+Revoked ``jti`` values are stored in ``revoked_tokens`` until the token would
+have expired anyway. Each worker mirrors the unexpired rows into a Bloom
+filter, so checking a token that was never revoked costs no query. Filter hits
+are confirmed against the table. Revocations made by other workers are pulled
+in every ``TOKEN_REVOCATION_SYNC_SECONDS``, and the filter is rebuilt from
+scratch once an hour (or when it fills up) to drop expired entries. A failed
+load or sync is retried after the same interval rather than on the next
+request, so a database outage does not turn into a query per request.
+
+Refresh tokens are single use: :func:`revoke_once` inserts the ``jti`` and
+reports a duplicate key as "already used", so of two concurrent refreshes
+with the same token only one succeeds.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.bloom import BloomFilter
+from app.core.database import SessionLocal
+from app.models.revoked_token import RevokedToken
+
+REBUILD_INTERVAL_SECONDS = 3600
+# Overlap between incremental syncs so rows committed late by another worker are not skipped
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class RevocationList:
+  def __init__(self, capacity: int, error_rate: float, sync_seconds: float):
+    self.capacity = capacity
+    self.error_rate = error_rate
+    self.sync_seconds = sync_seconds
+    self._bloom = BloomFilter(capacity, error_rate)
+    self._lock = threading.Lock()
+    self._loaded = False
+    self._watermark = datetime.utcnow()
+    self._next_sync = 0.0
+    self._next_rebuild = 0.0
+    self.failures = 0
+    self.last_failure: datetime | None = None
+
+  def _rebuild(self, db: Session) -> None:
+    now = datetime.utcnow()
+    db.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+    db.commit()
+    jtis = [row[0] for row in db.query(RevokedToken.jti).all()]
+    bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+    for jti in jtis:
+      bloom.add(jti)
+    self._bloom = bloom
+    self._watermark = now - SYNC_OVERLAP
+    self._loaded = True
+    self._next_rebuild = time.monotonic() + REBUILD_INTERVAL_SECONDS
+
+  def _sync(self, db: Session) -> None:
+    started = datetime.utcnow()
+    rows = db.query(RevokedToken.jti).filter(RevokedToken.revoked_at >= self._watermark).all()
+    for (jti,) in rows:
+      self._bloom.add(jti)
+    self._watermark = started - SYNC_OVERLAP
+
+  def _refresh(self) -> None:
+    # Applies before the first successful load too: until then the filter is empty and a failed load waits
+    now = time.monotonic()
+    if now < self._next_sync:
+      return
+    with self._lock:
+      if now < self._next_sync:
+        return
+      db = SessionLocal()
+      try:
+        if not self._loaded or now >= self._next_rebuild or self._bloom.count >= self._bloom.capacity:
+          self._rebuild(db)
+        else:
+          self._sync(db)
+      except SQLAlchemyError:
+        db.rollback()
+        self.failures += 1
+        self.last_failure = datetime.utcnow()
+      finally:
+        db.close()
+        # Back off on failure as well, so an outage does not turn into a query per request
+        self._next_sync = now + self.sync_seconds
+
+  def might_contain(self, jti: str) -> bool:
+    self._refresh()
+    return jti in self._bloom
+
+  def add(self, jti: str) -> None:
+    with self._lock:
+      self._bloom.add(jti)
+
+  def stats(self) -> dict:
+    return {
+      'entries': self._bloom.count,
+      'capacity': self._bloom.capacity,
+      'bits': self._bloom.size,
+      'loaded': self._loaded,
+      'failures': self.failures,
+      'last_failure': self.last_failure.isoformat() if self.last_failure else None
+    }
+
+
+revocations = RevocationList(
+  settings.token_revocation_capacity,
+  settings.token_revocation_error_rate,
+  settings.token_revocation_sync_seconds
+)
+
+
+def revoke(db: Session, jti: str, expires_at: datetime) -> None:
+  db.merge(RevokedToken(jti=jti, expires_at=expires_at, revoked_at=datetime.utcnow()))
+  db.commit()
+  revocations.add(jti)
+
+
+def revoke_once(db: Session, jti: str, expires_at: datetime) -> bool:
+  """Revoke ``jti`` unless it already is; returns False when another request revoked it first."""
+
+  db.add(RevokedToken(jti=jti, expires_at=expires_at, revoked_at=datetime.utcnow()))
+  try:
+    db.commit()
+  except IntegrityError:
+    db.rollback()
+    return False
+  revocations.add(jti)
+  return True
+
+
+def is_revoked(db: Session, jti: str) -> bool:
+  if not revocations.might_contain(jti):
+    return False
+  return db.get(RevokedToken, jti) is not None
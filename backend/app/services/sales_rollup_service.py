@@ -0,0 +1,285 @@
+"""Incremental sales rollups for the admin dashboard.
+
+``sales_rollups`` keeps one row per report day, channel and membership level
+with running order and payment totals. Order creation and payments turning
+paid add to the matching row with a single upsert, so the dashboard reads
+O(days) rows instead of scanning ``orders`` and ``payments``.
+
+Increments run in their own short transaction after the business commit, so a
+hot rollup row never extends the order transaction's locks. A failed increment
+is logged, counted in :func:`stats` and dropped rather than failing the order;
+:func:`rebuild` recomputes the table from scratch (``POST /admin/dashboard/rebuild``
+or ``python -m benchmarks.sales_rollup``). Levels are the buyer's level at the
+time of the event, and a rebuild attributes history to current levels.
+
+Increments in this process wait while a rebuild runs, so none lands between
+its delete and its insert and gets wiped. Other workers are not held back:
+with several workers, rebuild while the shop is quiet.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.order import Order
+from app.models.payment import Payment
+from app.models.sales_rollup import SalesRollup
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_DIRECT = 'direct'
+COUNTERS = ('order_count', 'order_amount', 'paid_count', 'paid_amount')
+
+RollupKey = Tuple[date, str, str]
+
+
+class _RebuildGate:
+  """Lets increments run alongside each other but never alongside a rebuild."""
+
+  def __init__(self):
+    self._condition = threading.Condition()
+    self._active = 0
+    self._rebuilding = False
+    self.applied = 0
+    self.failed = 0
+
+  @contextmanager
+  def increment(self) -> Iterator[None]:
+    with self._condition:
+      self._condition.wait_for(lambda: not self._rebuilding)
+      self._active += 1
+    try:
+      yield
+    finally:
+      with self._condition:
+        self._active -= 1
+        self._condition.notify_all()
+
+  @contextmanager
+  def rebuild(self) -> Iterator[None]:
+    with self._condition:
+      self._condition.wait_for(lambda: not self._rebuilding)
+      self._rebuilding = True
+      self._condition.wait_for(lambda: self._active == 0)
+    try:
+      yield
+    finally:
+      with self._condition:
+        self._rebuilding = False
+        self._condition.notify_all()
+
+  def count(self, failed: bool) -> None:
+    with self._condition:
+      if failed:
+        self.failed += 1
+      else:
+        self.applied += 1
+
+  def stats(self) -> dict:
+    with self._condition:
+      return {'applied': self.applied, 'failed': self.failed, 'rebuilding': self._rebuilding}
+
+
+_gate = _RebuildGate()
+
+
+def stats() -> dict:
+  return _gate.stats()
+
+
+def report_day(moment: datetime | None) -> date:
+  """Calendar day of a UTC timestamp in the report timezone (``REPORT_UTC_OFFSET_HOURS``)."""
+
+  return ((moment or datetime.utcnow()) + timedelta(hours=settings.report_utc_offset_hours)).date()
+
+
+def _levels(db: Session, user_ids: Iterable[int]) -> Dict[int, str]:
+  ids = set(user_ids)
+  if not ids:
+    return {}
+  return {user_id: level or 'free' for user_id, level in db.query(User.id, User.membership_level).filter(User.id.in_(ids))}
+
+
+def _upsert(db: Session, key: RollupKey, deltas: Dict[str, object]) -> None:
+  day, channel, level = key
+  values = {'day': day, 'channel': channel, 'level': level, **{name: deltas.get(name, 0) for name in COUNTERS}}
+  dialect = db.get_bind().dialect.name
+  if dialect == 'mysql':
+    stmt = mysql_insert(SalesRollup).values(**values)
+    db.execute(stmt.on_duplicate_key_update({name: getattr(SalesRollup, name) + stmt.inserted[name] for name in COUNTERS}))
+  elif dialect == 'sqlite':
+    stmt = sqlite_insert(SalesRollup).values(**values)
+    db.execute(stmt.on_conflict_do_update(
+      index_elements=['day', 'channel', 'level'],
+      set_={name: getattr(SalesRollup, name) + stmt.excluded[name] for name in COUNTERS}
+    ))
+  else:
+    row = db.get(SalesRollup, key, with_for_update=True)
+    if row is None:
+      db.add(SalesRollup(**values))
+    else:
+      for name in COUNTERS:
+        setattr(row, name, (getattr(row, name) or 0) + values[name])
+
+
+def _apply(db: Session, deltas: Dict[RollupKey, Dict[str, object]]) -> None:
+  if not deltas:
+    return
+  with _gate.increment():
+    try:
+      # Sorted so concurrent writers touch rollup rows in the same order
+      for key in sorted(deltas):
+        _upsert(db, key, deltas[key])
+      db.commit()
+    except SQLAlchemyError:
+      db.rollback()
+      logger.exception('Dropped sales rollup increments for %d rows', len(deltas))
+      _gate.count(failed=True)
+      return
+  _gate.count(failed=False)
+
+
+def record_orders(db: Session, orders: Iterable[Order], channel: str = CHANNEL_DIRECT) -> None:
+  """Count committed orders; call after the order transaction has committed."""
+
+  orders = list(orders)
+  levels = _levels(db, (order.user_id for order in orders))
+  deltas: Dict[RollupKey, Dict[str, object]] = defaultdict(lambda: {'order_count': 0, 'order_amount': Decimal('0')})
+  for order in orders:
+    entry = deltas[(report_day(order.created_at), channel, levels.get(order.user_id, 'free'))]
+    entry['order_count'] += 1
+    entry['order_amount'] += Decimal(order.total_amount or 0)
+  _apply(db, deltas)
+
+
+def record_payment(db: Session, payment: Payment, order: Order) -> None:
+  """Count a payment that has just been committed as paid."""
+
+  record_payments(db, [(payment, order)])
+
+
+def record_payments(db: Session, paid: Iterable[Tuple[Payment, Order]]) -> None:
+  """Count a batch of payments committed as paid, with one upsert per rollup row."""
+
+  paid = list(paid)
+  levels = _levels(db, (order.user_id for _, order in paid))
+  deltas: Dict[RollupKey, Dict[str, object]] = defaultdict(lambda: {'paid_count': 0, 'paid_amount': Decimal('0')})
+  for payment, order in paid:
+    entry = deltas[(report_day(payment.paid_at), payment.provider or CHANNEL_DIRECT, levels.get(order.user_id, 'free'))]
+    entry['paid_count'] += 1
+    entry['paid_amount'] += Decimal(order.total_amount or 0)
+  _apply(db, deltas)
+
+
+def rebuild(db: Session, batch_size: int = 1000) -> int:
+  """Recompute every rollup row from ``orders`` and ``payments``; returns the number of rows written.
+
+  Increments in this process wait until it returns; see the module docstring for other workers.
+  """
+
+  with _gate.rebuild():
+    # Start a fresh snapshot now that in-flight increments have committed
+    db.rollback()
+    levels = {user_id: level or 'free' for user_id, level in db.query(User.id, User.membership_level)}
+    channels: Dict[int, str] = {}
+    totals: Dict[RollupKey, Dict[str, object]] = defaultdict(
+      lambda: {'order_count': 0, 'order_amount': Decimal('0'), 'paid_count': 0, 'paid_amount': Decimal('0')}
+    )
+    payments = (
+      db.query(Payment.order_id, Payment.provider, Payment.status, Payment.paid_at, Order.user_id, Order.total_amount)
+      .join(Order, Order.id == Payment.order_id)
+      .order_by(Payment.id.asc())
+      .yield_per(batch_size)
+    )
+    for order_id, provider, status, paid_at, user_id, total_amount in payments:
+      channel = provider or CHANNEL_DIRECT
+      channels.setdefault(order_id, channel)
+      if status == 'paid' and paid_at is not None:
+        entry = totals[(report_day(paid_at), channel, levels.get(user_id, 'free'))]
+        entry['paid_count'] += 1
+        entry['paid_amount'] += Decimal(total_amount or 0)
+
+    orders = (
+      db.query(Order.id, Order.user_id, Order.total_amount, Order.created_at)
+      .filter(Order.created_at.isnot(None))
+      .yield_per(batch_size)
+    )
+    for order_id, user_id, total_amount, created_at in orders:
+      entry = totals[(report_day(created_at), channels.get(order_id, CHANNEL_DIRECT), levels.get(user_id, 'free'))]
+      entry['order_count'] += 1
+      entry['order_amount'] += Decimal(total_amount or 0)
+
+    db.execute(delete(SalesRollup))
+    db.bulk_insert_mappings(SalesRollup, [
+      {'day': day, 'channel': channel, 'level': level, **values} for (day, channel, level), values in totals.items()
+    ])
+    db.commit()
+    return len(totals)
+
+
+def daily(db: Session, days: int) -> List[dict]:
+  """Per-day totals for the last ``days`` report days, oldest first, with channel and level breakdowns."""
+
+  start = report_day(None) - timedelta(days=days - 1)
+  result: Dict[date, dict] = {}
+  for row in db.query(SalesRollup).filter(SalesRollup.day >= start).order_by(SalesRollup.day.asc()):
+    entry = result.setdefault(row.day, {
+      'day': row.day, 'order_count': 0, 'order_amount': Decimal('0'), 'paid_count': 0, 'paid_amount': Decimal('0'),
+      'channels': defaultdict(Decimal), 'levels': defaultdict(Decimal)
+    })
+    entry['order_count'] += row.order_count or 0
+    entry['order_amount'] += Decimal(row.order_amount or 0)
+    entry['paid_count'] += row.paid_count or 0
+    entry['paid_amount'] += Decimal(row.paid_amount or 0)
+    entry['channels'][row.channel] += Decimal(row.paid_amount or 0)
+    entry['levels'][row.level] += Decimal(row.paid_amount or 0)
+  return list(result.values())
+
+
+def _money(amount: Decimal) -> str:
+  return f'¥{amount:,.2f}'
+
+
+def dashboard_stats(db: Session) -> List[dict]:
+  """Sales cards for ``/admin/dashboard``, read from at most 30 days of rollups."""
+
+  days = daily(db, 30)
+  today = report_day(None)
+  current = next((entry for entry in days if entry['day'] == today), None)
+  paid_30 = sum((entry['paid_amount'] for entry in days), Decimal('0'))
+  channels: Dict[str, Decimal] = defaultdict(Decimal)
+  for entry in days:
+    for channel, amount in entry['channels'].items():
+      channels[channel] += amount
+  channel_note = '，'.join(f'{channel} {_money(amount)}' for channel, amount in sorted(channels.items()) if amount) or '暂无支付'
+  return [
+    {
+      'label': '今日支付额',
+      'value': _money(current['paid_amount'] if current else Decimal('0')),
+      'note': f"今日已支付 {current['paid_count'] if current else 0} 笔"
+    },
+    {
+      'label': '今日订单',
+      'value': str(current['order_count'] if current else 0),
+      'note': f"下单金额 {_money(current['order_amount'] if current else Decimal('0'))}"
+    },
+    {
+      'label': '近30天支付额',
+      'value': _money(paid_30),
+      'note': channel_note
+    },
+  ]
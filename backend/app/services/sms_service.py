@@ -0,0 +1,350 @@
+"""Verification-code SMS delivery, off the request path.
+
+``/auth/send-code`` stores the code and hands the text to :data:`sms`, whose
+consumer thread batches queued messages (``SMS_BATCH_SIZE``,
+``SMS_BATCH_WAIT_MS``) and sends each batch to the providers named in the
+``sms`` integration's ``provider`` field, a comma-separated list in failover
+order:
+
+* ``fake`` delivers into an in-process outbox (:attr:`FakeProvider.outbox`),
+  for local development and tests;
+* an ``http(s)://`` base URL is an SMS gateway taking a JSON batch on
+  ``POST /send`` with the integration ``apiKey`` as bearer token and
+  ``signName`` as signature. All gateways share one pooled keep-alive
+  ``httpx.Client``; ``python -m uvicorn app.stubs.sms:app`` serves a local
+  stand-in.
+
+Unsupported names are skipped with a warning; when that leaves no real
+gateway, :meth:`SmsDispatcher.submit` refuses with 503 unless the list is
+exactly ``fake``.
+
+A provider that fails a whole batch (transport error, non-2xx) is passed over
+for ``SMS_PROVIDER_COOLDOWN_SECONDS`` and the batch moves on to the next one.
+Messages no provider accepted are retried with jittered exponential backoff
+from ``SMS_RETRY_BACKOFF_MS`` until ``SMS_MAX_ATTEMPTS`` is reached, then
+dropped and logged.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.services import system_config_service
+
+logger = logging.getLogger(__name__)
+
+FAKE = 'fake'
+OUTBOX_SIZE = 1000
+
+
+class SmsMessage(NamedTuple):
+  phone: str
+  text: str
+  attempt: int = 0
+
+
+class ProviderError(Exception):
+  """The provider could not take the batch at all."""
+
+
+class FakeProvider:
+  name = FAKE
+  real = False
+
+  def __init__(self):
+    self.outbox: Deque[SmsMessage] = deque(maxlen=OUTBOX_SIZE)
+
+  def send(self, client: httpx.Client, sign_name: str, messages: List[SmsMessage]) -> List[SmsMessage]:
+    self.outbox.extend(messages)
+    return []
+
+
+class HttpProvider:
+  real = True
+
+  def __init__(self, base_url: str, api_key: str):
+    self.name = base_url
+    self.base_url = base_url.rstrip('/')
+    self.api_key = api_key
+
+  def send(self, client: httpx.Client, sign_name: str, messages: List[SmsMessage]) -> List[SmsMessage]:
+    """POST the batch; returns the messages the gateway rejected one by one."""
+
+    try:
+      response = client.post(
+        f'{self.base_url}/send',
+        json={'sign_name': sign_name, 'messages': [{'phone': m.phone, 'text': m.text} for m in messages]},
+        headers={'Authorization': f'Bearer {self.api_key}'}
+      )
+      response.raise_for_status()
+      results = response.json().get('results') or []
+    except (httpx.HTTPError, ValueError, AttributeError) as exc:
+      raise ProviderError(repr(exc)) from exc
+    rejected = {result.get('phone') for result in results if isinstance(result, dict) and not result.get('ok')}
+    return [message for message in messages if message.phone in rejected]
+
+
+Provider = FakeProvider | HttpProvider
+
+
+class SmsDispatcher:
+  def __init__(
+      self,
+      *,
+      batch_size: int,
+      batch_wait_seconds: float,
+      queue_size: int,
+      max_attempts: int,
+      retry_backoff: float,
+      cooldown_seconds: float,
+      timeout: float,
+      max_connections: int,
+      providers: Callable[[], Tuple[List[Provider], str]] | None = None
+  ):
+    self.batch_size = max(1, batch_size)
+    self.batch_wait_seconds = batch_wait_seconds
+    self.max_attempts = max(1, max_attempts)
+    self.retry_backoff = retry_backoff
+    self.cooldown_seconds = cooldown_seconds
+    self._static_providers = providers
+    self._queue: queue.Queue[SmsMessage] = queue.Queue(maxsize=queue_size)
+    self._retries: List[Tuple[float, int, SmsMessage]] = []
+    self._sequence = itertools.count()
+    self.timeout = timeout
+    self.max_connections = max_connections
+    self._client: httpx.Client | None = None
+    self.fake = FakeProvider()
+    self._http_providers: Dict[Tuple[str, str], HttpProvider] = {}
+    self._cooling: Dict[str, float] = {}
+    self._lock = threading.Lock()
+    self._worker: threading.Thread | None = None
+    self._stopping = threading.Event()
+    self.batches = 0
+    self.sent = 0
+    self.retried = 0
+    self.dropped = 0
+    self.failovers = 0
+    self.by_provider: Counter = Counter()
+
+  def _http(self) -> httpx.Client:
+    if self._client is None:
+      self._client = httpx.Client(
+        timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 2.0)),
+        limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+      )
+    return self._client
+
+  def _provider(self, entry: str, api_key: str) -> Provider | None:
+    if entry == FAKE:
+      return self.fake
+    if entry.startswith(('http://', 'https://')):
+      key = (entry, api_key)
+      if key not in self._http_providers:
+        self._http_providers[key] = HttpProvider(entry, api_key)
+      return self._http_providers[key]
+    return None
+
+  def _entries(self, db: Session) -> Tuple[List[str], Dict]:
+    """Provider names listed by the active ``sms`` integration, with its config; none while it is inactive."""
+
+    record = system_config_service.integration(db, 'sms')
+    if not record or not record.is_active:
+      return [], {}
+    config = record.config
+    return [entry.strip() for entry in str(config.get('provider') or '').split(',') if entry.strip()], config
+
+  def _providers_from(self, db: Session) -> Tuple[List[Provider], str]:
+    entries, config = self._entries(db)
+    providers = []
+    for entry in entries:
+      provider = self._provider(entry, str(config.get('apiKey') or ''))
+      if provider is None:
+        logger.warning('Unsupported SMS provider %r is skipped', entry)
+        continue
+      providers.append(provider)
+    return providers, str(config.get('signName') or '')
+
+  def _configured_providers(self) -> Tuple[List[Provider], str]:
+    db = SessionLocal()
+    try:
+      return self._providers_from(db)
+    finally:
+      db.close()
+
+  def submit(self, db: Session, phone: str, text: str) -> bool:
+    """Queue ``text`` for ``phone``; returns False only when the caller may be shown the text instead.
+
+    That is the case when no ``sms`` integration is active (or it lists no
+    provider) and when it lists nothing but ``fake``. An integration whose
+    providers include no real gateway this dispatcher supports (e.g. an
+    ``aliyun`` saved by older versions) answers 503 rather than falling back
+    to showing the text, which would hand out login codes.
+    """
+
+    if self._static_providers:
+      providers, _ = self._static_providers()
+      entries = [provider.name for provider in providers]
+    else:
+      providers, _ = self._providers_from(db)
+      entries, _ = self._entries(db)
+    if not entries:
+      return False
+    if not any(provider.real for provider in providers):
+      if all(entry == FAKE for entry in entries):
+        self.enqueue(SmsMessage(phone, text))
+        return False
+      logger.error('No supported SMS gateway among %r; refusing to send', entries)
+      raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='短信服务配置无效，请联系管理员')
+    self.enqueue(SmsMessage(phone, text))
+    return True
+
+  def enqueue(self, message: SmsMessage) -> None:
+    self.start()
+    try:
+      self._queue.put_nowait(message)
+    except queue.Full:
+      raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail='短信发送繁忙，请稍后再试',
+        headers={'Retry-After': '1'}
+      )
+
+  def start(self) -> None:
+    if self._worker is not None and self._worker.is_alive():
+      return
+    with self._lock:
+      if self._worker is None or not self._worker.is_alive():
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name='sms-dispatch', daemon=True)
+        self._worker.start()
+
+  def _due_retries(self, limit: int) -> List[SmsMessage]:
+    due = []
+    now = time.monotonic()
+    with self._lock:
+      while self._retries and self._retries[0][0] <= now and len(due) < limit:
+        due.append(heapq.heappop(self._retries)[2])
+    return due
+
+  def _next_batch(self) -> List[SmsMessage]:
+    batch = self._due_retries(self.batch_size)
+    if not batch:
+      with self._lock:
+        next_retry = self._retries[0][0] - time.monotonic() if self._retries else 0.5
+      try:
+        batch = [self._queue.get(timeout=min(max(next_retry, 0.01), 0.5))]
+      except queue.Empty:
+        return []
+    deadline = time.monotonic() + self.batch_wait_seconds
+    while len(batch) < self.batch_size:
+      remaining = deadline - time.monotonic()
+      try:
+        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    return batch
+
+  def _run(self) -> None:
+    while not (self._stopping.is_set() and self._queue.empty()):
+      batch = self._next_batch()
+      if not batch:
+        continue
+      try:
+        self.dispatch(batch)
+      except Exception:  # noqa: BLE001
+        logger.exception('SMS dispatch of %d messages failed', len(batch))
+        for message in batch:
+          self._retry(message)
+
+  def _ordered(self, providers: List[Provider]) -> List[Provider]:
+    now = time.monotonic()
+    # Providers cooling down after a failure go last rather than being skipped, so a batch always has somewhere to go
+    return sorted(providers, key=lambda provider: self._cooling.get(provider.name, 0) > now)
+
+  def dispatch(self, batch: List[SmsMessage]) -> None:
+    providers, sign_name = self._static_providers() if self._static_providers else self._configured_providers()
+    pending = batch
+    for index, provider in enumerate(self._ordered(providers)):
+      if index:
+        self.failovers += 1
+      try:
+        rejected = provider.send(self._http(), sign_name, pending)
+      except ProviderError as exc:
+        logger.warning('SMS provider %s failed a batch of %d: %s', provider.name, len(pending), exc)
+        self._cooling[provider.name] = time.monotonic() + self.cooldown_seconds
+        continue
+      self._cooling.pop(provider.name, None)
+      delivered = len(pending) - len(rejected)
+      self.sent += delivered
+      self.by_provider[provider.name] += delivered
+      pending = rejected
+      if not pending:
+        break
+    self.batches += 1
+    for message in pending:
+      self._retry(message)
+
+  def _retry(self, message: SmsMessage) -> None:
+    attempt = message.attempt + 1
+    if attempt >= self.max_attempts:
+      self.dropped += 1
+      logger.error('Dropping SMS to %s after %d attempts', message.phone, attempt)
+      return
+    delay = self.retry_backoff * 2 ** message.attempt * random.uniform(0.5, 1.5)
+    with self._lock:
+      heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), message._replace(attempt=attempt)))
+    self.retried += 1
+
+  def shutdown(self, timeout: float = 10.0) -> None:
+    """Stop the consumer after it has sent what is already queued; pending retries are abandoned."""
+
+    self._stopping.set()
+    if self._worker is not None:
+      self._worker.join(timeout)
+    if self._client is not None:
+      self._client.close()
+      self._client = None
+
+  def stats(self) -> dict:
+    return {
+      'queued': self._queue.qsize(),
+      'retrying': len(self._retries),
+      'batches': self.batches,
+      'sent': self.sent,
+      'retried': self.retried,
+      'dropped': self.dropped,
+      'failovers': self.failovers,
+      'by_provider': dict(self.by_provider)
+    }
+
+
+def _from_settings(**overrides) -> SmsDispatcher:
+  options = dict(
+    batch_size=settings.sms_batch_size,
+    batch_wait_seconds=settings.sms_batch_wait_ms / 1000,
+    queue_size=settings.sms_queue_size,
+    max_attempts=settings.sms_max_attempts,
+    retry_backoff=settings.sms_retry_backoff_ms / 1000,
+    cooldown_seconds=settings.sms_provider_cooldown_seconds,
+    timeout=settings.sms_timeout_seconds,
+    max_connections=settings.sms_max_connections
+  )
+  options.update(overrides)
+  return SmsDispatcher(**options)
+
+
+sms = _from_settings()
@@ -1,7 +1,20 @@
+"""Admin system configuration, backed by ``system_settings`` and ``integration_configs``.
+
+Reads go through an immutable :class:`ConfigSnapshot` of both tables, loaded
+with one query per table and shared by every request in the process. Each
+load gets the next version number; :func:`save_config` commits, then builds a
+new snapshot and swaps it in with a single assignment, so readers see either
+the old configuration or the new one, never a mix. Peer workers pick up a
+save when their snapshot is older than ``CONFIG_SNAPSHOT_TTL_SECONDS``.
+"""
+
 from __future__ import annotations
 
 import json
-from typing import Dict, Tuple
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Tuple
 
 from fastapi import HTTPException, status
 from sqlalchemy.exc import SQLAlchemyError
@@ -12,6 +25,7 @@ from app.models.integration import IntegrationConfig
 from app.config import settings
 from app.utils.seed_data import PERMISSION_COMMAND, persist_seed_config, SEED_DATA_DIR
 from app.core.config_store import CONFIG_PATH, load_config, merge_config_updates
+from app.core.upsert import bulk_upsert
 from app.core.install_state import INSTALL_PERMISSION_COMMAND, INSTALL_STATE_PATH, ensure_install_state_dir
 
 DEFAULT_CONFIG = {
@@ -28,6 +42,7 @@ DEFAULT_CONFIG = {
   'wechat_app_id': '',
   'wechat_mch_id': '',
   'wechat_api_key': '',
+  'wechat_app_secret': '',
   'sms_provider': '',
   'sms_api_key': '',
   'sms_sign_name': ''
@@ -50,7 +65,8 @@ _INTEGRATION_DEFAULTS: Dict[str, Dict[str, str]] = {
   'wechat_pay': {
     'appId': '',
     'mchId': '',
-    'apiKey': ''
+    'apiKey': '',
+    'appSecret': ''
   },
   'sms': {
     'provider': '',
@@ -60,47 +76,103 @@ _INTEGRATION_DEFAULTS: Dict[str, Dict[str, str]] = {
 }
 
 
-def _get_setting(db: Session, category: str, key: str) -> str | None:
-  record = db.query(SystemSetting).filter(
-    SystemSetting.category == category,
-    SystemSetting.key == key
-  ).first()
-  return record.value if record and record.value is not None else None
+class IntegrationSnapshot(NamedTuple):
+  is_active: bool
+  config: Mapping[str, str]
 
 
-def _upsert_setting(db: Session, category: str, key: str, value: str) -> None:
-  record = db.query(SystemSetting).filter(
-    SystemSetting.category == category,
-    SystemSetting.key == key
-  ).first()
-  if record:
-    record.value = value
-    db.add(record)
-    return
-  db.add(SystemSetting(category=category, key=key, value=value))
+class ConfigSnapshot(NamedTuple):
+  version: int
+  loaded_at: float
+  settings: Mapping[Tuple[str, str], str]
+  integrations: Mapping[str, IntegrationSnapshot]
 
+  def setting(self, category: str, key: str) -> str | None:
+    return self.settings.get((category, key))
 
-def _get_integration_config(db: Session, provider: str) -> Dict[str, str]:
-  record = db.query(IntegrationConfig).filter(IntegrationConfig.provider == provider).first()
-  if record and isinstance(record.config, dict):
-    return {**_INTEGRATION_DEFAULTS.get(provider, {}), **record.config}
-  return _INTEGRATION_DEFAULTS.get(provider, {})
+  def integration(self, provider: str) -> IntegrationSnapshot | None:
+    return self.integrations.get(provider)
 
 
-def _upsert_integration_config(db: Session, provider: str, *, label: str, config: Dict[str, str], is_active: bool) -> None:
-  record = db.query(IntegrationConfig).filter(IntegrationConfig.provider == provider).first()
-  payload = {
-    'provider': provider,
-    'label': label,
-    'config': config,
-    'is_active': is_active
-  }
-  if record:
-    for key, value in payload.items():
-      setattr(record, key, value)
-    db.add(record)
-    return
-  db.add(IntegrationConfig(**payload))
+_snapshot: ConfigSnapshot | None = None
+_snapshot_version = 0
+# Serialises loads, so an expired snapshot is reloaded by one request while the others wait for it
+_load_lock = threading.Lock()
+
+
+def _is_fresh(current: ConfigSnapshot | None) -> bool:
+  return current is not None and time.monotonic() - current.loaded_at < settings.config_snapshot_ttl_seconds
+
+
+def _load_snapshot(db: Session) -> ConfigSnapshot:
+  global _snapshot, _snapshot_version
+  _snapshot_version += 1
+  version = _snapshot_version
+  setting_rows = db.query(SystemSetting.category, SystemSetting.key, SystemSetting.value).all()
+  integration_rows = (
+    db.query(IntegrationConfig.provider, IntegrationConfig.is_active, IntegrationConfig.config)
+    .order_by(IntegrationConfig.id.asc())
+    .all()
+  )
+  integrations: Dict[str, IntegrationSnapshot] = {}
+  for provider, is_active, config in integration_rows:
+    # Providers are unique; upgrade_schema kept the lowest id where older databases held duplicates
+    integrations.setdefault(provider, IntegrationSnapshot(
+      bool(is_active),
+      MappingProxyType(dict(config) if isinstance(config, dict) else {})
+    ))
+  _snapshot = ConfigSnapshot(
+    version,
+    time.monotonic(),
+    MappingProxyType({(category, key): value for category, key, value in setting_rows if value is not None}),
+    MappingProxyType(integrations)
+  )
+  return _snapshot
+
+
+def snapshot(db: Session) -> ConfigSnapshot:
+  """The current configuration snapshot; only a missing or expired one touches the database."""
+
+  current = _snapshot
+  if _is_fresh(current):
+    return current
+  with _load_lock:
+    current = _snapshot
+    if _is_fresh(current):
+      return current
+    return _load_snapshot(db)
+
+
+def refresh_snapshot(db: Session) -> ConfigSnapshot:
+  """Load and install a new snapshot; call after committing a configuration change."""
+
+  with _load_lock:
+    return _load_snapshot(db)
+
+
+def invalidate_snapshot() -> None:
+  """Drop the snapshot so the next read reloads it, e.g. after the seeder rewrote the tables."""
+
+  global _snapshot
+  _snapshot = None
+
+
+def snapshot_stats() -> dict:
+  current = _snapshot
+  if current is None:
+    return {'version': None, 'age_seconds': None}
+  return {'version': current.version, 'age_seconds': round(time.monotonic() - current.loaded_at, 1)}
+
+
+def integration(db: Session, provider: str) -> IntegrationSnapshot | None:
+  return snapshot(db).integration(provider)
+
+
+def _integration_config(current: ConfigSnapshot, provider: str) -> Dict[str, str]:
+  record = current.integration(provider)
+  if record is not None:
+    return {**_INTEGRATION_DEFAULTS.get(provider, {}), **record.config}
+  return _INTEGRATION_DEFAULTS.get(provider, {})
 
 
 def _build_defaults_from_server_config() -> Dict[str, str | int]:
@@ -128,62 +200,69 @@ def _build_defaults_from_server_config() -> Dict[str, str | int]:
 def get_config(db: Session) -> Dict[str, str | int]:
   data: Dict[str, str | int] = _build_defaults_from_server_config()
   try:
-    for field, (category, key) in _SETTING_KEYS.items():
-      stored = _get_setting(db, category, key)
-      if stored is None:
-        continue
-      if field == 'db_port':
-        try:
-          data[field] = int(stored)
-        except (TypeError, ValueError):
-          continue
-      else:
-        data[field] = stored
-    wechat_config = _get_integration_config(db, 'wechat_pay')
-    sms_config = _get_integration_config(db, 'sms')
-
-    data['wechat_app_id'] = wechat_config.get('appId', '')
-    data['wechat_mch_id'] = wechat_config.get('mchId', '')
-    data['wechat_api_key'] = wechat_config.get('apiKey', '')
-
-    data['sms_provider'] = sms_config.get('provider', '')
-    data['sms_api_key'] = sms_config.get('apiKey', '')
-    data['sms_sign_name'] = sms_config.get('signName', '')
+    current = snapshot(db)
   except SQLAlchemyError:
     return data
-  return data
+  return _config_from_snapshot(current, data)
 
 
-def save_config(db: Session, payload: Dict[str, str | int]) -> Dict[str, str | int]:
+def _config_from_snapshot(current: ConfigSnapshot, data: Dict[str, str | int]) -> Dict[str, str | int]:
   for field, (category, key) in _SETTING_KEYS.items():
-    value = payload.get(field)
-    if value is None:
+    stored = current.setting(category, key)
+    if stored is None:
       continue
-    _upsert_setting(db, category, key, str(value))
-
-  _upsert_integration_config(
-    db,
-    'wechat_pay',
-    label='微信支付',
-    config={
-      'appId': str(payload.get('wechat_app_id', '') or ''),
-      'mchId': str(payload.get('wechat_mch_id', '') or ''),
-      'apiKey': str(payload.get('wechat_api_key', '') or '')
-    },
-    is_active=bool(payload.get('wechat_app_id') and payload.get('wechat_mch_id'))
-  )
+    if field == 'db_port':
+      try:
+        data[field] = int(stored)
+      except (TypeError, ValueError):
+        continue
+    else:
+      data[field] = stored
+  wechat_config = _integration_config(current, 'wechat_pay')
+  sms_config = _integration_config(current, 'sms')
+
+  data['wechat_app_id'] = wechat_config.get('appId', '')
+  data['wechat_mch_id'] = wechat_config.get('mchId', '')
+  data['wechat_api_key'] = wechat_config.get('apiKey', '')
+  data['wechat_app_secret'] = wechat_config.get('appSecret', '')
+
+  data['sms_provider'] = sms_config.get('provider', '')
+  data['sms_api_key'] = sms_config.get('apiKey', '')
+  data['sms_sign_name'] = sms_config.get('signName', '')
+  return data
+
 
-  _upsert_integration_config(
-    db,
-    'sms',
-    label='短信服务',
-    config={
-      'provider': str(payload.get('sms_provider', '') or ''),
-      'apiKey': str(payload.get('sms_api_key', '') or ''),
-      'signName': str(payload.get('sms_sign_name', '') or '')
+def save_config(db: Session, payload: Dict[str, str | int]) -> Dict[str, str | int]:
+  # One statement for the settings and one for both integrations
+  bulk_upsert(db, SystemSetting, [
+    {'category': category, 'key': key, 'value': str(payload[field])}
+    for field, (category, key) in _SETTING_KEYS.items()
+    if payload.get(field) is not None
+  ], keys=('category', 'key'), update=('value',))
+
+  bulk_upsert(db, IntegrationConfig, [
+    {
+      'provider': 'wechat_pay',
+      'label': '微信支付',
+      'config': {
+        'appId': str(payload.get('wechat_app_id', '') or ''),
+        'mchId': str(payload.get('wechat_mch_id', '') or ''),
+        'apiKey': str(payload.get('wechat_api_key', '') or ''),
+        'appSecret': str(payload.get('wechat_app_secret', '') or '')
+      },
+      'is_active': bool(payload.get('wechat_app_id') and payload.get('wechat_mch_id'))
     },
-    is_active=bool(payload.get('sms_provider'))
-  )
+    {
+      'provider': 'sms',
+      'label': '短信服务',
+      'config': {
+        'provider': str(payload.get('sms_provider', '') or ''),
+        'apiKey': str(payload.get('sms_api_key', '') or ''),
+        'signName': str(payload.get('sms_sign_name', '') or '')
+      },
+      'is_active': bool(payload.get('sms_provider'))
+    }
+  ], keys=('provider',), update=('label', 'config', 'is_active'))
   try:
     persist_seed_config(payload, backend_port=settings.site_port)
   except PermissionError as exc:  # noqa: PERF203
@@ -231,4 +310,4 @@ def save_config(db: Session, payload: Dict[str, str | int]) -> Dict[str, str | i
     }) from exc
 
   db.commit()
-  return get_config(db)
+  return _config_from_snapshot(refresh_snapshot(db), _build_defaults_from_server_config())
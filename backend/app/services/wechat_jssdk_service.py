@@ -0,0 +1,208 @@
+"""WeChat JS-SDK ``wx.config`` parameters for ``GET /payments/wechat/config``.
+
+A real JS-SDK signature is ``sha1`` over the page URL and a jsapi ticket, the
+ticket is fetched with an access token, and WeChat rate-limits both calls per
+app (the token endpoint to 2000 calls a day). Both credentials are therefore
+cached per ``(appId, appSecret)`` by :class:`Credential`:
+
+* a credential is refreshed ahead of its expiry (``WECHAT_TOKEN_REFRESH_MARGIN_SECONDS``);
+  inside that margin one caller refreshes while the others keep using the
+  still-valid value;
+* an expired or missing credential is fetched once however many requests ask
+  for it at the same time (single-flight under a lock);
+* ``errcode`` 40001/40014/42001 from the ticket endpoint (token invalid or expired
+  early) drops the token and retries once.
+
+Signatures are memoised per ``(appId, url, ticket, time window)``, so every
+page view inside ``WECHAT_SIGNATURE_WINDOW_SECONDS`` reuses one
+``wx.config`` payload. Upstream calls share one pooled ``httpx.Client`` aimed
+at ``WECHAT_API_BASE``; ``python -m uvicorn app.stubs.wechat:app`` serves a
+local stand-in for it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Access token expired, invalid or replaced by a newer one
+TOKEN_ERRCODES = {40001, 40014, 42001}
+
+
+class UpstreamValue(NamedTuple):
+  value: str
+  refresh_at: float
+  expires_at: float
+
+
+class Credential:
+  """One cached upstream credential with proactive, single-flight refresh."""
+
+  def __init__(self, fetch: Callable[[], Tuple[str, float]], refresh_margin: float):
+    self._fetch = fetch
+    self.refresh_margin = refresh_margin
+    self._current: UpstreamValue | None = None
+    self._lock = threading.Lock()
+    self.refreshes = 0
+
+  def _fresh(self, current: UpstreamValue | None, now: float) -> bool:
+    return current is not None and now < current.refresh_at
+
+  def _refresh(self) -> UpstreamValue:
+    value, expires_in = self._fetch()
+    now = time.monotonic()
+    lifetime = max(float(expires_in), 1.0)
+    # Short-lived values still get half their lifetime before an early refresh starts
+    self._current = UpstreamValue(value, now + max(lifetime - self.refresh_margin, lifetime / 2), now + lifetime)
+    self.refreshes += 1
+    return self._current
+
+  def get(self) -> str:
+    now = time.monotonic()
+    current = self._current
+    if self._fresh(current, now):
+      return current.value
+    if current is not None and now < current.expires_at:
+      # Still valid: whoever gets the lock refreshes early, everyone else keeps the current value
+      if self._lock.acquire(blocking=False):
+        try:
+          if not self._fresh(self._current, time.monotonic()):
+            self._refresh()
+        except HTTPException:
+          logger.warning('Early WeChat credential refresh failed; keeping the current value')
+        finally:
+          self._lock.release()
+      return (self._current or current).value
+    with self._lock:
+      current = self._current
+      if current is not None and time.monotonic() < current.expires_at:
+        return current.value
+      return self._refresh().value
+
+  def invalidate(self, value: str) -> None:
+    """Forget ``value`` unless a concurrent refresh already replaced it."""
+
+    with self._lock:
+      if self._current is not None and self._current.value == value:
+        self._current = None
+
+
+class JsSdk:
+  def __init__(self, *, base_url: str, refresh_margin: float, signature_window: float, signature_cache_size: int):
+    self.refresh_margin = refresh_margin
+    self.signature_window = max(1.0, signature_window)
+    self._client = httpx.Client(
+      base_url=base_url,
+      timeout=httpx.Timeout(5.0, connect=2.0),
+      limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+    )
+    self._tokens: Dict[Tuple[str, str], Credential] = {}
+    self._tickets: Dict[Tuple[str, str], Credential] = {}
+    self._lock = threading.Lock()
+    self._signatures = TTLCache(signature_cache_size, self.signature_window)
+
+  def _call(self, path: str, params: dict, field: str) -> Tuple[str, float, int]:
+    try:
+      response = self._client.get(path, params=params)
+      response.raise_for_status()
+      data = response.json()
+    except (httpx.HTTPError, ValueError) as exc:
+      raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='微信接口请求失败，请稍后重试') from exc
+    errcode = int(data.get('errcode') or 0)
+    if errcode or not data.get(field):
+      return '', 0.0, errcode or -1
+    return str(data[field]), float(data.get('expires_in') or 7200), 0
+
+  def _credentials(self, app_id: str, app_secret: str) -> Tuple[Credential, Credential]:
+    key = (app_id, app_secret)
+    token = self._tokens.get(key)
+    ticket = self._tickets.get(key)
+    if token is not None and ticket is not None:
+      return token, ticket
+    with self._lock:
+      if key not in self._tokens:
+        token = Credential(lambda: self._fetch_token(app_id, app_secret), self.refresh_margin)
+        self._tokens[key] = token
+        self._tickets[key] = Credential(lambda: self._fetch_ticket(token), self.refresh_margin)
+      return self._tokens[key], self._tickets[key]
+
+  def _fetch_token(self, app_id: str, app_secret: str) -> Tuple[str, float]:
+    value, expires_in, errcode = self._call(
+      '/cgi-bin/token',
+      {'grant_type': 'client_credential', 'appid': app_id, 'secret': app_secret},
+      'access_token'
+    )
+    if errcode:
+      logger.warning('WeChat access_token request failed with errcode %s', errcode)
+      raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='获取微信 access_token 失败')
+    return value, expires_in
+
+  def _fetch_ticket(self, token: Credential) -> Tuple[str, float]:
+    for _ in range(2):
+      access_token = token.get()
+      value, expires_in, errcode = self._call(
+        '/cgi-bin/ticket/getticket',
+        {'access_token': access_token, 'type': 'jsapi'},
+        'ticket'
+      )
+      if not errcode:
+        return value, expires_in
+      if errcode not in TOKEN_ERRCODES:
+        break
+      token.invalidate(access_token)
+    logger.warning('WeChat jsapi_ticket request failed with errcode %s', errcode)
+    raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='获取微信 jsapi_ticket 失败')
+
+  def config(self, *, app_id: str, app_secret: str, url: str) -> dict:
+    """``wx.config`` parameters for ``url``, reused by every caller within the same signature window."""
+
+    _, ticket_cache = self._credentials(app_id, app_secret)
+    ticket = ticket_cache.get()
+    # The signature covers the URL without its fragment
+    url = url.split('#', 1)[0]
+    window = int(time.time() // self.signature_window)
+    key = (app_id, url, ticket, window)
+    cached = self._signatures.get(key)
+    if cached is not None:
+      return cached
+    timestamp = str(int(window * self.signature_window))
+    nonce_str = secrets.token_hex(8)
+    payload = f'jsapi_ticket={ticket}&noncestr={nonce_str}&timestamp={timestamp}&url={url}'
+    result = {
+      'appId': app_id,
+      'timestamp': timestamp,
+      'nonceStr': nonce_str,
+      'signature': hashlib.sha1(payload.encode()).hexdigest()
+    }
+    self._signatures.set(key, result)
+    return result
+
+  def stats(self) -> dict:
+    return {
+      'token_refreshes': sum(credential.refreshes for credential in self._tokens.values()),
+      'ticket_refreshes': sum(credential.refreshes for credential in self._tickets.values()),
+      'signatures': self._signatures.stats()
+    }
+
+  def close(self) -> None:
+    self._client.close()
+
+
+jssdk = JsSdk(
+  base_url=settings.wechat_api_base,
+  refresh_margin=settings.wechat_token_refresh_margin_seconds,
+  signature_window=settings.wechat_signature_window_seconds,
+  signature_cache_size=settings.wechat_signature_cache_size
+)
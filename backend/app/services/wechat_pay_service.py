@@ -0,0 +1,279 @@
+"""Async WeChat Pay (API v2) client: unified order, order query and close.
+
+Every call goes through one ``httpx.AsyncClient`` per worker, created on the
+event loop the first time it is needed and closed on shutdown, so requests
+reuse pooled keep-alive connections to ``WECHAT_PAY_API_BASE`` instead of
+paying a TCP and TLS handshake each time (``WECHAT_PAY_MAX_CONNECTIONS``,
+``WECHAT_PAY_MAX_KEEPALIVE``, ``WECHAT_PAY_TIMEOUT_SECONDS``).
+
+Requests are signed with the merchant key (HMAC-SHA256) and responses carrying
+a ``sign`` are verified with it. Connection errors, timeouts, 429/5xx answers
+and the ``SYSTEMERROR`` family of result codes are retried up to
+``WECHAT_PAY_MAX_RETRIES`` times with full-jitter exponential backoff from
+``WECHAT_PAY_RETRY_BACKOFF_MS``. Retrying is safe because WeChat keys all
+three calls on ``out_trade_no``.
+
+Sync code reaches the client through :meth:`WechatPay.run`, which schedules
+the call on the server's event loop (recorded at start-up by
+:meth:`WechatPay.bind_loop`), so route handlers on anyio worker threads and
+background threads such as the order-expiry sweeper share one pool.
+``python -m uvicorn app.stubs.wechat:app`` serves a local stand-in for the pay
+endpoints, and ``python -m benchmarks.wechat_pay`` benchmarks
+prepay creation against it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import random
+import secrets
+import time
+import xml.etree.ElementTree as ElementTree
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable, Mapping, NamedTuple, TypeVar
+
+import anyio.from_thread
+import httpx
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services import system_config_service
+
+logger = logging.getLogger(__name__)
+
+SIGN_TYPE = 'HMAC-SHA256'
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Result codes after which the same request may succeed
+RETRY_ERR_CODES = {'SYSTEMERROR', 'BIZERR_NEED_RETRY', 'FREQUENCY_LIMITED'}
+# Close results after which the prepay can no longer be paid
+CLOSED_ERR_CODES = {'ORDERNOTEXIST', 'ORDERCLOSED'}
+
+T = TypeVar('T')
+
+
+class Merchant(NamedTuple):
+  app_id: str
+  mch_id: str
+  api_key: str
+
+
+def configured_merchant(db: Session) -> Merchant | None:
+  """The active merchant account, or None while payments still use the local placeholder prepay id."""
+
+  record = system_config_service.integration(db, 'wechat_pay')
+  if not record or not record.is_active:
+    return None
+  config = record.config
+  merchant = Merchant(str(config.get('appId') or ''), str(config.get('mchId') or ''), str(config.get('apiKey') or ''))
+  return merchant if all(merchant) else None
+
+
+def sign(fields: Mapping[str, str], api_key: str, sign_type: str | None = None) -> str:
+  """WeChat Pay v2 signature: sorted non-empty ``k=v`` pairs, ``&key=<api key>``, MD5 or HMAC-SHA256, upper-case."""
+
+  payload = '&'.join(f'{key}={fields[key]}' for key in sorted(fields) if key != 'sign' and fields[key] != '')
+  payload += f'&key={api_key}'
+  if (sign_type or fields.get('sign_type') or 'MD5').upper() == 'HMAC-SHA256':
+    return hmac.new(api_key.encode(), payload.encode(), hashlib.sha256).hexdigest().upper()
+  return hashlib.md5(payload.encode()).hexdigest().upper()
+
+
+def to_xml(fields: Mapping[str, str]) -> str:
+  return '<xml>' + ''.join(f'<{key}><![CDATA[{value}]]></{key}>' for key, value in fields.items()) + '</xml>'
+
+
+def from_xml(body: str) -> Dict[str, str]:
+  """Flatten a v2 XML document into a dict of strings; raises ``ValueError`` when it is not one."""
+
+  try:
+    return {child.tag: (child.text or '') for child in ElementTree.fromstring(body)}
+  except ElementTree.ParseError as exc:
+    raise ValueError('Malformed WeChat Pay response') from exc
+
+
+def _bad_gateway(detail: str) -> HTTPException:
+  return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=detail)
+
+
+class WechatPay:
+  def __init__(
+      self,
+      *,
+      base_url: str,
+      timeout: float,
+      max_connections: int,
+      max_keepalive: int,
+      max_retries: int,
+      retry_backoff: float
+  ):
+    self.base_url = base_url
+    self.timeout = timeout
+    self.max_connections = max_connections
+    self.max_keepalive = max_keepalive
+    self.max_retries = max(0, max_retries)
+    self.retry_backoff = retry_backoff
+    self._client: httpx.AsyncClient | None = None
+    self._loop: asyncio.AbstractEventLoop | None = None
+    self.requests = 0
+    self.retries = 0
+    self.failures = 0
+    self._latency_total = 0.0
+
+  def _http(self) -> httpx.AsyncClient:
+    if self._client is None:
+      self._client = httpx.AsyncClient(
+        base_url=self.base_url,
+        timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 2.0)),
+        limits=httpx.Limits(
+          max_connections=self.max_connections,
+          max_keepalive_connections=self.max_keepalive,
+          keepalive_expiry=30.0
+        )
+      )
+    return self._client
+
+  async def _backoff(self, attempt: int) -> None:
+    self.retries += 1
+    await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** (attempt - 1)))
+
+  async def _request(self, path: str, merchant: Merchant, fields: Mapping[str, str]) -> Dict[str, str]:
+    """Signed POST with bounded retries; returns the verified response fields, whatever their ``result_code``."""
+
+    body = {
+      'appid': merchant.app_id,
+      'mch_id': merchant.mch_id,
+      'nonce_str': secrets.token_hex(16),
+      'sign_type': SIGN_TYPE,
+      **fields
+    }
+    body['sign'] = sign(body, merchant.api_key)
+    content = to_xml(body).encode()
+    for attempt in range(self.max_retries + 1):
+      if attempt:
+        await self._backoff(attempt)
+      self.requests += 1
+      started = time.perf_counter()
+      try:
+        response = await self._http().post(path, content=content, headers={'Content-Type': 'application/xml'})
+      except httpx.TransportError as exc:
+        logger.warning('WeChat Pay %s attempt %d failed: %r', path, attempt + 1, exc)
+        continue
+      finally:
+        self._latency_total += time.perf_counter() - started
+      if response.status_code in RETRY_STATUS_CODES:
+        logger.warning('WeChat Pay %s attempt %d answered %d', path, attempt + 1, response.status_code)
+        continue
+      try:
+        response.raise_for_status()
+        data = from_xml(response.text)
+      except (httpx.HTTPError, ValueError) as exc:
+        self.failures += 1
+        raise _bad_gateway('微信支付接口请求失败，请稍后重试') from exc
+      if data.get('return_code') != 'SUCCESS':
+        self.failures += 1
+        logger.warning('WeChat Pay %s rejected the request: %s', path, data.get('return_msg'))
+        raise _bad_gateway('微信支付接口调用失败，请检查商户配置')
+      if data.get('sign') and not hmac.compare_digest(data['sign'], sign(data, merchant.api_key, SIGN_TYPE)):
+        self.failures += 1
+        raise _bad_gateway('微信支付响应签名校验失败')
+      if data.get('err_code') in RETRY_ERR_CODES and attempt < self.max_retries:
+        continue
+      return data
+    self.failures += 1
+    raise _bad_gateway('微信支付接口暂时不可用，请稍后重试')
+
+  async def unified_order(
+      self,
+      merchant: Merchant,
+      *,
+      out_trade_no: str,
+      total_fee: int,
+      body: str,
+      notify_url: str,
+      client_ip: str,
+      openid: str | None = None
+  ) -> Dict[str, str]:
+    """Create (or, for a repeated ``out_trade_no``, fetch) the prepay order: JSAPI with an openid, NATIVE without."""
+
+    fields = {
+      'body': body[:128],
+      'out_trade_no': out_trade_no,
+      'total_fee': str(total_fee),
+      'spbill_create_ip': client_ip,
+      'notify_url': notify_url,
+      'trade_type': 'JSAPI' if openid else 'NATIVE'
+    }
+    if openid:
+      fields['openid'] = openid
+    data = await self._request('/pay/unifiedorder', merchant, fields)
+    if data.get('result_code') != 'SUCCESS' or not data.get('prepay_id'):
+      logger.warning('WeChat Pay unified order %s failed: %s', out_trade_no, data.get('err_code'))
+      raise _bad_gateway(f"微信支付下单失败：{data.get('err_code_des') or data.get('err_code') or '未知错误'}")
+    return data
+
+  async def query_order(self, merchant: Merchant, *, out_trade_no: str) -> Dict[str, str]:
+    """Order state from WeChat; ``trade_state`` is set on success, ``err_code`` (e.g. ``ORDERNOTEXIST``) otherwise."""
+
+    return await self._request('/pay/orderquery', merchant, {'out_trade_no': out_trade_no})
+
+  async def close_order(self, merchant: Merchant, *, out_trade_no: str) -> Dict[str, str]:
+    return await self._request('/pay/closeorder', merchant, {'out_trade_no': out_trade_no})
+
+  async def close_orders(self, merchant: Merchant, out_trade_nos: Iterable[str]) -> Dict[str, bool]:
+    """Close prepays concurrently; maps each ``out_trade_no`` to whether it can no longer be paid."""
+
+    async def close(out_trade_no: str) -> bool:
+      try:
+        data = await self.close_order(merchant, out_trade_no=out_trade_no)
+      except HTTPException:
+        return False
+      return data.get('result_code') == 'SUCCESS' or data.get('err_code') in CLOSED_ERR_CODES
+
+    numbers = list(out_trade_nos)
+    results = await asyncio.gather(*(close(out_trade_no) for out_trade_no in numbers))
+    return dict(zip(numbers, results))
+
+  def bind_loop(self) -> None:
+    """Remember the server's event loop (a startup handler) so any thread can reach the pooled client."""
+
+    self._loop = asyncio.get_running_loop()
+
+  def run(self, method: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+    """Run one of the async calls from a thread other than the event loop's and wait for its result."""
+
+    call = partial(method, *args, **kwargs)
+    if self._loop is not None and self._loop.is_running():
+      return asyncio.run_coroutine_threadsafe(call(), self._loop).result()
+    return anyio.from_thread.run(call)
+
+  def stats(self) -> dict:
+    return {
+      'requests': self.requests,
+      'retries': self.retries,
+      'failures': self.failures,
+      'avg_latency_ms': round(self._latency_total / self.requests * 1000, 2) if self.requests else 0.0
+    }
+
+  async def aclose(self) -> None:
+    self._loop = None
+    if self._client is not None:
+      await self._client.aclose()
+      self._client = None
+
+
+def _from_settings() -> WechatPay:
+  return WechatPay(
+    base_url=settings.wechat_pay_api_base,
+    timeout=settings.wechat_pay_timeout_seconds,
+    max_connections=settings.wechat_pay_max_connections,
+    max_keepalive=settings.wechat_pay_max_keepalive,
+    max_retries=settings.wechat_pay_max_retries,
+    retry_backoff=settings.wechat_pay_retry_backoff_ms / 1000
+  )
+
+
+wechat_pay = _from_settings()
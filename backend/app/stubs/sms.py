@@ -0,0 +1,77 @@
+"""Local stand-in for an HTTP SMS gateway.
+
+Run one or two of them and list them in the ``sms`` integration's
+``provider`` field (e.g. ``http://127.0.0.1:9020,http://127.0.0.1:9021``)::
+
+    python -m uvicorn app.stubs.sms:app --port 9020
+
+``POST /send`` takes ``{"sign_name", "messages": [{"phone", "text"}]}`` with
+a bearer token and answers ``{"results": [{"phone", "ok"}]}``; numbers that are
+not 11 digits are rejected one by one. ``SMS_STUB_API_KEY`` enables the token
+check, ``SMS_STUB_LATENCY_MS`` delays every call and ``SMS_STUB_FAIL_RATE``
+(0-1) answers that share of batches with a 503 to exercise failover.
+``GET /_stub/stats`` counts batches and messages, and ``GET /_stub/last``
+shows the latest texts per phone.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+from collections import Counter, OrderedDict
+
+from fastapi import FastAPI, Header, Response
+from pydantic import BaseModel
+
+API_KEY = os.getenv('SMS_STUB_API_KEY', '')
+LATENCY_SECONDS = float(os.getenv('SMS_STUB_LATENCY_MS', 0)) / 1000
+FAIL_RATE = float(os.getenv('SMS_STUB_FAIL_RATE', 0))
+LAST_SIZE = 1000
+
+app = FastAPI(title='SMS gateway stand-in')
+calls: Counter = Counter()
+last: OrderedDict[str, str] = OrderedDict()
+
+
+class Message(BaseModel):
+  phone: str
+  text: str
+
+
+class Batch(BaseModel):
+  sign_name: str = ''
+  messages: list[Message]
+
+
+@app.post('/send')
+async def send(batch: Batch, authorization: str = Header('')):
+  calls['batches'] += 1
+  if LATENCY_SECONDS:
+    await asyncio.sleep(LATENCY_SECONDS)
+  if API_KEY and authorization != f'Bearer {API_KEY}':
+    return Response(status_code=401)
+  if FAIL_RATE and random.random() < FAIL_RATE:
+    calls['failed_batches'] += 1
+    return Response(status_code=503)
+  results = []
+  for message in batch.messages:
+    ok = message.phone.isdigit() and len(message.phone) == 11
+    calls['delivered' if ok else 'rejected'] += 1
+    if ok:
+      last[message.phone] = f'【{batch.sign_name}】{message.text}'
+      last.move_to_end(message.phone)
+      if len(last) > LAST_SIZE:
+        last.popitem(last=False)
+    results.append({'phone': message.phone, 'ok': ok})
+  return {'results': results}
+
+
+@app.get('/_stub/stats')
+async def stats():
+  return dict(calls)
+
+
+@app.get('/_stub/last')
+async def last_messages():
+  return dict(last)
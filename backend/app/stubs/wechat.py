@@ -0,0 +1,171 @@
+"""Local stand-in for the WeChat endpoints the backend calls.
+
+Run it next to the backend and point ``WECHAT_API_BASE`` and
+``WECHAT_PAY_API_BASE`` at it::
+
+    python -m uvicorn app.stubs.wechat:app --port 9010
+    WECHAT_API_BASE=http://127.0.0.1:9010 WECHAT_PAY_API_BASE=http://127.0.0.1:9010 python -m uvicorn app.main:app
+
+It issues random access tokens and jsapi tickets, rejects revoked or expired
+tokens with the real error codes, and counts every call so cache behaviour can
+be checked from ``GET /_stub/stats``. ``WECHAT_STUB_EXPIRES_IN`` shortens the
+credential lifetime (default 7200 seconds) and ``WECHAT_STUB_LATENCY_MS`` adds
+a delay to each call.
+
+The pay endpoints (``/pay/unifiedorder``, ``/pay/orderquery``,
+``/pay/closeorder``) keep orders in memory by ``out_trade_no`` and answer in
+v2 XML. With ``WECHAT_STUB_API_KEY`` set they check request signatures and
+sign their responses; ``WECHAT_STUB_FAIL_RATE`` (0-1) answers that share of
+pay calls with a 503 to exercise client retries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import os
+import random
+import secrets
+import time
+from collections import Counter
+from typing import Dict
+
+from fastapi import FastAPI, Request, Response
+
+from app.services.wechat_pay_service import SIGN_TYPE, from_xml, sign, to_xml
+
+EXPIRES_IN = int(os.getenv('WECHAT_STUB_EXPIRES_IN', 7200))
+LATENCY_SECONDS = float(os.getenv('WECHAT_STUB_LATENCY_MS', 0)) / 1000
+API_KEY = os.getenv('WECHAT_STUB_API_KEY', '')
+FAIL_RATE = float(os.getenv('WECHAT_STUB_FAIL_RATE', 0))
+
+app = FastAPI(title='WeChat stand-in')
+calls: Counter = Counter()
+access_tokens: Dict[str, float] = {}
+pay_orders: Dict[str, Dict[str, str]] = {}
+
+
+async def _latency() -> None:
+  if LATENCY_SECONDS:
+    await asyncio.sleep(LATENCY_SECONDS)
+
+
+@app.get('/cgi-bin/token')
+async def token(grant_type: str = '', appid: str = '', secret: str = ''):
+  calls['token'] += 1
+  await _latency()
+  if grant_type != 'client_credential' or not appid or not secret:
+    return {'errcode': 40013, 'errmsg': 'invalid appid'}
+  value = secrets.token_urlsafe(24)
+  access_tokens[value] = time.monotonic() + EXPIRES_IN
+  return {'access_token': value, 'expires_in': EXPIRES_IN}
+
+
+@app.get('/cgi-bin/ticket/getticket')
+async def ticket(access_token: str = '', type: str = ''):
+  calls['ticket'] += 1
+  await _latency()
+  expires_at = access_tokens.get(access_token)
+  if expires_at is None:
+    return {'errcode': 40001, 'errmsg': 'invalid credential'}
+  if expires_at < time.monotonic():
+    return {'errcode': 42001, 'errmsg': 'access_token expired'}
+  if type != 'jsapi':
+    return {'errcode': 40097, 'errmsg': 'invalid args'}
+  return {'errcode': 0, 'errmsg': 'ok', 'ticket': secrets.token_urlsafe(32), 'expires_in': EXPIRES_IN}
+
+
+def _pay_reply(fields: Dict[str, str], request: Dict[str, str] | None = None) -> Response:
+  body = {'return_code': 'SUCCESS', 'return_msg': 'OK', 'nonce_str': secrets.token_hex(16), **fields}
+  if request:
+    body.update(appid=request.get('appid', ''), mch_id=request.get('mch_id', ''))
+  if API_KEY and body['return_code'] == 'SUCCESS':
+    body['sign'] = sign(body, API_KEY, request.get('sign_type') if request else SIGN_TYPE)
+  return Response(content=to_xml(body), media_type='application/xml')
+
+
+async def _pay_request(request: Request, name: str) -> Dict[str, str] | Response:
+  calls[name] += 1
+  await _latency()
+  if FAIL_RATE and random.random() < FAIL_RATE:
+    calls['failed'] += 1
+    return Response(status_code=503)
+  try:
+    fields = from_xml((await request.body()).decode())
+  except ValueError:
+    return _pay_reply({'return_code': 'FAIL', 'return_msg': 'XML format error'})
+  if API_KEY and not hmac.compare_digest(fields.get('sign', ''), sign(fields, API_KEY)):
+    return _pay_reply({'return_code': 'FAIL', 'return_msg': 'sign error'})
+  return fields
+
+
+def _pay_fail(fields: Dict[str, str], err_code: str, err_code_des: str) -> Response:
+  return _pay_reply({'result_code': 'FAIL', 'err_code': err_code, 'err_code_des': err_code_des}, fields)
+
+
+@app.post('/pay/unifiedorder')
+async def unified_order(request: Request):
+  fields = await _pay_request(request, 'unifiedorder')
+  if isinstance(fields, Response):
+    return fields
+  out_trade_no = fields.get('out_trade_no', '')
+  if not out_trade_no or not fields.get('total_fee', '').isdigit():
+    return _pay_fail(fields, 'PARAM_ERROR', 'out_trade_no and total_fee are required')
+  if fields.get('trade_type') == 'JSAPI' and not fields.get('openid'):
+    return _pay_fail(fields, 'PARAM_ERROR', 'JSAPI requires openid')
+  order = pay_orders.get(out_trade_no)
+  if order is None:
+    order = pay_orders[out_trade_no] = {
+      'prepay_id': f'wx{secrets.token_hex(15)}',
+      'total_fee': fields['total_fee'],
+      'trade_state': 'NOTPAY'
+    }
+  elif order['trade_state'] == 'CLOSED':
+    return _pay_fail(fields, 'ORDERCLOSED', 'order closed')
+  elif order['total_fee'] != fields['total_fee']:
+    return _pay_fail(fields, 'INVALID_REQUEST', 'out_trade_no reused with different parameters')
+  result = {'result_code': 'SUCCESS', 'trade_type': fields.get('trade_type', ''), 'prepay_id': order['prepay_id']}
+  if fields.get('trade_type') == 'NATIVE':
+    result['code_url'] = f"weixin://wxpay/bizpayurl?pr={order['prepay_id'][-7:]}"
+  return _pay_reply(result, fields)
+
+
+@app.post('/pay/orderquery')
+async def order_query(request: Request):
+  fields = await _pay_request(request, 'orderquery')
+  if isinstance(fields, Response):
+    return fields
+  order = pay_orders.get(fields.get('out_trade_no', ''))
+  if order is None:
+    return _pay_fail(fields, 'ORDERNOTEXIST', 'order does not exist')
+  return _pay_reply({
+    'result_code': 'SUCCESS',
+    'out_trade_no': fields['out_trade_no'],
+    'trade_state': order['trade_state'],
+    'total_fee': order['total_fee']
+  }, fields)
+
+
+@app.post('/pay/closeorder')
+async def close_order(request: Request):
+  fields = await _pay_request(request, 'closeorder')
+  if isinstance(fields, Response):
+    return fields
+  order = pay_orders.get(fields.get('out_trade_no', ''))
+  if order is None:
+    return _pay_fail(fields, 'ORDERNOTEXIST', 'order does not exist')
+  order['trade_state'] = 'CLOSED'
+  return _pay_reply({'result_code': 'SUCCESS'}, fields)
+
+
+@app.post('/_stub/revoke')
+async def revoke():
+  """Invalidate every issued access token, as WeChat does when a token is fetched elsewhere."""
+
+  access_tokens.clear()
+  return {'status': 'revoked'}
+
+
+@app.get('/_stub/stats')
+async def stats():
+  return dict(calls)
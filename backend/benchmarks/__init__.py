@@ -0,0 +1,5 @@
+"""Benchmarks and load tests for the backend.
+
+Run each module from ``backend/`` with ``python -m benchmarks.<name> --help``;
+they read the same environment as the app (``DATABASE_URL`` and friends).
+"""
@@ -0,0 +1,89 @@
+"""Catalog read throughput while orders keep arriving, with the response cache on and off.
+
+Seeds products in ``DATABASE_URL`` and drives the app in-process: each round
+reads ``GET /products/`` and a few product pages, with a ``POST /orders/``
+every ``--reads-per-order`` reads. Three modes run back to back:
+
+* ``off``: ``CATALOG_RESPONSE_CACHE_ENABLED`` disabled, every read hits the ORM;
+* ``bump``: cache on, but every order bumps ``products`` as order creation used
+  to, so nearly every read after an order misses;
+* ``on``: cache on, stock-only changes leave the cached bodies alone.
+
+::
+
+    python -m benchmarks.catalog_cache --reads 4000 --reads-per-order 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from decimal import Decimal
+from typing import List
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.config import settings
+from app.core import http_cache
+from app.core.database import Base, SessionLocal, engine
+from app.models.product import Product
+from app.models.user import User
+from app.services import auth_service
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Catalog reads/s under a stream of orders, response cache on vs off.')
+  parser.add_argument('--products', type=int, default=200)
+  parser.add_argument('--reads', type=int, default=4000, help='catalog reads per mode')
+  parser.add_argument('--reads-per-order', type=int, default=20, help='catalog reads between two orders')
+  parser.add_argument('--modes', default='off,bump,on')
+  args = parser.parse_args()
+
+  Base.metadata.create_all(bind=engine)
+  setup = SessionLocal()
+  buyer = User(username=f'catalog-bench-{time.time_ns()}', password_hash='!')
+  products = [
+    Product(name=f'Catalog bench {n}', description='benchmark', price=Decimal('1.00'), stock=10_000_000)
+    for n in range(args.products)
+  ]
+  setup.add(buyer)
+  setup.add_all(products)
+  setup.commit()
+  product_ids = [product.id for product in products]
+  headers = {'Authorization': f"Bearer {auth_service.issue_tokens(buyer)['access_token']}"}
+  setup.close()
+  urls = ['/products/?limit=20', '/products/?limit=50'] + [f'/products/{product_id}' for product_id in product_ids[:8]]
+
+  with TestClient(app) as client:
+    for mode in args.modes.split(','):
+      settings.catalog_response_cache_enabled = mode != 'off'
+      http_cache.bump('products')
+      before = http_cache.response_cache_stats().get('products', {})
+      latencies: List[float] = []
+      orders = 0
+      started = time.perf_counter()
+      for number in range(args.reads):
+        if number % args.reads_per_order == 0:
+          cart = {'items': [{'product_id': product_ids[orders % len(product_ids)], 'quantity': 1}]}
+          client.post('/orders/', json=cart, headers=headers).raise_for_status()
+          orders += 1
+          if mode == 'bump':
+            http_cache.bump('products')
+        began = time.perf_counter()
+        client.get(urls[number % len(urls)]).raise_for_status()
+        latencies.append(time.perf_counter() - began)
+      elapsed = time.perf_counter() - started
+      latencies.sort()
+      after = http_cache.response_cache_stats().get('products', {})
+      hits = after.get('hits', 0) - before.get('hits', 0)
+      print(
+        f'{mode:>4}: {args.reads / sum(latencies):.0f} reads/s, p50 {statistics.median(latencies) * 1000:.2f}ms, '
+        f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms, {orders / elapsed:.0f} orders/s, '
+        f'{hits / args.reads:.0%} cache hits'
+      )
+
+
+if __name__ == '__main__':
+  main()
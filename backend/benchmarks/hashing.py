@@ -0,0 +1,96 @@
+"""Login spike against the password-hashing process pool.
+
+Starts the app at several ``PASSWORD_HASH_WORKERS`` values and reports
+logins/s next to the latency of ``GET /products/`` during the spike, to size
+the pool for a host::
+
+    python -m benchmarks.hashing --workers 1,4,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description='Start the app at each PASSWORD_HASH_WORKERS value and measure a login spike next to ordinary traffic.'
+  )
+  parser.add_argument('--workers', default='1,4,8', help='comma-separated PASSWORD_HASH_WORKERS values')
+  parser.add_argument('--seconds', type=float, default=10)
+  parser.add_argument('--logins', type=int, default=16, help='concurrent login clients')
+  parser.add_argument('--others', type=int, default=4, help='concurrent clients reading GET /products/')
+  parser.add_argument('--port', type=int, default=8765)
+  args = parser.parse_args()
+  base_url = f'http://127.0.0.1:{args.port}'
+
+  async def spike(seconds: float) -> tuple[int, list[float]]:
+    logins = 0
+    latencies: list[float] = []
+    deadline = time.perf_counter() + seconds
+    credentials = {'username': 'hash-bench', 'password': 'hash-bench-password'}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+      async def login() -> None:
+        nonlocal logins
+        while time.perf_counter() < deadline:
+          (await client.post('/auth/login', json=credentials)).raise_for_status()
+          logins += 1
+
+      async def browse() -> None:
+        while time.perf_counter() < deadline:
+          started = time.perf_counter()
+          (await client.get('/products/')).raise_for_status()
+          latencies.append(time.perf_counter() - started)
+
+      await asyncio.gather(*(login() for _ in range(args.logins)), *(browse() for _ in range(args.others)))
+    return logins, sorted(latencies)
+
+  print(f'{os.cpu_count()} CPUs, {args.logins} login clients, {args.others} clients on GET /products/, {args.seconds:.0f}s each')
+  for workers in [int(value) for value in args.workers.split(',')]:
+    scratch = tempfile.mkdtemp(prefix='hash-bench-')
+    env = dict(
+      os.environ,
+      DATABASE_URL=f'sqlite:///{scratch}/bench.db',
+      PASSWORD_HASH_WORKERS=str(workers),
+      RATE_LIMIT_ENABLED='0'
+    )
+    server = subprocess.Popen(
+      [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(args.port), '--log-level', 'warning'],
+      env=env,
+      cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+      stderr=subprocess.DEVNULL
+    )
+    try:
+      for _ in range(100):
+        try:
+          httpx.get(f'{base_url}/products/').raise_for_status()
+          break
+        except httpx.HTTPError:
+          time.sleep(0.2)
+      httpx.post(
+        f'{base_url}/auth/register',
+        json={'username': 'hash-bench', 'password': 'hash-bench-password'},
+        timeout=60
+      ).raise_for_status()
+      login_count, timings = asyncio.run(spike(args.seconds))
+    finally:
+      server.terminate()
+      server.wait()
+    p50 = timings[len(timings) // 2] * 1000 if timings else float('nan')
+    p99 = timings[int(len(timings) * 0.99)] * 1000 if timings else float('nan')
+    print(
+      f'workers={workers}: {login_count / args.seconds:.1f} logins/s, GET /products/ {len(timings) / args.seconds:.0f}/s, '
+      f'p50 {p50:.1f}ms, p99 {p99:.1f}ms'
+    )
+
+
+if __name__ == '__main__':
+  main()
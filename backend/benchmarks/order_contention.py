@@ -0,0 +1,107 @@
+"""Contention benchmark for order creation.
+
+Concurrent buyers place orders for a few SKUs in ``DATABASE_URL``, each cart
+listing them in random order, and the run reports orders/s, deadlocks and lock
+timeouts, then checks that stock plus units sold still equals the starting
+stock for every SKU::
+
+    python -m benchmarks.order_contention --buyers 32 --skus 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+import app.models  # noqa: F401
+from app.core.database import Base, SessionLocal, engine
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
+from app.schemas.order import OrderCreate, OrderItemBase
+from app.services.order_service import create_order
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description='Contention benchmark: concurrent buyers placing orders for a few SKUs in DATABASE_URL.'
+  )
+  parser.add_argument('--buyers', type=int, default=32, help='concurrent buyer threads')
+  parser.add_argument('--skus', type=int, default=8)
+  parser.add_argument('--orders', type=int, default=50, help='orders attempted per buyer')
+  parser.add_argument('--stock', type=int, default=1000, help='starting stock per SKU')
+  parser.add_argument('--cart-size', type=int, default=3)
+  args = parser.parse_args()
+
+  Base.metadata.create_all(bind=engine)
+  setup = SessionLocal()
+  buyer = User(username=f'contention-bench-{time.time_ns()}', password_hash='!')
+  skus = [Product(name=f'Contention SKU {n}', price=Decimal('1.00'), stock=args.stock) for n in range(args.skus)]
+  setup.add(buyer)
+  setup.add_all(skus)
+  setup.commit()
+  sku_ids = [product.id for product in skus]
+  counts = defaultdict(int)
+  counts_lock = threading.Lock()
+
+  def shop(seed: int) -> None:
+    generator = random.Random(seed)
+    db = SessionLocal()
+    try:
+      for _ in range(args.orders):
+        # Carts list SKUs in random order; lock_products must still lock them in id order
+        cart = generator.sample(sku_ids, min(args.cart_size, len(sku_ids)))
+        items = [OrderItemBase(product_id=product_id, quantity=generator.randint(1, 3)) for product_id in cart]
+        try:
+          create_order(db, buyer.id, OrderCreate(items=items))
+          outcome = 'orders'
+        except HTTPException:
+          outcome = 'sold_out'
+        except OperationalError as exc:
+          db.rollback()
+          message = str(exc.orig).lower()
+          outcome = 'deadlocks' if 'deadlock' in message or '1213' in message else 'lock_timeouts'
+        with counts_lock:
+          counts[outcome] += 1
+    finally:
+      db.close()
+
+  threads = [threading.Thread(target=shop, args=(seed,)) for seed in range(args.buyers)]
+  started = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - started
+
+  remaining = dict(setup.query(Product.id, Product.stock).filter(Product.id.in_(sku_ids)))
+  sold = dict(
+    setup.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+    .join(Order, Order.id == OrderItem.order_id)
+    .filter(Order.user_id == buyer.id)
+    .group_by(OrderItem.product_id)
+  )
+  oversold = [
+    product_id for product_id in sku_ids
+    if remaining[product_id] < 0 or remaining[product_id] + int(sold.get(product_id) or 0) != args.stock
+  ]
+  setup.close()
+  attempts = args.buyers * args.orders
+  print(
+    f'{args.buyers} buyers x {args.orders} carts on {args.skus} SKUs ({engine.dialect.name}): {elapsed:.2f}s, '
+    f"{counts['orders'] / elapsed:.0f} orders/s, {counts['orders']}/{attempts} placed, {counts['sold_out']} sold out, "
+    f"{counts['deadlocks']} deadlocks, {counts['lock_timeouts']} lock timeouts"
+  )
+  print('oversell check: ' + ('OK, stock + sold == starting stock for every SKU' if not oversold else f'FAILED for {oversold}'))
+
+
+if __name__ == '__main__':
+  main()
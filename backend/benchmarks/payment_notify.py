@@ -0,0 +1,108 @@
+"""Load test for ``POST /payments/wechat/notify``.
+
+Seeds pending payments in ``DATABASE_URL`` and sends signed notifies (some of
+them duplicates) to a running backend that shares the database, reporting
+notifies/s, latency percentiles and how long fulfilment took::
+
+    python -m benchmarks.payment_notify --url http://127.0.0.1:8000 --payments 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import secrets
+import time
+from decimal import Decimal
+
+import httpx
+
+import app.models  # noqa: F401
+from app.core.database import SessionLocal
+from app.models.order import Order
+from app.models.payment import Payment
+from app.models.user import User
+from app.services import system_config_service
+from app.services.payment_service import notify_sign
+from app.services.wechat_pay_service import to_xml
+
+
+async def _benchmark(url: str, notifies: list, concurrency: int) -> list:
+  gate = asyncio.Semaphore(concurrency)
+  latencies = []
+  async with httpx.AsyncClient(base_url=url, limits=httpx.Limits(max_connections=concurrency)) as client:
+    async def send(body: str) -> None:
+      async with gate:
+        started = time.perf_counter()
+        response = await client.post('/payments/wechat/notify', content=body, headers={'Content-Type': 'application/xml'})
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+
+    await asyncio.gather(*(send(body) for body in notifies))
+  return latencies
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description='Load-test the notify endpoint of a running backend that shares DATABASE_URL with this process.'
+  )
+  parser.add_argument('--url', default='http://127.0.0.1:8000')
+  parser.add_argument('--payments', type=int, default=5000)
+  parser.add_argument('--duplicates', type=float, default=0.2, help='share of payments notified twice')
+  parser.add_argument('--concurrency', type=int, default=100)
+  args = parser.parse_args()
+
+  session = SessionLocal()
+  record = system_config_service.integration(session, 'wechat_pay')
+  bench_key = str(record.config.get('apiKey') or '') if record and record.is_active else ''
+  if not bench_key:
+    raise SystemExit('Activate the wechat_pay integration with an apiKey first')
+  buyer = session.query(User).filter(User.username == 'notify-bench').first()
+  if buyer is None:
+    buyer = User(username='notify-bench', password_hash='!', role='user')
+    session.add(buyer)
+    session.flush()
+  bench_orders = [Order(user_id=buyer.id, total_amount=Decimal('1.00')) for _ in range(args.payments)]
+  session.add_all(bench_orders)
+  session.flush()
+  bench_payments = [Payment(order_id=order.id, provider='wechat', status='pending') for order in bench_orders]
+  session.add_all(bench_payments)
+  session.commit()
+
+  bodies = []
+  for bench_payment in bench_payments:
+    notify = {
+      'return_code': 'SUCCESS',
+      'result_code': 'SUCCESS',
+      'out_trade_no': bench_payment.out_trade_no,
+      'transaction_id': f'bench{bench_payment.id}',
+      'total_fee': '100',
+      'nonce_str': secrets.token_hex(8)
+    }
+    notify['sign'] = notify_sign(notify, bench_key)
+    bodies.append(to_xml(notify))
+  bodies += random.sample(bodies, int(len(bodies) * args.duplicates))
+  random.shuffle(bodies)
+
+  started = time.perf_counter()
+  timings = sorted(asyncio.run(_benchmark(args.url, bodies, args.concurrency)))
+  elapsed = time.perf_counter() - started
+  print(
+    f'{len(bodies)} notifies for {args.payments} payments in {elapsed:.2f}s: {len(bodies) / elapsed:.0f}/s, '
+    f'p50 {timings[len(timings) // 2] * 1000:.1f}ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.1f}ms'
+  )
+
+  order_ids = [order.id for order in bench_orders]
+  while True:
+    session.rollback()
+    paid = session.query(Order).filter(Order.id.in_(order_ids), Order.status == 'paid').count()
+    if paid == len(order_ids) or time.perf_counter() - started > 120:
+      break
+    time.sleep(0.2)
+  print(f'{paid}/{len(order_ids)} orders fulfilled {time.perf_counter() - started:.2f}s after the first notify')
+  session.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,71 @@
+"""Product index builds and searches over synthetic products.
+
+Times a build of ``--products`` synthetic products, then searches with the
+index idle and with a rebuild running alongside::
+
+    python -m benchmarks.product_search --products 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from typing import List
+
+from app.services.product_search import ProductIndex
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Benchmark index builds and searches over synthetic products.')
+  parser.add_argument('--products', type=int, default=100_000)
+  parser.add_argument('--searches', type=int, default=400)
+  args = parser.parse_args()
+
+  words = ['ielts', 'toefl', 'speaking', 'writing', 'grammar', 'vocabulary', 'listening', 'reading', 'course',
+           'mock', 'exam', 'tutor', 'advanced', 'beginner', 'business', 'english', 'phonics', 'essay']
+  phrases = ['雅思写作', '托福口语', '英语语法', '商务英语', '词汇突破', '听力训练', '阅读精讲', '模考冲刺']
+  generator = random.Random(7)
+  products = [
+    (
+      product_id,
+      f'{generator.choice(phrases)} {" ".join(generator.sample(words, 3))} {product_id}',
+      ' '.join(generator.sample(words, 8)) + generator.choice(phrases)
+    )
+    for product_id in range(1, args.products + 1)
+  ]
+  queries = ['ielts writing', 'spea', '雅思写', '口语 mock', 'grammar essay', 'busi', '听力', 'vocabulary tutor']
+
+  bench = ProductIndex()
+  started = time.perf_counter()
+  bench.rebuild(products)
+  print(f'build of {len(bench)} products: {time.perf_counter() - started:.2f}s')
+
+  def timed_searches() -> List[float]:
+    latencies = []
+    for number in range(args.searches):
+      began = time.perf_counter()
+      bench.search(queries[number % len(queries)])
+      latencies.append(time.perf_counter() - began)
+    return sorted(latencies)
+
+  def report(label: str, latencies: List[float]) -> None:
+    print(
+      f'{label}: {len(latencies) / sum(latencies):.0f} searches/s, p50 {statistics.median(latencies) * 1000:.2f}ms, '
+      f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms, max {latencies[-1] * 1000:.2f}ms'
+    )
+
+  report('idle', timed_searches())
+  rebuilding = threading.Thread(target=lambda: bench.try_rebuild(products, wait=False))
+  rebuilding.start()
+  report('during rebuild', timed_searches())
+  started = time.perf_counter()
+  skipped = sum(not bench.try_rebuild(products, wait=False) for _ in range(100))
+  rebuilding.join()
+  print(f'{skipped}/100 concurrent rebuild requests served the old index instead of building ({time.perf_counter() - started:.3f}s)')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,69 @@
+"""Cost of a rate-limit check per backend.
+
+Times the memory backend on hot keys and on the eviction path once it is
+full, the sqlite backend, and the whole ``auth.login`` dependency as a route
+runs it::
+
+    python -m benchmarks.rate_limit --checks 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi import Request
+
+from app.config import settings
+from app.core import rate_limit
+from app.core.rate_limit import MemoryBackend, Rule, SQLiteBackend, rules
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Time rate-limit checks per backend.')
+  parser.add_argument('--checks', type=int, default=200_000)
+  args = parser.parse_args()
+  login_rule = rules['auth.login']['ip']
+
+  def per_check(label: str, target, keys) -> None:
+    started = time.perf_counter()
+    for key in keys:
+      target.consume(key, login_rule)
+    elapsed = time.perf_counter() - started
+    print(f'{label}: {elapsed / len(keys) * 1e6:.2f}µs per check')
+
+  memory = MemoryBackend()
+  per_check('memory, 1000 hot keys', memory, [f'auth.login:ip:10.0.{n % 1000 // 250}.{n % 250}' for n in range(args.checks)])
+  per_check('memory, every key new, evicting at 100k', memory, [f'auth.login:ip:bot-{n}' for n in range(args.checks)])
+  scratch = Path(tempfile.mkdtemp(prefix='rate-limit-bench-')) / 'buckets.sqlite3'
+  per_check('sqlite, 1000 hot keys', SQLiteBackend(scratch), [f'auth.login:ip:{n % 1000}' for n in range(args.checks // 20)])
+
+  # The whole dependency as a route runs it: IP plus a username read from the JSON body
+  check = rate_limit.rate_limit('auth.login', 'username')
+  body = json.dumps({'username': 'someone', 'password': 'x'}).encode()
+  requests = []
+  for n in range(args.checks // 10):
+    async def receive(body=body):
+      return {'type': 'http.request', 'body': body, 'more_body': False}
+    scope = {'type': 'http', 'method': 'POST', 'path': '/auth/login', 'headers': [], 'client': (f'10.1.{n // 250 % 250}.{n % 250}', 1)}
+    requests.append(Request(scope, receive))
+  settings.rate_limit_enabled = True
+  rate_limit.backend = MemoryBackend()
+  rules['auth.login']['username'] = Rule.parse(f'{len(requests)}/60')
+
+  async def run_checks() -> float:
+    started = time.perf_counter()
+    for request in requests:
+      await check(request)
+    return time.perf_counter() - started
+
+  elapsed = asyncio.run(run_checks())
+  print(f'auth.login dependency (ip + username, memory): {elapsed / len(requests) * 1e6:.2f}µs per request')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,30 @@
+"""Full rebuild of the sales rollups in ``DATABASE_URL``.
+
+Recomputes ``sales_rollups`` from ``orders`` and ``payments`` and reports how
+long it took; run it while the shop is quiet (see
+:func:`app.services.sales_rollup_service.rebuild`)::
+
+    python -m benchmarks.sales_rollup
+"""
+
+from __future__ import annotations
+
+import time
+
+import app.models  # noqa: F401
+from app.core.database import SessionLocal
+from app.services.sales_rollup_service import rebuild
+
+
+def main() -> None:
+  session = SessionLocal()
+  try:
+    started = time.perf_counter()
+    rows = rebuild(session)
+    print(f'Rebuilt {rows} sales rollup rows in {time.perf_counter() - started:.2f}s')
+  finally:
+    session.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,44 @@
+"""SMS dispatch throughput against a failover list of providers.
+
+Queues synthetic verification texts on a dispatcher built from the ``SMS_*``
+settings and reports messages/s with the dispatcher stats, e.g. against the
+local gateway stand-in (``python -m uvicorn app.stubs.sms:app --port 9020``)::
+
+    python -m benchmarks.sms_dispatch http://127.0.0.1:9020,fake --messages 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List, Tuple
+
+from app.config import settings
+from app.services.sms_service import Provider, SmsDispatcher, SmsMessage, _from_settings
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Benchmark SMS dispatch throughput against the given providers.')
+  parser.add_argument('providers', help='comma-separated failover list, e.g. http://127.0.0.1:9020,fake')
+  parser.add_argument('--messages', type=int, default=20000)
+  args = parser.parse_args()
+
+  bench: SmsDispatcher
+
+  def bench_providers() -> Tuple[List[Provider], str]:
+    entries = [bench._provider(entry.strip(), 'bench-key') for entry in args.providers.split(',')]
+    return [provider for provider in entries if provider is not None], 'bench'
+
+  bench = _from_settings(providers=bench_providers, queue_size=max(settings.sms_queue_size, args.messages))
+  started = time.perf_counter()
+  for number in range(args.messages):
+    bench.enqueue(SmsMessage(f'138{number:08d}', f'benchmark {number}'))
+  while bench.sent + bench.dropped < args.messages:
+    time.sleep(0.01)
+  elapsed = time.perf_counter() - started
+  bench.shutdown()
+  print(f'{args.messages} messages in {elapsed:.2f}s: {args.messages / elapsed:.0f}/s, {bench.stats()}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,71 @@
+"""Access tokens verified per second, before and after the key and claims memo.
+
+Replays a stream of verifications in which each one reuses an already seen
+token with the given probability (a browsing user sends the same access token
+with every request) and otherwise presents a new one. ``before`` is
+``jwt.decode`` with the string secret, as the auth service called it;
+``after`` is :func:`app.core.tokens.decode`::
+
+    python -m benchmarks.tokens --verifications 20000 --reuse 0,0.5,0.9,0.99
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from jose import jwt
+
+from app.config import settings
+from app.core import tokens
+
+
+def stream(count: int, reuse: float, generator: random.Random) -> List[str]:
+  """``count`` tokens to verify, each a repeat of an earlier one with probability ``reuse``."""
+
+  expires = int(time.time()) + 3600
+  seen: List[str] = []
+  result = []
+  for _ in range(count):
+    if seen and generator.random() < reuse:
+      result.append(generator.choice(seen))
+    else:
+      token = tokens.encode({'sub': f'bench-{len(seen)}', 'role': 'user', 'exp': expires})
+      seen.append(token)
+      result.append(token)
+  return result
+
+
+def per_second(verify: Callable[[str], object], batch: List[str]) -> float:
+  started = time.perf_counter()
+  for token in batch:
+    verify(token)
+  return len(batch) / (time.perf_counter() - started)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Tokens verified per second at several token reuse rates.')
+  parser.add_argument('--verifications', type=int, default=20000)
+  parser.add_argument('--reuse', default='0,0.5,0.9,0.99', help='comma-separated share of verifications repeating a token')
+  args = parser.parse_args()
+
+  def before(token: str) -> object:
+    return jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+
+  print(f'{args.verifications} verifications, {settings.jwt_algorithm}, memo of {settings.jwt_cache_size} tokens')
+  for reuse in [float(value) for value in args.reuse.split(',')]:
+    batch = stream(args.verifications, reuse, random.Random(5))
+    tokens._claims_cache.clear()
+    hits = tokens.cache_stats()['hits']
+    after = per_second(tokens.decode, batch)
+    hit_rate = (tokens.cache_stats()['hits'] - hits) / len(batch)
+    print(
+      f'reuse {reuse:.0%} ({len(set(batch))} distinct): before {per_second(before, batch):,.0f}/s, '
+      f'after {after:,.0f}/s, {hit_rate:.0%} memo hits'
+    )
+
+
+if __name__ == '__main__':
+  main()
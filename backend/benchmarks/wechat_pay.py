@@ -0,0 +1,59 @@
+"""Prepay creation throughput against ``WECHAT_PAY_API_BASE``.
+
+Normally pointed at the local stand-in (``python -m uvicorn app.stubs.wechat:app``);
+``--no-pool`` opens a new client, and so a new connection, per request to show
+what the pooled client saves::
+
+    python -m benchmarks.wechat_pay --requests 2000 --concurrency 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+
+from app.services.wechat_pay_service import Merchant, _from_settings
+
+
+async def _benchmark(total: int, concurrency: int, pooled: bool, merchant: Merchant) -> None:
+  shared = _from_settings()
+  gate = asyncio.Semaphore(concurrency)
+
+  async def prepay(index: int) -> None:
+    client = shared if pooled else _from_settings()
+    async with gate:
+      try:
+        await client.unified_order(
+          merchant,
+          out_trade_no=f'BENCH{time.time_ns()}{index}'[:32],
+          total_fee=100,
+          body='benchmark',
+          notify_url='http://127.0.0.1/payments/wechat/notify',
+          client_ip='127.0.0.1'
+        )
+      finally:
+        if not pooled:
+          await client.aclose()
+
+  started = time.perf_counter()
+  await asyncio.gather(*(prepay(index) for index in range(total)))
+  elapsed = time.perf_counter() - started
+  await shared.aclose()
+  mode = 'pooled client' if pooled else 'client per request'
+  print(f'{total} prepays, concurrency {concurrency}, {mode}: {elapsed:.2f}s, {total / elapsed:.0f}/s')
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Benchmark prepay creation against WECHAT_PAY_API_BASE (normally the local stand-in).')
+  parser.add_argument('--requests', type=int, default=2000)
+  parser.add_argument('--concurrency', type=int, default=50)
+  parser.add_argument('--no-pool', action='store_true', help='open a new client, and so a new connection, per request')
+  args = parser.parse_args()
+  bench_merchant = Merchant('wxbench', '1900000109', os.getenv('WECHAT_STUB_API_KEY', 'bench-key'))
+  asyncio.run(_benchmark(args.requests, args.concurrency, not args.no_pool, bench_merchant))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Settings are read at import time, so point the app at a scratch SQLite database before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='englishteacher-tests-'), 'test.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.models  # noqa: E402,F401
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture
+def db():
+  Base.metadata.create_all(bind=engine)
+  session = SessionLocal()
+  try:
+    yield session
+  finally:
+    session.close()
+    Base.metadata.drop_all(bind=engine)
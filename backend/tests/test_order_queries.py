@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import engine
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
+from app.services import order_service
+
+
+@contextmanager
+def count_statements():
+  statements = []
+
+  def record(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+  event.listen(engine, 'before_cursor_execute', record)
+  try:
+    yield statements
+  finally:
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def seed_orders(db, count, items_per_order=3):
+  user = User(username='buyer', password_hash='!')
+  products = [Product(name=f'Course {n}', price=Decimal('9.90'), stock=100) for n in range(5)]
+  db.add(user)
+  db.add_all(products)
+  db.flush()
+  for n in range(count):
+    order = Order(user_id=user.id, total_amount=Decimal('29.70'))
+    order.items = [
+      OrderItem(product_id=products[(n + i) % len(products)].id, quantity=1, price=Decimal('9.90'))
+      for i in range(items_per_order)
+    ]
+    db.add(order)
+  db.commit()
+  # Start from an empty identity map so nothing is served from the seeding session
+  db.expunge_all()
+  return user
+
+
+def touch(orders):
+  """Read everything the order responses serialize, so lazy loads would show up as statements."""
+
+  return [(item.quantity, item.product.name) for order in orders for item in order.items]
+
+
+@pytest.mark.parametrize('count', [1, 25])
+def test_list_orders_statement_count_is_constant(db, count):
+  user = seed_orders(db, count)
+  with count_statements() as statements:
+    orders = order_service.list_orders(db, user.id)
+    touched = touch(orders)
+  assert len(orders) == count
+  assert len(touched) == count * 3
+  # Orders, their items, the items' products
+  assert len(statements) == 3
+
+
+@pytest.mark.parametrize('count', [1, 25])
+def test_page_orders_statement_count_is_constant(db, count):
+  user = seed_orders(db, count)
+  with count_statements() as statements:
+    page = order_service.page_orders(db, user.id, limit=20)
+    touch(page['items'])
+  assert len(page['items']) == min(count, 20)
+  assert len(statements) == 3
+
+
+def test_get_order_loads_items_and_products_up_front(db):
+  user = seed_orders(db, 3)
+  order_id = db.query(Order.id).first()[0]
+  db.expunge_all()
+  with count_statements() as statements:
+    order = order_service.get_order(db, order_id, user.id)
+    touch([order])
+  assert len(statements) == 3
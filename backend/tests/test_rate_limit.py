@@ -0,0 +1,34 @@
+import sqlite3
+
+from app.core.rate_limit import Rule, SQLiteBackend, rules
+
+RULE = Rule.parse('5/60')
+LONGEST_REFILL = max(rule.idle_seconds for dims in rules.values() for rule in dims.values())
+NOW = 1_000_000.0
+
+
+def bucket_keys(path):
+  with sqlite3.connect(path) as conn:
+    return {key for key, in conn.execute('SELECT key FROM buckets')}
+
+
+def test_sqlite_backend_sweeps_buckets_idle_past_the_slowest_refill(tmp_path):
+  path = tmp_path / 'buckets.sqlite3'
+  backend = SQLiteBackend(path, sweep_seconds=0)
+  backend.consume('idle', RULE, now=NOW)
+  backend.consume('recent', RULE, now=NOW + LONGEST_REFILL - 30)
+  assert bucket_keys(path) == {'idle', 'recent'}
+
+  backend.consume('fresh', RULE, now=NOW + LONGEST_REFILL + 1)
+  assert bucket_keys(path) == {'recent', 'fresh'}
+
+
+def test_sqlite_backend_sweeps_at_most_once_per_interval(tmp_path):
+  path = tmp_path / 'buckets.sqlite3'
+  backend = SQLiteBackend(path, sweep_seconds=2 * LONGEST_REFILL)
+  backend.consume('idle', RULE, now=NOW)
+  backend.consume('fresh', RULE, now=NOW + LONGEST_REFILL + 1)
+  assert bucket_keys(path) == {'idle', 'fresh'}
+
+  backend.consume('fresh', RULE, now=NOW + 2 * LONGEST_REFILL + 1)
+  assert bucket_keys(path) == {'fresh'}
@@ -0,0 +1,64 @@
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.exc import OperationalError
+
+from app.models.order import Order
+from app.models.sales_rollup import SalesRollup
+from app.models.user import User
+from app.services import sales_rollup_service
+
+
+def place_order(db, amount='10.00'):
+  user = db.query(User).first()
+  if user is None:
+    user = User(username='rollup-buyer', password_hash='!')
+    db.add(user)
+    db.flush()
+  order = Order(user_id=user.id, total_amount=Decimal(amount), created_at=datetime.utcnow())
+  db.add(order)
+  db.commit()
+  return order
+
+
+def order_count(db):
+  db.expire_all()
+  return sum(row.order_count for row in db.query(SalesRollup))
+
+
+def test_failed_increment_is_counted_and_logged(db, monkeypatch, caplog):
+  order = place_order(db)
+  failed = sales_rollup_service.stats()['failed']
+
+  def broken_upsert(*args):
+    raise OperationalError('INSERT', {}, Exception('database is locked'))
+
+  monkeypatch.setattr(sales_rollup_service, '_upsert', broken_upsert)
+  sales_rollup_service.record_orders(db, [order])
+
+  assert sales_rollup_service.stats()['failed'] == failed + 1
+  assert 'Dropped sales rollup increments' in caplog.text
+  assert order_count(db) == 0
+
+
+def test_increments_wait_for_a_running_rebuild(db):
+  first = place_order(db)
+  sales_rollup_service.record_orders(db, [first])
+  second = place_order(db)
+  finished = threading.Event()
+
+  def increment():
+    sales_rollup_service.record_orders(db, [second])
+    finished.set()
+
+  with sales_rollup_service._gate.rebuild():
+    assert sales_rollup_service.stats()['rebuilding']
+    worker = threading.Thread(target=increment)
+    worker.start()
+    assert not finished.wait(0.2)
+  worker.join(5)
+  assert finished.is_set()
+  assert order_count(db) == 2
+  assert sales_rollup_service.rebuild(db) == 1
+  assert order_count(db) == 2
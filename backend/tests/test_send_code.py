@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+
+from app.models.integration import IntegrationConfig
+from app.services import auth_service, system_config_service
+
+
+def configure_sms(db, provider, *, active=True):
+  db.add(IntegrationConfig(provider='sms', is_active=active, config={'provider': provider, 'apiKey': 'k', 'signName': 'T'}))
+  db.commit()
+  system_config_service.invalidate_snapshot()
+
+
+@pytest.fixture(autouse=True)
+def fresh_snapshot():
+  system_config_service.invalidate_snapshot()
+  yield
+  system_config_service.invalidate_snapshot()
+
+
+def test_code_is_returned_without_an_sms_integration(db):
+  assert auth_service.send_verification_code(db, '13800000000')
+
+
+def test_code_is_returned_with_only_the_fake_provider(db):
+  configure_sms(db, 'fake')
+  assert auth_service.send_verification_code(db, '13800000001')
+
+
+@pytest.mark.parametrize('provider', ['aliyun', 'tencent', 'aliyun, tencent', 'fake,aliyun'])
+def test_unsupported_providers_never_leak_the_code(db, provider):
+  configure_sms(db, provider)
+  with pytest.raises(HTTPException) as raised:
+    auth_service.send_verification_code(db, '13800000002')
+  assert raised.value.status_code == 503
+
+
+def test_inactive_integration_counts_as_unconfigured(db):
+  configure_sms(db, 'aliyun', active=False)
+  assert auth_service.send_verification_code(db, '13800000003')
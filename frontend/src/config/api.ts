@@ -13,20 +13,25 @@ export const API_ENDPOINTS = {
   authCodeLogin: '/auth/code-login',
   adminLogin: '/auth/admin/login',
   authMe: '/auth/me',
+  authRefresh: '/auth/refresh',
+  authLogout: '/auth/logout',
   products: '/products',
   productDetail: (id: number | string) => `/products/${id}`,
   courses: '/courses',
   courseDetail: (id: number | string) => `/courses/${id}`,
   wechatConfig: '/payments/wechat/config',
   wechatOrder: '/payments/wechat',
+  orderIntake: (ticket: string) => `/orders/intake/${ticket}`,
   adminDatabaseTest: '/admin/database/test',
   adminDatabaseSeed: '/admin/database/seed',
   adminConfig: '/admin/config',
   adminDashboard: '/admin/dashboard',
+  adminTimeseries: '/admin/analytics/timeseries',
   adminUsers: '/admin/users',
   adminPayments: '/admin/payments',
   adminOrders: '/admin/orders',
   adminOrderDetail: (id: string) => `/admin/orders/${id}`,
+  adminExport: (resource: string) => `/admin/export/${resource}`,
   adminCourses: '/admin/courses',
   adminCourseDetail: (id: number | string) => `/admin/courses/${id}`,
   installStatus: '/install/status',
@@ -4,6 +4,7 @@ import { API_ENDPOINTS } from '@/config/api';
 
 interface AdminAuthState {
   token: string | null;
+  refreshToken: string | null;
   username: string | null;
   isDefaultAdmin: boolean;
 }
@@ -11,6 +12,7 @@ interface AdminAuthState {
 export const useAdminAuthStore = defineStore('adminAuth', {
   state: (): AdminAuthState => ({
     token: localStorage.getItem('adminToken'),
+    refreshToken: localStorage.getItem('adminRefreshToken'),
     username: localStorage.getItem('adminUsername'),
     isDefaultAdmin: localStorage.getItem('adminIsDefault') === 'true'
   }),
@@ -18,19 +20,27 @@ export const useAdminAuthStore = defineStore('adminAuth', {
     isAuthenticated: (state) => !!state.token
   },
   actions: {
-    setSession(token: string, username: string, isDefaultAdmin = false) {
+    setSession(token: string, username: string, isDefaultAdmin = false, refreshToken: string | null = null) {
       this.token = token;
+      this.refreshToken = refreshToken;
       this.username = username;
       this.isDefaultAdmin = isDefaultAdmin;
       localStorage.setItem('adminToken', token);
+      if (refreshToken) {
+        localStorage.setItem('adminRefreshToken', refreshToken);
+      } else {
+        localStorage.removeItem('adminRefreshToken');
+      }
       localStorage.setItem('adminUsername', username);
       localStorage.setItem('adminIsDefault', String(isDefaultAdmin));
     },
     logout() {
       this.token = null;
+      this.refreshToken = null;
       this.username = null;
       this.isDefaultAdmin = false;
       localStorage.removeItem('adminToken');
+      localStorage.removeItem('adminRefreshToken');
       localStorage.removeItem('adminUsername');
       localStorage.removeItem('adminIsDefault');
     },
@@ -39,7 +49,8 @@ export const useAdminAuthStore = defineStore('adminAuth', {
       this.setSession(
         response.data.access_token,
         username,
-        Boolean(response.data.is_default_admin)
+        Boolean(response.data.is_default_admin),
+        response.data.refresh_token || null
       );
     }
   }
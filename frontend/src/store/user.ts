@@ -6,6 +6,7 @@ export type MembershipLevel = 'free' | 'daily' | 'monthly' | 'yearly' | 'lifetim
 
 interface AuthState {
   token: string | null;
+  refreshToken: string | null;
   phone: string | null;
   membership: MembershipLevel;
   memberUntil: string | null;
@@ -22,6 +23,7 @@ const maskPhone = (phone: string) => {
 export const useUserStore = defineStore('user', {
   state: (): AuthState => ({
     token: localStorage.getItem('token'),
+    refreshToken: localStorage.getItem('refreshToken'),
     phone: localStorage.getItem('phone'),
     membership: (localStorage.getItem('membership') as MembershipLevel) || 'free',
     memberUntil: localStorage.getItem('memberUntil'),
@@ -55,6 +57,14 @@ export const useUserStore = defineStore('user', {
         localStorage.removeItem('token');
       }
     },
+    setRefreshToken(refreshToken: string | null) {
+      this.refreshToken = refreshToken;
+      if (refreshToken) {
+        localStorage.setItem('refreshToken', refreshToken);
+      } else {
+        localStorage.removeItem('refreshToken');
+      }
+    },
     persistProfile() {
       if (this.phone) localStorage.setItem('phone', this.phone);
       if (this.membership) localStorage.setItem('membership', this.membership);
@@ -74,6 +84,7 @@ export const useUserStore = defineStore('user', {
       this.memberUntil = data.user.membership_expires_at;
       this.persistProfile();
       this.setToken(this.token);
+      this.setRefreshToken(data.refresh_token || null);
       return Boolean(data.newly_registered);
     },
     logout() {
@@ -84,6 +95,7 @@ export const useUserStore = defineStore('user', {
       this.testsCompleted = 0;
       this.role = 'user';
       this.setToken(null);
+      this.setRefreshToken(null);
       localStorage.removeItem('phone');
       localStorage.removeItem('membership');
       localStorage.removeItem('memberUntil');
@@ -4,6 +4,26 @@ export interface DashboardStat {
   note: string;
 }
 
+export type Granularity = 'hour' | 'day' | 'week';
+
+export interface AnalyticsPoint {
+  bucket: string;
+  group: string;
+  revenue: number;
+  order_count: number | null;
+  paid_count: number;
+  paying_users: number;
+  avg_order_value: number;
+}
+
+export interface AnalyticsSeries {
+  granularity: Granularity;
+  split: 'channel' | 'level' | null;
+  start: string;
+  end: string;
+  points: AnalyticsPoint[];
+}
+
 export type MemberLevel = '游客' | '日卡' | '月卡' | '年卡' | '终身';
 
 export interface PaymentRecord {
@@ -48,3 +68,8 @@ export interface OrderInfo {
   items: OrderItemInfo[];
   remark?: string;
 }
+
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
@@ -0,0 +1,18 @@
+import http from '@/utils/http';
+import { API_ENDPOINTS } from '@/config/api';
+
+export type ExportResource = 'orders' | 'payments' | 'users';
+
+// Downloads go through axios rather than a plain link so the admin token and refresh logic apply
+export async function downloadExport(resource: ExportResource, params: Record<string, string | undefined> = {}) {
+  const { data } = await http.get<Blob>(API_ENDPOINTS.adminExport(resource), {
+    params: { format: 'csv', ...params },
+    responseType: 'blob'
+  });
+  const url = URL.createObjectURL(data);
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = `${resource}-${new Date().toISOString().slice(0, 10)}.csv`;
+  link.click();
+  URL.revokeObjectURL(url);
+}
@@ -30,11 +30,55 @@ instance.interceptors.request.use((config) => {
   return config;
 });
 
+// Bare client for token refresh so the 401 handler below cannot recurse into itself
+const refreshClient = axios.create({
+  baseURL: getApiBaseUrl()
+});
+
+const pendingRefresh: Record<'admin' | 'user', Promise<string | null> | null> = { admin: null, user: null };
+
+const refreshAccessToken = (isAdmin: boolean): Promise<string | null> => {
+  const key = isAdmin ? 'admin' : 'user';
+  if (!pendingRefresh[key]) {
+    pendingRefresh[key] = (async () => {
+      const adminStore = useAdminAuthStore();
+      const userStore = useUserStore();
+      const refreshToken = isAdmin ? adminStore.refreshToken : userStore.refreshToken;
+      if (!refreshToken) return null;
+      try {
+        const { data } = await refreshClient.post(API_ENDPOINTS.authRefresh, { refresh_token: refreshToken });
+        if (isAdmin) {
+          adminStore.setSession(data.access_token, adminStore.username || '', adminStore.isDefaultAdmin, data.refresh_token);
+        } else {
+          userStore.setToken(data.access_token);
+          userStore.setRefreshToken(data.refresh_token);
+        }
+        return data.access_token as string;
+      } catch (error) {
+        return null;
+      } finally {
+        pendingRefresh[key] = null;
+      }
+    })();
+  }
+  return pendingRefresh[key] as Promise<string | null>;
+};
+
 instance.interceptors.response.use(
   (response) => response,
   async (error) => {
     if (error.response?.status === 401) {
       const isAdmin = isAdminRequest(error.config?.url);
+      const isLoginRequest = error.config?.url === API_ENDPOINTS.adminLogin || error.config?.url === API_ENDPOINTS.authLogin;
+      if (!isLoginRequest && error.config && !error.config._retried) {
+        const accessToken = await refreshAccessToken(isAdmin);
+        if (accessToken) {
+          error.config._retried = true;
+          error.config.headers = error.config.headers || {};
+          error.config.headers.Authorization = `Bearer ${accessToken}`;
+          return instance(error.config);
+        }
+      }
       if (isAdmin && error.config?.url !== API_ENDPOINTS.adminLogin) {
         const adminStore = useAdminAuthStore();
         adminStore.logout();
@@ -58,7 +58,33 @@ export async function callWechatPay(prepay: PrepayParams) {
   });
 }
 
-export async function createWechatOrder(payload: Record<string, any>) {
-  const { data } = await axios.post(API_ENDPOINTS.wechatOrder, payload);
+interface OrderTicket {
+  ticket: string;
+  status: 'queued' | 'created' | 'failed';
+  order_id: number | null;
+  detail: any;
+  payment: { orderId: number; prepayParams: PrepayParams } | null;
+}
+
+// Flash-sale orders are queued server side; long-poll until the order is written
+export async function waitForOrderTicket(ticket: string): Promise<OrderTicket> {
+  for (;;) {
+    const { data } = await axios.get<OrderTicket>(API_ENDPOINTS.orderIntake(ticket), { params: { wait: 10 } });
+    if (data.status === 'created') {
+      return data;
+    }
+    if (data.status === 'failed') {
+      throw new Error(typeof data.detail === 'string' ? data.detail : data.detail?.message || 'Order failed');
+    }
+  }
+}
+
+export async function createWechatOrder(payload: Record<string, any>, idempotencyKey?: string) {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined;
+  const { data } = await axios.post(API_ENDPOINTS.wechatOrder, payload, { headers });
+  if (data.ticket) {
+    const ticket = await waitForOrderTicket(data.ticket);
+    return ticket.payment as { orderId: number; prepayParams: PrepayParams };
+  }
   return data;
 }